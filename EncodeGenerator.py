@@ -1,11 +1,11 @@
 import cv2
-import face_recognition
 import pickle
 import os
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import db
 from firebase_admin import storage
+from pipeline_profiles import detect_and_encode, profile_for
 
 #also uplaod image to storage at the same time
 cred = credentials.Certificate("serviceAccountKey.json")
@@ -36,11 +36,12 @@ print(studentIds)
 
 # opencv use BGR, face recognition lib use RGB, so need convert it
 
-def findEncodings(imagesList):
+# detection/encoding settings: PIPELINE_PROFILE_ENROLLMENT, e.g. enrollment-max (see pipeline_profiles.py)
+def findEncodings(imagesList, profile=profile_for('enrollment')):
     encodeList = []
     for image in imagesList:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        encode=face_recognition.face_encodings(image)[0]
+        encode=detect_and_encode(image, profile)[1][0]
         encodeList.append(encode)
 
     return encodeList
@@ -0,0 +1,119 @@
+"""
+Incrementally maintained attendance analytics.
+
+Each storage backend keeps running aggregates next to the attendance data:
+a total record count, per-day, per-month and per-student counts, the number
+of days and students with attendance, the top students and the most recent
+scans. They are updated in the same write that records attendance. The
+analytics dashboard reads only bounded pieces of them (the last week of
+days, the last 12 months, the top students and the recent scans), so its
+cost does not grow with the attendance history or the number of students.
+
+If the aggregates ever drift (for example after editing attendance by hand
+in the Firebase console), rebuild them from the full history:
+
+    python analytics_aggregates.py --rebuild
+"""
+
+import argparse
+import heapq
+from datetime import datetime, timedelta
+
+RECENT_ACTIVITY_SIZE = 10
+TOP_STUDENTS_SIZE = 5
+DASHBOARD_MONTHS = 12
+
+
+def iter_attendance(attendance):
+    """Yield (date, student_id, time) for every record in an attendance tree."""
+    for date_str, daily_records in (attendance or {}).items():
+        for student_id, times in (daily_records or {}).items():
+            # Older records may hold a list of times for the same day
+            for time_str in (times if isinstance(times, list) else [times]):
+                yield date_str, student_id, time_str
+
+
+def summarise_attendance(attendance, recent_size=RECENT_ACTIVITY_SIZE):
+    """Compute aggregates from a full attendance tree. Used to rebuild them."""
+    by_date = {}
+    by_month = {}
+    by_student = {}
+    recent = []
+    total_records = 0
+    for date_str, student_id, time_str in iter_attendance(attendance):
+        total_records += 1
+        by_date[date_str] = by_date.get(date_str, 0) + 1
+        by_month[date_str[:7]] = by_month.get(date_str[:7], 0) + 1
+        by_student[student_id] = by_student.get(student_id, 0) + 1
+        # total_records breaks ties so the heap never compares the dicts
+        item = (f"{date_str} {time_str}", total_records, {"date": date_str, "time": time_str, "student_id": student_id})
+        if len(recent) < recent_size:
+            heapq.heappush(recent, item)
+        elif item[0] > recent[0][0]:
+            heapq.heapreplace(recent, item)
+    return {
+        "total_records": total_records,
+        "by_date": by_date,
+        "by_month": by_month,
+        "by_student": by_student,
+        # Oldest first, the order get_analytics_summary returns them in
+        "recent": [activity for _, _, activity in sorted(recent)],
+    }
+
+
+def top_students(by_student, limit=TOP_STUDENTS_SIZE):
+    """Return the ``limit`` (student_id, count) pairs with the most attendance."""
+    return heapq.nlargest(limit, by_student.items(), key=lambda item: item[1])
+
+
+def build_dashboard(backend, students=None, today=None, days=7, months=DASHBOARD_MONTHS):
+    """Assemble the analytics dashboard data from the backend's aggregates.
+
+    ``students`` is an optional in-memory ``{student_id: student}`` mapping
+    (such as the students cache) used for names and the student count.
+    Only the last ``days`` days and ``months`` months of counts are read.
+    """
+    today = today or datetime.now()
+    summary = backend.get_analytics_summary()
+    total_students = len(students) if students is not None else backend.count_students()
+
+    week = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    daily_counts = backend.get_daily_counts(week)
+    monthly_counts = dict(sorted(backend.get_monthly_counts(months).items()))
+
+    top = top_students(summary["top_students"])
+    recent = sorted(summary["recent"], key=lambda r: f"{r['date']} {r['time']}", reverse=True)
+
+    # Only the students actually shown need their names looked up
+    names = {}
+    for student_id in {student_id for student_id, _ in top} | {r["student_id"] for r in recent}:
+        student = (students.get(student_id) if students is not None else backend.get_student(student_id)) or {}
+        names[student_id] = student.get("name", "Unknown")
+
+    return {
+        "total_students": total_students,
+        "total_attendance_records": summary["total_records"],
+        "students_attended": summary["students_attended"],
+        "weekly_stats": {date_str: daily_counts.get(date_str, 0) for date_str in week},
+        "monthly_stats": monthly_counts,
+        "top_students": [
+            {"student_id": student_id, "name": names[student_id], "attendance_count": count}
+            for student_id, count in top
+        ],
+        "attendance_rate": round(summary["students_attended"] / total_students * 100, 1) if total_students else 0,
+        "recent_activity": [dict(r, student_name=names[r["student_id"]]) for r in recent],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain attendance analytics aggregates")
+    parser.add_argument("--rebuild", action="store_true", help="recompute aggregates from the full attendance history")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+    else:
+        from storage_backend import create_backend, init_firebase
+        backend = create_backend(init_firebase(), resilient=False)
+        summary = backend.rebuild_analytics()
+        print(f"[OK] Rebuilt analytics: {summary['total_records']} records over {len(summary['by_date'])} days")
@@ -1,101 +1,238 @@
 import os
 import cv2
 import numpy as np
-import face_recognition
-import pickle
 from datetime import datetime, date, timedelta
-import io
 import csv
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response
+import io
+import multiprocessing
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, stream_with_context, send_from_directory
 import secrets
+from functools import wraps
 
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import db
-from firebase_admin import storage
+from attendance_journal import AttendanceJournal, JournalReplayer
+from storage_backend import create_backend, init_firebase
+from face_gallery import FaceGallery
+from analytics_aggregates import build_dashboard
+from students_cache import StudentsCache, student_scopes
+from upload_cache import UploadCache
+from bulk_import import ImportJob, ImportJobs, encode_photo, load_photos, load_roster, write_report
+from liveness_sessions import DetectorPool, LivenessSessionStore
+from face_pipeline import encode_face, largest_face
+from pipeline_profiles import PROFILES, REQUESTABLE_PROFILES, detect_faces, encode_faces, profile_for
+from warmup import Warmup, prime_face_models
+from slow_requests import SlowRequestRecorder
+import metrics
 
-# Try to import liveness detection modules with fallbacks
-try:
+# Liveness detector, chosen explicitly: ultra_simple (movement and texture) or blink
+LIVENESS_DETECTORS = ('ultra_simple', 'blink')
+LIVENESS_DETECTOR = os.environ.get('LIVENESS_DETECTOR', 'ultra_simple')
+if LIVENESS_DETECTOR == 'ultra_simple':
     from ultra_simple_liveness import UltraSimpleLivenessDetector as LivenessDetector
-    print("[OK] Using ultra-simple movement detection (much more reliable!)")
-except ImportError:
-    try:
-        from simple_blink_detection import SimpleBlinkLivenessDetector as LivenessDetector
-        print("[WARNING] Using blink detection as fallback")
-    except ImportError:
-        from liveness_detection_fixed import LivenessDetectorFixed as LivenessDetector
-        print("[WARNING] Using complex detection as last resort")
+elif LIVENESS_DETECTOR == 'blink':
+    from simple_blink_detection import SimpleBlinkLivenessDetector as LivenessDetector
+else:
+    raise ValueError(f"LIVENESS_DETECTOR must be one of {', '.join(LIVENESS_DETECTORS)}, not {LIVENESS_DETECTOR!r}")
+print(f"[OK] Using {LIVENESS_DETECTOR} liveness detection")
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
-# Firebase configuration
-firebase_available = False
-try:
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(cred, {
-            "databaseURL": "https://facerecognitionrealtime-default-rtdb.firebaseio.com/",
-            "storageBucket": "facerecognitionrealtime.firebasestorage.app"
-        })
-    firebase_available = True
-    print("[OK] Firebase initialized successfully")
-except Exception as e:
-    print(f"[WARNING] Firebase initialization failed: {e}")
-    firebase_available = False
-
-# Load face encodings
-encode_list_known = []
-student_ids = []
-
-try:
-    with open('EncodeFile.p', 'rb') as file:
-        encode_list_known_with_ids = pickle.load(file)
-        encode_list_known, student_ids = encode_list_known_with_ids
-    print(f"[OK] Loaded {len(encode_list_known)} face encodings")
-except FileNotFoundError:
-    print("[WARNING] EncodeFile.p not found. Please run EncodeGenerator.py first")
-
-# Initialize liveness detector
-liveness_detector = LivenessDetector()
-
-# Mock student data for fallback
-mock_students = {
-    "321654": {
-        "name": "John Doe",
-        "major": "Computer Science", 
-        "year": "3",
-        "standing": "A",
-        "starting_year": "2022",
-        "Total attendance": 15,
-        "last_atttendance_time": "2024-01-15 10:30:00"
-    },
-    "852741": {
-        "name": "Jane Smith",
-        "major": "Engineering",
-        "year": "2", 
-        "standing": "B",
-        "starting_year": "2023",
-        "Total attendance": 12,
-        "last_atttendance_time": "2024-01-14 14:20:00"
-    }
-}
+# Request timing, per-stage spans and the Prometheus /metrics endpoint
+metrics.instrument_flask(app)
+
+# Face encodings, loaded by the warm-up below
+gallery = FaceGallery()
+
+# Faces found in recent /match uploads, keyed by a hash of the bytes
+upload_cache = UploadCache()
+
+# Bulk imports started from the admin page
+import_jobs = ImportJobs()
+
+# Liveness detectors keep per-session state, so requests check one out of a bounded pool
+liveness_pool = DetectorPool(LivenessDetector)
+
+# Incremental liveness sessions, one per client
+liveness_sessions = LivenessSessionStore(liveness_pool)
+
+def load_gallery():
+    if gallery.reload():
+        print(f"[OK] Loaded {len(gallery)} face encodings")
+    else:
+        print("[WARNING] EncodeFile.p not found. Please run EncodeGenerator.py first")
+
+# Sampling profiles of slow scans, switched on from the admin page or with SLOW_REQUEST_PROFILING=1
+slow_requests = SlowRequestRecorder(enabled=os.environ.get('SLOW_REQUEST_PROFILING') == '1',
+                                    save_frames=os.environ.get('SLOW_REQUEST_SAVE_FRAMES') == '1',
+                                    logger=app.logger)
+slow_requests.instrument(app, ['scan_attendance', 'scan_attendance_multi_frame', 'push_liveness_frame', 'match'])
+
+# Slow start-up work (gallery, students snapshot, dlib models) runs in the background
+# so the server answers at once; /readyz turns 200 when it is done
+warmup = Warmup(logger=app.logger)
+
+def start_services():
+    """Connect to storage, start the journal replayer and the warm-up, and register metrics"""
+    global firebase_available, backend, attendance_journal, journal_replayer, students_cache
+
+    # Firebase configuration
+    firebase_available = init_firebase()
+
+    # Storage backend (Firebase, or the local SQLite store when Firebase is unavailable)
+    backend = create_backend(firebase_available)
+    print(f"[OK] Using {backend.name} storage backend")
+
+    # Attendance journal: scans commit locally, a background thread replays them to the backend
+    attendance_journal = AttendanceJournal()
+    journal_replayer = JournalReplayer(attendance_journal, backend.apply_attendance, logger=app.logger)
+    journal_replayer.start()
+
+    # Students cache: loaded once, kept current by the backend's change listener
+    students_cache = StudentsCache(backend, logger=app.logger)
+
+    warmup.add('gallery', load_gallery)
+    warmup.add('students_cache', students_cache.start)
+    warmup.add('face_models', prime_face_models)
+    warmup.start()
+
+    # Values read when /metrics is scraped
+    metrics.REGISTRY.register_callback(
+        'attendance_ready', '1 once the warm-up has finished', lambda: int(warmup.ready))
+    metrics.REGISTRY.register_callback(
+        'attendance_students_cache_lookups_total', 'Students cache lookups by result',
+        lambda: {'hit': students_cache.hits, 'miss': students_cache.misses}, type='counter', labelname='result')
+    metrics.REGISTRY.register_callback(
+        'attendance_students_cache_size', 'Students held in the cache', lambda: len(students_cache))
+    metrics.REGISTRY.register_callback(
+        'attendance_students_cache_staleness_seconds', 'Seconds since the students cache was last known to be current',
+        students_cache.staleness_seconds)
+    upload_cache.register_metrics(metrics.REGISTRY)
+    metrics.REGISTRY.register_callback(
+        'attendance_journal_pending', 'Journaled scans not yet pushed to the backend', attendance_journal.pending_count)
+    metrics.REGISTRY.register_callback(
+        'attendance_liveness_sessions', 'Open liveness sessions', lambda: len(liveness_sessions))
+    metrics.REGISTRY.register_callback(
+        'attendance_liveness_detectors', 'Liveness detector pool usage',
+        lambda: {key: liveness_pool.stats()[key] for key in ('created', 'busy', 'free')}, labelname='state')
+    metrics.REGISTRY.register_callback(
+        'attendance_liveness_detector_evictions_total', 'Detectors taken from idle sessions',
+        lambda: liveness_pool.evictions, type='counter')
+    if hasattr(backend, 'breaker'):
+        metrics.REGISTRY.register_callback(
+            'attendance_db_circuit_open', '1 while the database circuit breaker is open or half-open',
+            lambda: int(backend.breaker.state != backend.breaker.CLOSED))
+        metrics.REGISTRY.register_callback(
+            'attendance_db_calls_rejected_total', 'Database calls skipped because the circuit was open',
+            lambda: backend.breaker.total_rejected, type='counter')
+
+# Bulk import encoders are spawned processes that import this module as __mp_main__;
+# they must not connect to storage or start threads of their own
+if multiprocessing.current_process().name == 'MainProcess':
+    start_services()
+
+# Days shown per page on the attendance records page
+RECORDS_PER_PAGE = 7
+MAX_RECORDS_PER_PAGE = 31
+
+# Days fetched per backend query while streaming a CSV export
+EXPORT_PAGE_DAYS = 7
+
+@app.context_processor
+def pipeline_profile_names():
+    """Profile choices for the enrollment forms"""
+    return {'pipeline_profiles': sorted(PROFILES), 'enrollment_profile': profile_for('enrollment').name}
 
 def check_admin():
     """Check if user is logged in as admin"""
     return session.get('admin_logged_in', False)
 
+def warm_required(view):
+    """Answer 503 until the warm-up has loaded the gallery and the face models"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not warmup.ready:
+            response = jsonify({'success': False, 'message': 'Server is starting up, please try again shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        return view(*args, **kwargs)
+    return wrapper
+
+def request_scope():
+    """The roster scope a scan names (``scope`` form field or query arg) and whether it may fall through"""
+    scope = (request.values.get('scope') or '').strip() or None
+    fall_through = request.values.get('fall_through', '').lower() in ('1', 'true', 'on', 'yes')
+    return scope, fall_through
+
+def request_profile(entry_point, allowed=REQUESTABLE_PROFILES):
+    """The pipeline profile a request names (``profile`` form field or query arg), or the entry point's own"""
+    return profile_for(entry_point, (request.values.get('profile') or '').strip() or None, allowed)
+
+def scan_options_error(entry_point):
+    """Message for an unknown scope or profile, so a misconfigured kiosk is not mistaken for an unknown face"""
+    try:
+        request_profile(entry_point)
+    except ValueError as e:
+        return str(e)
+    scope, _ = request_scope()
+    if scope is None:
+        return None
+    gallery.set_scopes(students_cache.scopes())
+    if not gallery.has_scope(scope):
+        return f'Unknown scope: {scope}'
+    return None
+
+def scan_options(entry_point):
+    """Reject scans that name an unknown scope or pipeline profile"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            error = scan_options_error(entry_point)
+            if error:
+                response = jsonify({'success': False, 'message': error})
+                response.status_code = 400
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def match_encoding(encoding):
+    """Match against the scan's roster shard, or the whole gallery when it names none"""
+    scope, fall_through = request_scope()
+    scopes = students_cache.scopes() if scope is not None else None
+    if scopes is not None:
+        gallery.set_scopes(scopes)
+    with metrics.span('match'):
+        matched_id, distance = gallery.match(encoding, scope=scope, fall_through=fall_through)
+    if scopes is not None and fall_through and matched_id is not None and matched_id not in scopes.get(scope, ()):
+        metrics.count('scope_fall_through')
+    return matched_id, distance
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    """The process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Warm-up finished: models primed, gallery and students loaded"""
+    status = warmup.status()
+    return jsonify(status), (200 if status['ready'] else 503)
+
 @app.route('/attendance')
 def attendance():
     return render_template('attendance.html')
 
 @app.route('/attendance/scan', methods=['POST'])
+@warm_required
+@scan_options('scan')
 def scan_attendance():
     """Single frame attendance scan"""
+    profile = request_profile('scan')
     try:
         if 'frame' not in request.files:
             return jsonify({'success': False, 'message': 'No frame provided'})
@@ -105,77 +242,68 @@ def scan_attendance():
             return jsonify({'success': False, 'message': 'No frame selected'})
         
         # Read image
-        image_data = file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+        with metrics.span('decode'):
+            image_data = file.read()
+            nparr = np.frombuffer(image_data, np.uint8)
+            bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
         
         # Find faces and encode them
-        face_locations = face_recognition.face_locations(rgb_image)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        with metrics.span('detect'):
+            face_locations = detect_faces(rgb_image, profile)
+        with metrics.span('encode'):
+            face_encodings = encode_faces(rgb_image, face_locations, profile)
         
         if not face_encodings:
+            metrics.count('no_face')
             return jsonify({'success': False, 'message': 'No face detected'})
         
-        if not encode_list_known:
+        if not len(gallery):
             return jsonify({'success': False, 'message': 'No known faces in database'})
         
-        # Find best match
-        first_face_encoding = face_encodings[0]
-        distances = face_recognition.face_distance(encode_list_known, first_face_encoding)
-        match_index = int(np.argmin(distances))
-        matches = face_recognition.compare_faces([encode_list_known[match_index]], first_face_encoding)
+        # Find best match, within the scan's roster scope if it names one
+        matched_id, distance = match_encoding(face_encodings[0])
         
-        if matches[0] and distances[match_index] < 0.6:  # Threshold for good match
-            matched_id = student_ids[match_index]
+        if matched_id is not None:
             
             # Get current date and time
             now = datetime.now()
             date_str = now.strftime("%Y-%m-%d")
             time_str = now.strftime("%H:%M:%S")
             
-            # Check if already marked today
-            already_marked = False
-            if firebase_available:
+            # Check if already marked today (local journal first, then Firebase)
+            already_marked = attendance_journal.is_marked(matched_id, date_str)
+            if not already_marked:
                 try:
-                    today_attendance = db.reference(f'Attendance/{date_str}/{matched_id}').get()
-                    if today_attendance:
-                        already_marked = True
+                    with metrics.span('db_check'):
+                        already_marked = backend.is_marked(matched_id, date_str)
                 except Exception as e:
-                    app.logger.error(f"Firebase error: {e}")
+                    metrics.count('db_error')
+                    app.logger.error(f"Database error: {e}")
             
             if already_marked:
+                metrics.count('already_marked')
                 return jsonify({'success': False, 'message': 'Attendance already marked today'})
             
             # Get student info
-            student_info = None
-            if firebase_available:
-                try:
-                    student_info = db.reference(f"Students/{matched_id}").get()
-                except Exception as e:
-                    app.logger.error(f"Firebase error: {e}")
-                    student_info = mock_students.get(matched_id)
-            else:
-                student_info = mock_students.get(matched_id)
+            student_info = students_cache.get(matched_id)
             
             if not student_info:
                 return jsonify({'success': False, 'message': 'Student data not found'})
             
-            # Mark attendance
-            if firebase_available:
-                try:
-                    # Update attendance record
-                    db.reference(f'Attendance/{date_str}/{matched_id}').set(time_str)
-                    
-                    # Update student's total attendance and last attendance time
-                    current_total = student_info.get('Total attendance', 0)
-                    db.reference(f'Students/{matched_id}/Total attendance').set(current_total + 1)
-                    db.reference(f'Students/{matched_id}/last_atttendance_time').set(f"{date_str} {time_str}")
-                    
-                    print(f"[OK] Attendance marked for {student_info['name']} ({matched_id})")
-                except Exception as e:
-                    app.logger.error(f"Firebase error marking attendance: {e}")
-                    return jsonify({'success': False, 'message': 'Error saving to database'})
+            # Mark attendance in the local journal; the replayer pushes it to the backend
+            try:
+                with metrics.span('journal'):
+                    recorded = attendance_journal.record(matched_id, date_str, time_str)
+                if not recorded:
+                    return jsonify({'success': False, 'message': 'Attendance already marked today'})
+            except Exception as e:
+                metrics.count('journal_error')
+                app.logger.error(f"Journal error marking attendance: {e}")
+                return jsonify({'success': False, 'message': 'Error saving attendance'})
+            journal_replayer.wake()
+            metrics.count('match')
+            print(f"[OK] Attendance marked for {student_info['name']} ({matched_id})")
             
             return jsonify({
                 'success': True, 
@@ -184,13 +312,95 @@ def scan_attendance():
                 'time': time_str
             })
         else:
+            metrics.count('no_match')
             return jsonify({'success': False, 'message': 'Face not recognized'})
             
     except Exception as e:
         app.logger.error(f"Error in attendance scan: {str(e)}")
         return jsonify({'success': False, 'message': 'Processing error'})
 
+def recognise_and_mark(bgr_image, faces=None):
+    """Recognise the face in a liveness-verified frame and journal today's attendance.
+
+    ``faces`` are the detections and landmarks the liveness detector already
+    computed for this frame, if any; they are encoded from those 68-point
+    landmarks with the profile's ``num_jitters``. Otherwise the request's
+    pipeline profile drives detection and encoding, as on /attendance/scan.
+    Returns the JSON payload for the scan routes.
+    """
+    profile = request_profile('scan')
+    rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+    face_locations = None
+    if faces is None:
+        with metrics.span('detect'):
+            face_locations = detect_faces(rgb_image, profile)
+    
+    if not (faces or face_locations):
+        metrics.count('no_face')
+        return {'success': False, 'message': 'No face detected'}
+    
+    if not len(gallery):
+        return {'success': False, 'message': 'No known faces in database'}
+    
+    # Find best match, encoding from the liveness landmarks when there are any;
+    # the largest face is the one the blink detector scored
+    with metrics.span('encode'):
+        if faces:
+            encoding = encode_face(rgb_image, largest_face(faces), profile.num_jitters).encoding
+        else:
+            encoding = encode_faces(rgb_image, face_locations[:1], profile)[0]
+    matched_id, distance = match_encoding(encoding)
+    if matched_id is None:
+        metrics.count('no_match')
+        return {'success': False, 'message': 'Face not recognized'}
+    
+    now = datetime.now()
+    date_str = now.strftime("%Y-%m-%d")
+    time_str = now.strftime("%H:%M:%S")
+    
+    # Check if already marked today (local journal first, then the backend)
+    already_marked = attendance_journal.is_marked(matched_id, date_str)
+    if not already_marked:
+        try:
+            with metrics.span('db_check'):
+                already_marked = backend.is_marked(matched_id, date_str)
+        except Exception as e:
+            metrics.count('db_error')
+            app.logger.error(f"Database error: {e}")
+    
+    if already_marked:
+        metrics.count('already_marked')
+        return {'success': False, 'message': 'Attendance already marked today'}
+    
+    student_info = students_cache.get(matched_id)
+    if not student_info:
+        return {'success': False, 'message': 'Student data not found'}
+    
+    # Mark attendance in the local journal; the replayer pushes it to the backend
+    try:
+        with metrics.span('journal'):
+            recorded = attendance_journal.record(matched_id, date_str, time_str)
+        if not recorded:
+            return {'success': False, 'message': 'Attendance already marked today'}
+    except Exception as e:
+        metrics.count('journal_error')
+        app.logger.error(f"Journal error marking attendance: {e}")
+        return {'success': False, 'message': 'Error saving attendance'}
+    journal_replayer.wake()
+    metrics.count('match')
+    print(f"[VERIFIED] Liveness + Face recognition: {student_info['name']} ({matched_id})")
+    
+    return {
+        'success': True,
+        'name': student_info['name'],
+        'student_id': matched_id,
+        'time': time_str,
+        'liveness_verified': True
+    }
+
 @app.route('/attendance/scan_multi_frame', methods=['POST'])
+@warm_required
+@scan_options('scan')
 def scan_attendance_multi_frame():
     """Multi-frame attendance scan with liveness detection"""
     try:
@@ -203,97 +413,84 @@ def scan_attendance_multi_frame():
         
         # Process frames for liveness detection
         processed_frames = []
-        for frame_file in frames:
-            image_data = frame_file.read()
-            nparr = np.frombuffer(image_data, np.uint8)
-            bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            processed_frames.append(bgr_image)
+        with metrics.span('decode'):
+            for frame_file in frames:
+                image_data = frame_file.read()
+                nparr = np.frombuffer(image_data, np.uint8)
+                bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                processed_frames.append(bgr_image)
         
         # Check liveness
-        is_live = liveness_detector.detect_liveness(processed_frames)
+        with liveness_pool.lease() as liveness_detector, metrics.span('liveness'):
+            is_live = liveness_detector.detect_liveness(processed_frames)
         if not is_live:
+            metrics.count('liveness_rejected')
             return jsonify({'success': False, 'message': 'Liveness detection failed. Please move naturally.'})
         
         # Use the middle frame for face recognition
         middle_frame = processed_frames[len(processed_frames)//2]
-        rgb_image = cv2.cvtColor(middle_frame, cv2.COLOR_BGR2RGB)
+        return jsonify(recognise_and_mark(middle_frame))
+            
+    except Exception as e:
+        app.logger.error(f"Error in multi-frame attendance scan: {str(e)}")
+        app.logger.error(f"Traceback: {str(e.__traceback__)}")
+        return jsonify({'success': False, 'message': 'Processing error'})
+
+@app.route('/attendance/liveness/start', methods=['POST'])
+def start_liveness_session():
+    """Open an incremental liveness session for this client."""
+    previous = session.pop('liveness_session_id', None)
+    if previous:
+        liveness_sessions.discard(previous)
+    liveness_session = liveness_sessions.create()
+    session['liveness_session_id'] = liveness_session.id
+    return jsonify({
+        'success': True,
+        'session_id': liveness_session.id,
+        'max_frames': liveness_session.max_frames,
+        'timeout': liveness_session.timeout
+    })
+
+@app.route('/attendance/liveness/frame', methods=['POST'])
+@warm_required
+@scan_options('scan')
+def push_liveness_frame():
+    """Score one frame; once liveness is decided, recognise the face and mark attendance."""
+    try:
+        session_id = request.form.get('session_id') or session.get('liveness_session_id')
+        liveness_session = liveness_sessions.get(session_id) if session_id else None
+        if liveness_session is None:
+            return jsonify({'success': False, 'status': 'expired', 'message': 'Liveness session expired. Please start again.'})
         
-        # Continue with face recognition (same as single frame)
-        face_locations = face_recognition.face_locations(rgb_image)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        if 'frame' not in request.files:
+            return jsonify({'success': False, 'message': 'No frame provided'})
         
-        if not face_encodings:
-            return jsonify({'success': False, 'message': 'No face detected'})
+        with metrics.span('decode'):
+            nparr = np.frombuffer(request.files['frame'].read(), np.uint8)
+            bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if bgr_image is None:
+            return jsonify({'success': False, 'message': 'Could not read image'})
         
-        if not encode_list_known:
-            return jsonify({'success': False, 'message': 'No known faces in database'})
+        with metrics.span('liveness'):
+            status, result = liveness_session.push(bgr_image)
+        details = {'confidence': result['final_confidence'], 'frames': liveness_session.frames}
         
-        # Find best match
-        first_face_encoding = face_encodings[0]
-        distances = face_recognition.face_distance(encode_list_known, first_face_encoding)
-        match_index = int(np.argmin(distances))
-        matches = face_recognition.compare_faces([encode_list_known[match_index]], first_face_encoding)
+        if status == 'pending':
+            return jsonify({'success': True, 'status': status, 'details': details})
+        
+        liveness_sessions.discard(liveness_session.id)
+        session.pop('liveness_session_id', None)
+        if status == 'failed':
+            metrics.count('liveness_rejected')
+            return jsonify({'success': False, 'status': status, 'details': details,
+                            'message': 'Liveness detection failed. Please move naturally.'})
+        
+        response = recognise_and_mark(bgr_image, result.get('faces'))
+        response.update(status=status, details=details)
+        return jsonify(response)
         
-        if matches[0] and distances[match_index] < 0.6:
-            matched_id = student_ids[match_index]
-            
-            # Same attendance marking logic as single frame
-            now = datetime.now()
-            date_str = now.strftime("%Y-%m-%d")
-            time_str = now.strftime("%H:%M:%S")
-            
-            # Check if already marked today
-            already_marked = False
-            if firebase_available:
-                try:
-                    today_attendance = db.reference(f'Attendance/{date_str}/{matched_id}').get()
-                    if today_attendance:
-                        already_marked = True
-                except Exception as e:
-                    app.logger.error(f"Firebase error: {e}")
-            
-            if already_marked:
-                return jsonify({'success': False, 'message': 'Attendance already marked today'})
-            
-            # Get student info and mark attendance (same as above)
-            student_info = None
-            if firebase_available:
-                try:
-                    student_info = db.reference(f"Students/{matched_id}").get()
-                except Exception as e:
-                    app.logger.error(f"Firebase error: {e}")
-                    student_info = mock_students.get(matched_id)
-            else:
-                student_info = mock_students.get(matched_id)
-            
-            if not student_info:
-                return jsonify({'success': False, 'message': 'Student data not found'})
-            
-            # Mark attendance
-            if firebase_available:
-                try:
-                    db.reference(f'Attendance/{date_str}/{matched_id}').set(time_str)
-                    current_total = student_info.get('Total attendance', 0)
-                    db.reference(f'Students/{matched_id}/Total attendance').set(current_total + 1)
-                    db.reference(f'Students/{matched_id}/last_atttendance_time').set(f"{date_str} {time_str}")
-                    print(f"[VERIFIED] Liveness + Face recognition: {student_info['name']} ({matched_id})")
-                except Exception as e:
-                    app.logger.error(f"Firebase error marking attendance: {e}")
-                    return jsonify({'success': False, 'message': 'Error saving to database'})
-            
-            return jsonify({
-                'success': True, 
-                'name': student_info['name'],
-                'student_id': matched_id,
-                'time': time_str,
-                'liveness_verified': True
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Face not recognized'})
-            
     except Exception as e:
-        app.logger.error(f"Error in multi-frame attendance scan: {str(e)}")
-        app.logger.error(f"Traceback: {str(e.__traceback__)}")
+        app.logger.error(f"Error in liveness session: {str(e)}")
         return jsonify({'success': False, 'message': 'Processing error'})
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -321,15 +518,7 @@ def admin_dashboard():
     if not check_admin():
         return redirect('/admin/login')
     
-    students = {}
-    if firebase_available:
-        try:
-            students = db.reference('Students').get() or {}
-        except Exception as e:
-            app.logger.error(f"Firebase error: {e}")
-            students = mock_students
-    else:
-        students = mock_students
+    students = students_cache.get_all()
     
     return render_template('admin_dashboard.html', students=students)
 
@@ -338,93 +527,113 @@ def attendance_records():
     if not check_admin():
         return redirect('/admin/login')
     
-    # Get attendance records
+    # Date range and cursor (the first date of the page) come from the query string
+    start_date = request.args.get('start', '').strip() or None
+    end_date = request.args.get('end', '').strip() or None
+    cursor = request.args.get('cursor', '').strip() or None
+    per_page = min(max(request.args.get('per_page', RECORDS_PER_PAGE, type=int), 1), MAX_RECORDS_PER_PAGE)
+    
     records = {}
+    next_cursor = None
     total_days = 0
     total_students = 0
     total_attendance = 0
     
-    if firebase_available:
-        try:
-            attendance_data = db.reference('Attendance').get()
-            if attendance_data:
-                records = attendance_data
-                total_days = len(records)
-                
-                # Calculate stats
-                students_set = set()
-                for date, daily_records in records.items():
-                    total_attendance += len(daily_records)
-                    students_set.update(daily_records.keys())
-                total_students = len(students_set)
-        except Exception as e:
-            app.logger.error(f"Firebase error: {e}")
-    
-    # If no Firebase data, use mock data
-    if not records:
-        records = {
-            "2024-01-15": {
-                "321654": "09:15:30",
-                "852741": "09:22:45"
-            },
-            "2024-01-14": {
-                "321654": "08:45:20"
-            }
-        }
-        total_days = 2
-        total_students = 2
-        total_attendance = 3
+    try:
+        page, next_cursor = backend.get_attendance_page(start_date, end_date, cursor, per_page)
+        
+        # Join the students on this page with their details
+        students = students_cache.get_all() if page else {}
+        for date_str, daily_records in page.items():
+            records[date_str] = {}
+            for student_id, time_str in daily_records.items():
+                student = students.get(student_id) or {}
+                records[date_str][student_id] = {
+                    'name': student.get('name', 'Unknown'),
+                    'major': student.get('major', ''),
+                    'year': student.get('year', ''),
+                    'time': time_str
+                }
+        
+        # Stats come from the maintained aggregates
+        summary = backend.get_analytics_summary()
+        total_days = summary['days_recorded']
+        total_students = summary['students_attended']
+        total_attendance = summary['total_records']
+    except Exception as e:
+        app.logger.error(f"Database error: {e}")
+        flash('Could not load attendance records from the database', 'error')
     
     return render_template('attendance_records.html', 
                          records=records,
                          total_days=total_days,
                          total_students=total_students,
-                         total_attendance=total_attendance)
+                         unique_students_count=total_students,
+                         total_attendance=total_attendance,
+                         start_date=start_date or '',
+                         end_date=end_date or '',
+                         per_page=per_page,
+                         cursor=cursor,
+                         next_cursor=next_cursor)
+
+class _CsvLine:
+    """File-like sink so csv.writer can produce one line at a time."""
+    def write(self, line):
+        return line
+
+def iter_attendance_days(start_date, end_date, page, cursor, page_size=EXPORT_PAGE_DAYS):
+    """Yield (date, records) from the first ``page`` onwards, fetching one backend page at a time."""
+    while True:
+        yield from page.items()
+        if not cursor:
+            break
+        page, cursor = backend.get_attendance_page(start_date, end_date, cursor, page_size)
 
 @app.route('/attendance/export_csv')
 def export_attendance_csv():
     if not check_admin():
         return redirect('/admin/login')
     
-    export_date = request.args.get('date', date.today().strftime("%Y-%m-%d"))
+    # A single ?date= still works; ?start=&end= exports a range
+    today = date.today().strftime("%Y-%m-%d")
+    export_date = request.args.get('date', '').strip()
+    start_date = request.args.get('start', '').strip() or export_date or today
+    end_date = request.args.get('end', '').strip() or export_date or start_date
     
-    attendance_data = {}
+    students = students_cache.get_all()
     
-    if firebase_available:
+    # Fetch the first page before streaming, so a database that is down gets a 503, not an empty file
+    try:
+        first_page, cursor = backend.get_attendance_page(start_date, end_date, None, EXPORT_PAGE_DAYS)
+    except Exception as e:
+        app.logger.error(f"Database error in CSV export: {e}")
+        return Response(f'Could not export attendance: {e}\n', status=503, mimetype='text/plain')
+    
+    def generate():
+        writer = csv.writer(_CsvLine())
+        yield writer.writerow(['Student ID', 'Name', 'Time', 'Major', 'Year', 'Date'])
         try:
-            attendance_ref = db.reference(f"Attendance/{export_date}")
-            attendance_data = attendance_ref.get() or {}
+            for day, daily_records in iter_attendance_days(start_date, end_date, first_page, cursor):
+                for student_id, time_str in daily_records.items():
+                    student = students.get(student_id) or {}
+                    yield writer.writerow([
+                        student_id,
+                        student.get('name', ''),
+                        time_str,
+                        student.get('major', ''),
+                        student.get('year', ''),
+                        day
+                    ])
         except Exception as e:
-            app.logger.error(f"Firebase error in CSV export: {e}")
-            firebase_available = False
-    
-    if not firebase_available:
-        if export_date == date.today().strftime("%Y-%m-%d"):
-            attendance_data = {
-                "321654": {"name": "John Doe", "time": "09:15:30", "major": "Computer Science", "year": "3"},
-                "852741": {"name": "Jane Smith", "time": "09:22:45", "major": "Engineering", "year": "2"}
-            }
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['Student ID', 'Name', 'Time', 'Major', 'Year', 'Date'])
-    
-    for student_id, info in attendance_data.items():
-        writer.writerow([
-            student_id,
-            info.get('name', ''),
-            info.get('time', ''),
-            info.get('major', ''),
-            info.get('year', ''),
-            export_date
-        ])
-    
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=attendance_{export_date}.csv'
+            # The status line is already sent: mark the file as incomplete, then abort the
+            # chunked response so the client sees a failed download rather than a short file
+            app.logger.error(f"Database error in CSV export: {e}")
+            yield writer.writerow(['ERROR: export incomplete, the database failed part way through'])
+            raise
     
+    filename = f'attendance_{start_date}.csv' if start_date == end_date else f'attendance_{start_date}_to_{end_date}.csv'
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 @app.route('/attendance/analytics')
@@ -436,8 +645,7 @@ def attendance_analytics():
     analytics_data = {
         'total_students': 0,
         'total_attendance_records': 0,
-        'attendance_by_date': {},
-        'attendance_by_student': {},
+        'students_attended': 0,
         'weekly_stats': {},
         'monthly_stats': {},
         'top_students': [],
@@ -445,117 +653,11 @@ def attendance_analytics():
         'recent_activity': []
     }
     
-    if firebase_available:
-        try:
-            # Get students data
-            students = db.reference('Students').get()
-            if students:
-                analytics_data['total_students'] = len(students)
-            
-            # Get attendance data
-            attendance_records = db.reference('Attendance').get()
-            if attendance_records:
-                total_records = 0
-                student_attendance_count = {}
-                date_attendance_count = {}
-                recent_records = []
-                
-                for date, daily_records in attendance_records.items():
-                    date_count = 0
-                    for student_id, times in daily_records.items():
-                        count = len(times) if isinstance(times, list) else 1
-                        total_records += count
-                        date_count += count
-                        
-                        # Count by student
-                        if student_id not in student_attendance_count:
-                            student_attendance_count[student_id] = 0
-                        student_attendance_count[student_id] += count
-                        
-                        # Recent activity
-                        if isinstance(times, list):
-                            for time_str in times:
-                                recent_records.append({
-                                    'date': date,
-                                    'student_id': student_id,
-                                    'time': time_str,
-                                    'student_name': students.get(student_id, {}).get('name', 'Unknown') if students else 'Unknown'
-                                })
-                        else:
-                            recent_records.append({
-                                'date': date,
-                                'student_id': student_id,
-                                'time': times,
-                                'student_name': students.get(student_id, {}).get('name', 'Unknown') if students else 'Unknown'
-                            })
-                    
-                    date_attendance_count[date] = date_count
-                
-                analytics_data['total_attendance_records'] = total_records
-                analytics_data['attendance_by_date'] = date_attendance_count
-                analytics_data['attendance_by_student'] = student_attendance_count
-                
-                # Calculate attendance rate
-                if analytics_data['total_students'] > 0:
-                    analytics_data['attendance_rate'] = round((len(student_attendance_count) / analytics_data['total_students']) * 100, 1)
-                
-                # Top students (by attendance count)
-                top_students = sorted(student_attendance_count.items(), key=lambda x: x[1], reverse=True)[:5]
-                analytics_data['top_students'] = [
-                    {
-                        'student_id': student_id,
-                        'name': students.get(student_id, {}).get('name', 'Unknown') if students else 'Unknown',
-                        'attendance_count': count
-                    }
-                    for student_id, count in top_students
-                ]
-                
-                # Recent activity (last 10 records)
-                recent_records.sort(key=lambda x: f"{x['date']} {x['time']}", reverse=True)
-                analytics_data['recent_activity'] = recent_records[:10]
-                
-                # Weekly stats (last 7 days)
-                from datetime import datetime, timedelta
-                today = datetime.now()
-                for i in range(7):
-                    date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-                    analytics_data['weekly_stats'][date] = date_attendance_count.get(date, 0)
-                
-        except Exception as e:
-            app.logger.error(f"Firebase analytics error: {e}")
-    else:
-        # Mock data for analytics when Firebase is not available
-        analytics_data = {
-            'total_students': 2,
-            'total_attendance_records': 15,
-            'attendance_by_date': {
-                '2024-10-01': 5,
-                '2024-10-02': 3,
-                '2024-10-03': 7
-            },
-            'attendance_by_student': {
-                '321654': 8,
-                '852741': 7
-            },
-            'weekly_stats': {
-                '2024-10-03': 7,
-                '2024-10-02': 3,
-                '2024-10-01': 5,
-                '2024-09-30': 0,
-                '2024-09-29': 0,
-                '2024-09-28': 0,
-                '2024-09-27': 0
-            },
-            'top_students': [
-                {'student_id': '321654', 'name': 'John Doe', 'attendance_count': 8},
-                {'student_id': '852741', 'name': 'Jane Smith', 'attendance_count': 7}
-            ],
-            'attendance_rate': 100.0,
-            'recent_activity': [
-                {'date': '2024-10-03', 'student_id': '321654', 'time': '09:15:30', 'student_name': 'John Doe'},
-                {'date': '2024-10-03', 'student_id': '852741', 'time': '09:22:45', 'student_name': 'Jane Smith'}
-            ]
-        }
+    try:
+        # Reads the maintained aggregates, not the full Students/Attendance trees
+        analytics_data = build_dashboard(backend, students_cache.get_all())
+    except Exception as e:
+        app.logger.error(f"Database analytics error: {e}")
     
     return render_template('analytics.html', analytics=analytics_data)
 
@@ -566,6 +668,13 @@ def upload():
 @app.route('/match', methods=['POST'])
 def match():
     """Match uploaded image with known faces"""
+    if not warmup.ready:
+        flash('The server is still starting up, please try again in a moment', 'error')
+        return redirect('/upload')
+    error = scan_options_error('match')
+    if error:
+        flash(error, 'error')
+        return redirect('/upload')
     try:
         if 'image' not in request.files:
             flash('No image uploaded', 'error')
@@ -577,49 +686,52 @@ def match():
             return redirect('/upload')
         
         image_data = file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
-        
-        face_locations = face_recognition.face_locations(rgb_image)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        profile = request_profile('match')
+        # A retried or resent upload reuses its faces and is matched against the current gallery
+        cache_key = upload_cache.key(image_data, profile.name)
+        cached = upload_cache.get(cache_key)
+        if cached is not None:
+            face_locations, face_encodings = cached
+        else:
+            with metrics.span('decode'):
+                nparr = np.frombuffer(image_data, np.uint8)
+                bgr_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+            
+            with metrics.span('detect'):
+                face_locations = detect_faces(rgb_image, profile)
+            with metrics.span('encode'):
+                face_encodings = encode_faces(rgb_image, face_locations, profile)
+            upload_cache.put(cache_key, face_locations, face_encodings)
         
         if not face_encodings:
+            metrics.count('no_face')
             flash('No face detected in the uploaded image', 'error')
             return redirect('/upload')
         
-        if not encode_list_known:
+        if not len(gallery):
             flash('No known faces in database', 'error')
             return redirect('/upload')
         
-        first_face_encoding = face_encodings[0]
-        distances = face_recognition.face_distance(encode_list_known, first_face_encoding)
-        match_index = int(np.argmin(distances))
-        matches = face_recognition.compare_faces([encode_list_known[match_index]], first_face_encoding)
+        matched_id, distance = match_encoding(face_encodings[0])
         
-        if matches[0]:
-            matched_id = student_ids[match_index]
-            if firebase_available:
-                try:
-                    student_info = db.reference(f"Students/{matched_id}").get()
-                except Exception as e:
-                    app.logger.error(f"Firebase error: {e}")
-                    student_info = mock_students.get(matched_id)
-            else:
-                student_info = mock_students.get(matched_id)
+        if matched_id is not None:
+            student_info = students_cache.get(matched_id)
             
             if student_info:
+                metrics.count('match')
                 flash(f'Student identified: {student_info["name"]}', 'success')
                 return render_template('result.html', 
                                      matched=True,
                                      matched_id=matched_id,
                                      student_info=student_info,
-                                     distance=distances[match_index],
-                                     confidence=f"{(1-distances[match_index])*100:.1f}%")
+                                     distance=distance,
+                                     confidence=f"{(1-distance)*100:.1f}%")
             else:
                 flash('Student data not found', 'error')
                 return redirect('/upload')
         else:
+            metrics.count('no_match')
             flash('Face not recognized in our database', 'error')
             return redirect('/upload')
             
@@ -643,21 +755,22 @@ def add_student():
             year = request.form.get('year', '').strip()
             standing = request.form.get('standing', '').strip()
             starting_year = request.form.get('starting_year', '').strip()
+            scopes = sorted(student_scopes({'scopes': request.form.get('scopes', '')}))
+            profile_name = request.form.get('profile', '').strip() or None
             
             # Validate required fields
             if not all([student_id, name, major, year]):
                 flash('Please fill in all required fields (Student ID, Name, Major, Year)', 'error')
                 return render_template('add_student.html')
             
+            if profile_name and profile_name not in PROFILES:
+                flash(f'Unknown pipeline profile: {profile_name}', 'error')
+                return render_template('add_student.html')
+            
             # Check if student already exists
-            if firebase_available:
-                try:
-                    existing_student = db.reference(f'Students/{student_id}').get()
-                    if existing_student:
-                        flash(f'Student with ID {student_id} already exists!', 'error')
-                        return render_template('add_student.html')
-                except Exception as e:
-                    app.logger.error(f"Firebase error checking existing student: {e}")
+            if students_cache.get(student_id):
+                flash(f'Student with ID {student_id} already exists!', 'error')
+                return render_template('add_student.html')
             
             # Prepare student data
             student_data = {
@@ -669,22 +782,38 @@ def add_student():
                 'Total attendance': 0,
                 'last_atttendance_time': 'Never'
             }
+            if scopes:
+                student_data['scopes'] = scopes
+            
+            # Save to the storage backend
+            try:
+                backend.add_student(student_id, student_data)
+                students_cache.put(student_id, student_data)
+                flash(f'Student {name} (ID: {student_id}) has been successfully added to the system!', 'success')
+                app.logger.info(f"[OK] Added new student: {name} (ID: {student_id})")
+            except Exception as e:
+                app.logger.error(f"Database error adding student: {e}")
+                flash(f'Error adding student to database: {str(e)}', 'error')
+                return render_template('add_student.html')
             
-            # Save to Firebase
-            if firebase_available:
+            # Store the photo and add the face to the gallery
+            photo = request.files.get('image')
+            if photo and photo.filename and not warmup.wait(timeout=30):
+                flash('Student added, but the photo was not saved because the server is still starting up', 'warning')
+            elif photo and photo.filename:
                 try:
-                    db.reference(f'Students/{student_id}').set(student_data)
-                    flash(f'Student {name} (ID: {student_id}) has been successfully added to the system!', 'success')
-                    app.logger.info(f"[OK] Added new student: {name} (ID: {student_id})")
+                    photo_data = photo.read()
+                    ext = 'png' if photo.filename.lower().endswith('.png') else 'jpg'
+                    backend.put_photo(student_id, photo_data, ext)
+                    _, encoding, error = encode_photo((student_id, photo_data), profile_name)
+                    if error:
+                        flash(f'Photo saved, but it cannot be used for recognition: {error}', 'warning')
+                    else:
+                        gallery.add(student_id, encoding)
+                        gallery.save('EncodeFile.p')
                 except Exception as e:
-                    app.logger.error(f"Firebase error adding student: {e}")
-                    flash(f'Error adding student to Firebase: {str(e)}', 'error')
-                    return render_template('add_student.html')
-            else:
-                # Add to mock data when Firebase is not available
-                mock_students[student_id] = student_data
-                flash(f'Student {name} (ID: {student_id}) has been added to mock database (Firebase not available)', 'warning')
-                app.logger.info(f"[WARNING] Added student to mock data: {name} (ID: {student_id})")
+                    app.logger.error(f"Error saving photo for {student_id}: {e}")
+                    flash(f'Error saving photo: {str(e)}', 'error')
             
             return redirect('/admin/dashboard')
             
@@ -695,26 +824,137 @@ def add_student():
     
     return render_template('add_student.html')
 
+@app.route('/admin/import_students', methods=['GET', 'POST'])
+def import_students():
+    """Bulk import a roster (CSV/JSON) with a zip of photos"""
+    if not check_admin():
+        return redirect('/admin/login')
+    
+    if request.method == 'POST':
+        if not warmup.ready:
+            flash('The server is still starting up, please try again in a moment', 'error')
+            return render_template('import_students.html')
+        roster_file = request.files.get('roster')
+        photos_file = request.files.get('photos')
+        profile_name = request.form.get('profile', '').strip() or None
+        if profile_name and profile_name not in PROFILES:
+            flash(f'Unknown pipeline profile: {profile_name}', 'error')
+            return render_template('import_students.html')
+        if not roster_file or roster_file.filename == '':
+            flash('Please choose a roster file (CSV or JSON)', 'error')
+            return render_template('import_students.html')
+        
+        try:
+            roster = load_roster(roster_file.read(), roster_file.filename)
+            photos = load_photos(io.BytesIO(photos_file.read())) if photos_file and photos_file.filename else {}
+        except Exception as e:
+            app.logger.error(f"Error reading import files: {e}")
+            flash(f'Could not read the uploaded files: {str(e)}', 'error')
+            return render_template('import_students.html')
+        
+        job = import_jobs.start(ImportJob(roster, photos, profile=profile_name), backend=backend, gallery=gallery,
+                                students_cache=students_cache, encode_file='EncodeFile.p')
+        app.logger.info(f"[OK] Started import {job.id}: {job.total} students, {len(photos)} photos")
+        return redirect(url_for('import_status', job_id=job.id))
+    
+    return render_template('import_students.html')
+
+@app.route('/admin/import_students/<job_id>')
+def import_status(job_id):
+    if not check_admin():
+        return redirect('/admin/login')
+    job = import_jobs.get(job_id)
+    if job is None:
+        flash('Import not found', 'error')
+        return redirect(url_for('import_students'))
+    return render_template('import_students.html', job=job, summary=job.summary())
+
+@app.route('/admin/import_students/<job_id>/report.csv')
+def import_report(job_id):
+    if not check_admin():
+        return redirect('/admin/login')
+    job = import_jobs.get(job_id)
+    if job is None:
+        return redirect(url_for('import_students'))
+    output = io.StringIO()
+    write_report(job, output)
+    response = Response(output.getvalue(), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=import_report_{job_id}.csv'
+    return response
+
 @app.route('/admin/delete_student/<student_id>', methods=['POST'])
 def delete_student(student_id):
     """Delete student from the system"""
     if not check_admin():
         return redirect('/admin/login')
     
-    if firebase_available:
-        try:
-            db.reference(f'Students/{student_id}').delete()
-            flash(f'Student {student_id} has been deleted successfully', 'success')
-        except Exception as e:
-            app.logger.error(f"Error deleting student from Firebase: {e}")
-            flash(f'Error deleting student: {str(e)}', 'error')
-    else:
-        # Remove from mock data
-        if student_id in mock_students:
-            del mock_students[student_id]
-            flash(f'Student {student_id} has been deleted from mock database', 'warning')
+    try:
+        backend.delete_student(student_id)
+        students_cache.remove(student_id)
+        flash(f'Student {student_id} has been deleted successfully', 'success')
+    except Exception as e:
+        app.logger.error(f"Error deleting student from database: {e}")
+        flash(f'Error deleting student: {str(e)}', 'error')
     
     return redirect('/admin/dashboard')
 
+@app.route('/admin/backend_status')
+def backend_status():
+    """Storage backend circuit state and the journal backlog"""
+    if not check_admin():
+        return redirect('/admin/login')
+    status = backend.stats() if hasattr(backend, 'stats') else {'backend': backend.name}
+    status['journal_pending'] = attendance_journal.pending_count()
+    return jsonify(status)
+
+@app.route('/admin/students_cache')
+def students_cache_status():
+    """Students cache size, hit counts and staleness"""
+    if not check_admin():
+        return redirect('/admin/login')
+    return jsonify(students_cache.stats())
+
+@app.route('/admin/scopes')
+def scopes_status():
+    """Roster scopes with their tagged students and enrolled faces"""
+    if not check_admin():
+        return redirect('/admin/login')
+    scopes = students_cache.scopes()
+    gallery.set_scopes(scopes)
+    faces = gallery.scopes()
+    return jsonify({scope: {'students': len(members), 'faces': faces.get(scope, 0)}
+                    for scope, members in sorted(scopes.items())})
+
+@app.route('/admin/slow_requests', methods=['GET', 'POST'])
+def slow_request_captures():
+    """Slow scan captures and the profiler switch"""
+    if not check_admin():
+        return redirect('/admin/login')
+    
+    if request.method == 'POST':
+        try:
+            slow_requests.configure(enabled=request.form.get('enabled') == 'on',
+                                    threshold_ms=request.form.get('threshold_ms') or None,
+                                    save_frames=request.form.get('save_frames') == 'on')
+            flash('Profiler settings saved', 'success')
+        except ValueError:
+            flash('Threshold must be a number of milliseconds', 'error')
+        return redirect(url_for('slow_request_captures'))
+    
+    return render_template('slow_requests.html', settings=slow_requests.settings(),
+                           captures=slow_requests.captures())
+
+@app.route('/admin/slow_requests/<capture_id>/<filename>')
+def slow_request_file(capture_id, filename):
+    """Profile, capture details or a saved frame of one slow request"""
+    if not check_admin():
+        return redirect('/admin/login')
+    try:
+        path = slow_requests.capture_path(capture_id)
+    except ValueError:
+        return jsonify({'error': 'Capture not found'}), 404
+    mimetype = 'text/plain' if filename.endswith('.txt') else None
+    return send_from_directory(os.path.abspath(path), filename, mimetype=mimetype)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Durable local write-ahead journal for attendance scans.
+
+Scans commit attendance to a local SQLite database (WAL mode) and return
+immediately. A background replayer pushes pending entries to the remote
+database in batches, retrying with exponential backoff, so kiosks keep
+working through network blips and the backlog drains once the database is
+reachable again.
+
+Every entry carries an idempotency key derived from the date and student id.
+Attendance is recorded at most once per student per day, so replaying the same
+key twice can never double-count a scan.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOURNAL_PATH = os.environ.get("ATTENDANCE_JOURNAL_PATH", "attendance_journal.db")
+# Synced entries are kept this long so is_marked still answers for today, then deleted
+RETENTION_DAYS = float(os.environ.get("ATTENDANCE_JOURNAL_RETENTION_DAYS", 2))
+
+
+def make_idempotency_key(date_str, student_id):
+    """Build the idempotency key for one student's attendance on one day."""
+    return f"{date_str}_{student_id}"
+
+
+class AttendanceJournal:
+    """Append-only attendance journal backed by SQLite in WAL mode."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        # SQLite connections cannot be shared across threads, so each Flask
+        # worker thread and the replayer get their own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS attendance_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    student_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    synced_at REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_journal_pending "
+                "ON attendance_journal(synced_at, id)"
+            )
+
+    def record(self, student_id, date_str, time_str):
+        """Durably record a scan. Returns False if the student is already journaled for that day."""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO attendance_journal "
+                "(idempotency_key, student_id, date, time, created_at) VALUES (?, ?, ?, ?, ?)",
+                (make_idempotency_key(date_str, student_id), student_id, date_str, time_str, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def is_marked(self, student_id, date_str):
+        """Check whether the student already has a journal entry for the day."""
+        row = self._connect().execute(
+            "SELECT 1 FROM attendance_journal WHERE idempotency_key = ?",
+            (make_idempotency_key(date_str, student_id),),
+        ).fetchone()
+        return row is not None
+
+    def pending(self, limit=200):
+        """Return up to ``limit`` unsynced entries, oldest first."""
+        rows = self._connect().execute(
+            "SELECT id, idempotency_key, student_id, date, time, attempts "
+            "FROM attendance_journal WHERE synced_at IS NULL ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_count(self):
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM attendance_journal WHERE synced_at IS NULL"
+        ).fetchone()
+        return row[0]
+
+    def mark_synced(self, entry_ids):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE attendance_journal SET synced_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), entry_id) for entry_id in entry_ids],
+            )
+
+    def mark_failed(self, entry_ids, error):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE attendance_journal SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(str(error), entry_id) for entry_id in entry_ids],
+            )
+
+    def prune_synced(self, retention_days=RETENTION_DAYS):
+        """Delete entries synced more than ``retention_days`` ago. Returns how many were deleted."""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM attendance_journal WHERE synced_at IS NOT NULL AND synced_at < ?",
+                (time.time() - retention_days * 86400,),
+            )
+        return cursor.rowcount
+
+
+class JournalReplayer(threading.Thread):
+    """Background thread that drains the journal into the remote database.
+
+    ``push_batch`` receives a list of journal entries and must either apply all
+    of them or raise. Entries with ``attempts > 0`` may already have reached
+    the database before a previous failure, so ``push_batch`` should use their
+    idempotency keys to skip anything already applied.
+    """
+
+    def __init__(self, journal, push_batch, batch_size=200, interval=2.0, max_backoff=60.0, logger=None):
+        super().__init__(name="attendance-journal-replayer", daemon=True)
+        self.journal = journal
+        self.push_batch = push_batch
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.logger = logger
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._backoff = interval
+        # After a failed drain, no retry before this time (time.monotonic()), even when woken
+        self._retry_at = 0.0
+
+    def wake(self):
+        """Ask the replayer to flush now instead of waiting for the next interval.
+
+        While backing off after a failure the retry still waits for the backoff
+        to run out, so scans during an outage do not turn into retries.
+        """
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self._backoff)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            remaining = self._retry_at - time.monotonic()
+            if remaining > 0 and self._stopped.wait(remaining):
+                break
+            self._wake.clear()
+            if self.drain():
+                self._backoff = self.interval
+                self._retry_at = 0.0
+            else:
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self._retry_at = time.monotonic() + self._backoff
+
+    def drain(self):
+        """Push pending entries batch by batch. Returns False if a batch failed."""
+        while True:
+            batch = self.journal.pending(self.batch_size)
+            if not batch:
+                self._prune()
+                return True
+            entry_ids = [entry["id"] for entry in batch]
+            try:
+                self.push_batch(batch)
+            except Exception as e:
+                self.journal.mark_failed(entry_ids, e)
+                if self.logger:
+                    self.logger.error(f"Journal replay failed for {len(batch)} entries: {e}")
+                return False
+            self.journal.mark_synced(entry_ids)
+
+    def _prune(self):
+        try:
+            self.journal.prune_synced()
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.error(f"Journal prune failed: {e}")
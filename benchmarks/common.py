@@ -0,0 +1,53 @@
+"""Helpers shared by the benchmark scripts."""
+
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+# The project modules live at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def latency_summary(samples_ms):
+    """Count, mean and p50/p95/p99/max of latency samples in milliseconds."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if len(samples) == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(samples.max()),
+    }
+
+
+def environment():
+    """Where a result was measured, so runs on different machines are not compared blindly."""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def write_results(results, path=None):
+    """Write results as JSON to ``path``, or to stdout when no path is given."""
+    text = json.dumps(results, indent=2, default=str)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+        print(f"[OK] Results written to {path}", file=sys.stderr)
+    else:
+        print(text)
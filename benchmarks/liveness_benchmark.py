@@ -0,0 +1,247 @@
+"""
+Replay labelled clips through the liveness detectors and the recognition pipeline.
+
+Clips are grouped by label, one folder per presentation type:
+
+    clips/
+        live/             bona fide presentations
+        printed_photo/    attacks
+        screen_replay/    attacks
+        <other>/          any other folder is treated as another attack type
+
+A clip is a video file (.mp4, .avi, .mov, .mkv), a folder of frames
+(.png/.jpg, sorted by name), or a single image. Live clips whose name starts
+with a student id (``321654_take1.mp4``) are also scored for recognition
+against the gallery.
+
+Every detector sees each clip frame by frame, as in a liveness session, and
+decides at the first frame that passes (after MIN_FRAMES). The report has
+per-frame latency percentiles, throughput, frames to decision, and
+ISO/IEC 30107-3 style error rates:
+
+    APCER  attacks accepted as live, per attack type (the worst type is reported)
+    BPCER  live presentations rejected
+    ACER   (worst APCER + BPCER) / 2
+
+Usage:
+    python benchmarks/liveness_benchmark.py clips/ --output liveness_results.json
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+from common import environment, latency_summary, write_results
+
+from face_gallery import DEFAULT_ENCODE_FILE, FaceGallery
+from ultra_simple_liveness import MIN_FRAMES
+
+LIVE_LABEL = "live"
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+
+
+def available_detectors():
+    """``{name: factory}`` for every liveness detector that imports in this environment."""
+    detectors = {}
+    from ultra_simple_liveness import UltraSimpleLivenessDetector
+    detectors["ultra_simple"] = UltraSimpleLivenessDetector
+    # The blink detector imports cheaply but needs face_recognition on its first frame
+    import face_pipeline
+    if face_pipeline.available():
+        from simple_blink_detection import SimpleBlinkLivenessDetector
+        detectors["blink"] = SimpleBlinkLivenessDetector
+    else:
+        print("[WARNING] Blink detector unavailable: face_recognition is not installed", file=sys.stderr)
+    return detectors
+
+
+def load_clip(path, max_frames):
+    """Read up to ``max_frames`` BGR frames from a video, a folder of frames or an image."""
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        frames = [cv2.imread(os.path.join(path, name)) for name in names[:max_frames]]
+    elif os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        capture = cv2.VideoCapture(path)
+        frames = []
+        while len(frames) < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+    else:
+        frames = [cv2.imread(path)]
+    return [frame for frame in frames if frame is not None]
+
+
+def discover_clips(root):
+    """Yield ``(label, clip_name, path)`` for every clip under ``root``."""
+    for label in sorted(os.listdir(root)):
+        label_dir = os.path.join(root, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            path = os.path.join(label_dir, name)
+            extension = os.path.splitext(name)[1].lower()
+            if os.path.isdir(path) or extension in VIDEO_EXTENSIONS | IMAGE_EXTENSIONS:
+                yield label, name, path
+
+
+def run_detector(detector, frames):
+    """Feed frames one at a time; return ``(decided_live, frames_to_decision, per_frame_ms)``."""
+    detector.reset_detection()
+    timings = []
+    decision_frame = None
+    for index, frame in enumerate(frames, start=1):
+        start = time.perf_counter()
+        result = detector.update(frame)
+        timings.append((time.perf_counter() - start) * 1000)
+        if decision_frame is None and index >= MIN_FRAMES and result["is_live"]:
+            decision_frame = index
+    return decision_frame is not None, decision_frame, timings
+
+
+def error_rates(decisions):
+    """APCER per attack type, BPCER and ACER from ``[(label, decided_live)]``."""
+    by_label = {}
+    for label, decided_live in decisions:
+        by_label.setdefault(label, []).append(decided_live)
+    live = by_label.pop(LIVE_LABEL, [])
+    bpcer = (sum(not accepted for accepted in live) / len(live)) if live else None
+    apcer = {label: sum(accepted) / len(accepted) for label, accepted in by_label.items()}
+    worst_apcer = max(apcer.values()) if apcer else None
+    acer = (worst_apcer + bpcer) / 2 if worst_apcer is not None and bpcer is not None else None
+    return {
+        "bona_fide_clips": len(live),
+        "attack_clips": {label: len(accepted) for label, accepted in by_label.items()},
+        "apcer": apcer,
+        "apcer_max": worst_apcer,
+        "bpcer": bpcer,
+        "acer": acer,
+    }
+
+
+def benchmark_liveness(clips, detectors):
+    results = {}
+    for name, factory in detectors.items():
+        detector = factory()
+        decisions, timings, to_decision = [], [], []
+        per_clip = []
+        for label, clip_name, frames in clips:
+            decided_live, decision_frame, clip_timings = run_detector(detector, frames)
+            decisions.append((label, decided_live))
+            timings.extend(clip_timings)
+            if decided_live:
+                to_decision.append(decision_frame)
+            per_clip.append({"label": label, "clip": clip_name, "frames": len(frames),
+                             "decided_live": decided_live, "decision_frame": decision_frame})
+        total_seconds = sum(timings) / 1000
+        results[name] = {
+            "per_frame": latency_summary(timings),
+            "throughput_fps": len(timings) / total_seconds if total_seconds else None,
+            "mean_frames_to_decision": sum(to_decision) / len(to_decision) if to_decision else None,
+            "errors": error_rates(decisions),
+            "clips": per_clip,
+        }
+    return results
+
+
+def benchmark_recognition(clips, gallery):
+    """Time detection + landmarks, encoding and matching on one frame of each live clip."""
+    from face_pipeline import analyse_faces, encode_face
+
+    stages = {"detect_landmarks": [], "encode": [], "match": []}
+    outcomes = {"correct": 0, "wrong_identity": 0, "false_reject": 0, "false_accept": 0, "no_face": 0}
+    enrolled = set(gallery.student_ids)
+    for label, clip_name, frames in clips:
+        expected = clip_name.split("_")[0].split(".")[0]
+        if label != LIVE_LABEL or not frames:
+            continue
+        rgb_image = cv2.cvtColor(frames[len(frames) // 2], cv2.COLOR_BGR2RGB)
+
+        start = time.perf_counter()
+        faces = analyse_faces(rgb_image, encode=False)
+        stages["detect_landmarks"].append((time.perf_counter() - start) * 1000)
+        if not faces:
+            outcomes["no_face"] += 1
+            continue
+
+        start = time.perf_counter()
+        face = encode_face(rgb_image, faces[0])
+        stages["encode"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        matched_id, _ = gallery.match(face.encoding)
+        stages["match"].append((time.perf_counter() - start) * 1000)
+
+        if expected not in enrolled:
+            # Not enrolled: rejecting is the right answer
+            outcomes["correct" if matched_id is None else "false_accept"] += 1
+        elif matched_id is None:
+            outcomes["false_reject"] += 1
+        else:
+            outcomes["correct" if matched_id == expected else "wrong_identity"] += 1
+
+    scored = sum(outcomes.values())
+    return {
+        "gallery_size": len(gallery),
+        "stages": {stage: latency_summary(samples) for stage, samples in stages.items()},
+        "outcomes": outcomes,
+        "accuracy": outcomes["correct"] / scored if scored else None,
+    }
+
+
+def _rate(value):
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def print_summary(results):
+    for name, result in results["liveness"].items():
+        errors = result["errors"]
+        per_frame = result["per_frame"]
+        print(f"{name:>14}: p50 {per_frame.get('p50_ms', 0):.2f} ms  p95 {per_frame.get('p95_ms', 0):.2f} ms  "
+              f"APCER(max) {_rate(errors['apcer_max'])}  BPCER {_rate(errors['bpcer'])}  ACER {_rate(errors['acer'])}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Liveness and recognition benchmark over labelled clips")
+    parser.add_argument("clips", help="folder with one subfolder per label (live, printed_photo, screen_replay, ...)")
+    parser.add_argument("--detectors", nargs="*", help="detectors to run (default: all available)")
+    parser.add_argument("--max-frames", type=int, default=30, help="frames read per clip")
+    parser.add_argument("--encode-file", default=DEFAULT_ENCODE_FILE, help="gallery for the recognition benchmark")
+    parser.add_argument("--skip-recognition", action="store_true")
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    detectors = available_detectors()
+    if args.detectors:
+        detectors = {name: factory for name, factory in detectors.items() if name in args.detectors}
+
+    clips = [(label, name, load_clip(path, args.max_frames)) for label, name, path in discover_clips(args.clips)]
+    clips = [clip for clip in clips if clip[2]]
+    if not clips:
+        parser.error(f"no readable clips under {args.clips}")
+
+    results = {
+        "environment": environment(),
+        "clips": len(clips),
+        "max_frames": args.max_frames,
+        "liveness": benchmark_liveness(clips, detectors),
+    }
+    if not args.skip_recognition:
+        try:
+            results["recognition"] = benchmark_recognition(clips, FaceGallery.load(args.encode_file))
+        except ImportError as e:
+            print(f"[WARNING] Recognition benchmark skipped: {e}", file=sys.stderr)
+
+    print_summary(results)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
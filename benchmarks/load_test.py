@@ -0,0 +1,386 @@
+"""
+HTTP load test for the scan endpoints of app.py.
+
+Payloads are built from the photos in ``Images/`` plus synthetic variants
+(brightness, contrast, flips, small rotations, rescaling, sensor noise and
+JPEG quality), so requests are not byte-identical. Multi-frame scans get a
+short burst of slightly shifted frames, as a webcam would send.
+
+Each endpoint is driven at every requested concurrency level in turn, by
+that many worker threads with one keep-alive connection each. A step runs
+for ``--duration`` seconds (or ``--requests`` requests) after a short warm-up.
+The report has throughput, p50/p95/p99 latency, and a breakdown of outcomes.
+Outcomes are the app's own answers, such as a match, no face or already
+marked, kept apart from errors such as HTTP 5xx, timeouts and "Processing
+error". When the server exposes ``/metrics``, the mean time per pipeline
+stage is included as well.
+
+Run it against a server on an offline backend so the numbers measure this
+code rather than the network. ``--start-server`` launches app.py with
+``FIREBASE_EMULATION=fake`` (or ``--backend sqlite``):
+
+    python benchmarks/load_test.py --start-server --concurrency 1 4 16 --output load.json
+    python benchmarks/load_test.py --url http://kiosk:5000 --compare load.json
+
+``--compare`` reports throughput and p95 changes against an earlier result
+file and exits with status 1 when a step regressed by more than
+``--tolerance``.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from common import REPO_ROOT, environment, latency_summary, write_results
+
+IMAGES_DIR = os.path.join(REPO_ROOT, "Images")
+ENDPOINTS = {
+    "scan": ("/attendance/scan", "frame"),
+    "multi_frame": ("/attendance/scan_multi_frame", "frames"),
+    "match": ("/match", "image"),
+}
+MULTI_FRAME_COUNT = 5
+ERROR_MESSAGES = {"Processing error", "Error saving attendance"}
+
+
+def augment(image, rng):
+    """A randomly lit, flipped, rotated, rescaled and noisy copy of ``image``."""
+    h, w = image.shape[:2]
+    alpha = rng.uniform(0.75, 1.25)
+    beta = rng.uniform(-30, 30)
+    out = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
+    if rng.random() < 0.5:
+        out = cv2.flip(out, 1)
+    scale = rng.uniform(0.8, 1.2)
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-10, 10), scale)
+    out = cv2.warpAffine(out, rotation, (w, h), borderMode=cv2.BORDER_REFLECT)
+    noise = rng.normal(0, rng.uniform(0, 6), out.shape)
+    return np.clip(out + noise, 0, 255).astype(np.uint8)
+
+
+def burst(image, rng, count=MULTI_FRAME_COUNT):
+    """Frames of a small natural head movement around ``image``.
+
+    The face shifts and also deforms smoothly (a rigid warp of one photo is
+    exactly what the liveness check rejects), so most bursts reach recognition.
+    """
+    h, w = image.shape[:2]
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    frames = []
+    for index in range(count):
+        phase = 2 * np.pi * index / count + rng.uniform(0, 0.5)
+        amplitude = 0.02 * min(h, w)
+        map_x = xs + amplitude * np.sin(ys / h * 2 * np.pi + phase) + rng.uniform(-1, 1)
+        map_y = ys + amplitude * np.sin(xs / w * 2 * np.pi + phase)
+        frames.append(cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT))
+    return frames
+
+
+def encode_jpeg(image, rng):
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(rng.uniform(60, 95))])
+    return buffer.tobytes()
+
+
+def build_payloads(images_dir, variants, seed=0):
+    """``{endpoint: [list of (field, filename, jpeg bytes) per request]}``."""
+    rng = np.random.default_rng(seed)
+    sources = []
+    for name in sorted(os.listdir(images_dir)):
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is not None:
+            sources.append(image)
+    if not sources:
+        raise SystemExit(f"No readable images in {images_dir}")
+
+    payloads = {name: [] for name in ENDPOINTS}
+    for index in range(variants):
+        source = sources[index % len(sources)]
+        # The first pass over the sources sends the originals unchanged
+        image = source if index < len(sources) else augment(source, rng)
+        jpeg = encode_jpeg(image, rng)
+        payloads["scan"].append([("frame", "frame.jpg", jpeg)])
+        payloads["match"].append([("image", "upload.jpg", jpeg)])
+        payloads["multi_frame"].append(
+            [("frames", f"frame{i}.jpg", encode_jpeg(frame, rng)) for i, frame in enumerate(burst(image, rng))])
+    return payloads
+
+
+def multipart(parts):
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for field, filename, data in parts:
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: image/jpeg\r\n\r\n".encode("ascii"))
+        chunks.append(data)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    return b"".join(chunks), f"multipart/form-data; boundary={boundary}"
+
+
+def classify(status, body, content_type):
+    """``(outcome, is_error)`` for one response."""
+    if status >= 500:
+        return f"http_{status}", True
+    if status in (301, 302, 303):
+        # /match redirects back to the upload form with a flashed message
+        return "redirect", False
+    if status >= 400:
+        return f"http_{status}", True
+    if "json" in (content_type or ""):
+        try:
+            answer = json.loads(body)
+        except ValueError:
+            return "bad_json", True
+        if answer.get("success"):
+            return "success", False
+        message = answer.get("message", "unknown")
+        return message, message in ERROR_MESSAGES
+    return "ok", False
+
+
+class Worker(threading.Thread):
+    def __init__(self, target, path, payloads, stop_at, max_requests, timeout, offset):
+        super().__init__(daemon=True)
+        self.target = target
+        self.path = path
+        self.payloads = payloads
+        self.stop_at = stop_at
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.offset = offset
+        self.samples = []
+        self.outcomes = {}
+        self.errors = 0
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.target.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.target.hostname, self.target.port, timeout=self.timeout)
+
+    def _record(self, outcome, is_error):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.errors += is_error
+
+    def run(self):
+        connection = self._connect()
+        index = self.offset
+        while time.monotonic() < self.stop_at and (self.max_requests is None or len(self.samples) < self.max_requests):
+            body, content_type = multipart(self.payloads[index % len(self.payloads)])
+            index += 1
+            start = time.perf_counter()
+            try:
+                connection.request("POST", self.path, body=body, headers={"Content-Type": content_type})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.samples.append((time.perf_counter() - start) * 1000)
+                self._record("timeout" if isinstance(e, TimeoutError) else f"connection_error:{type(e).__name__}", True)
+                connection.close()
+                connection = self._connect()
+                continue
+            self.samples.append((time.perf_counter() - start) * 1000)
+            self._record(*classify(response.status, data, response.getheader("Content-Type")))
+            if response.getheader("Connection", "").lower() == "close":
+                connection.close()
+                connection = self._connect()
+        connection.close()
+
+
+def scrape_stages(target, timeout=5):
+    """``{(route, stage): (sum_seconds, count)}`` from the server's /metrics, or None."""
+    try:
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=timeout)
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        text = response.read().decode("utf-8")
+        connection.close()
+    except (OSError, http.client.HTTPException):
+        return None
+    if response.status != 200:
+        return None
+    stages = {}
+    for line in text.splitlines():
+        for suffix, slot in (("_sum{", 0), ("_count{", 1)):
+            prefix = f"attendance_stage_seconds{suffix}"
+            if line.startswith(prefix):
+                labels, value = line[len(prefix):].rsplit("} ", 1)
+                pairs = dict(item.split("=", 1) for item in labels.split(","))
+                key = (pairs["route"].strip('"'), pairs["stage"].strip('"'))
+                stages.setdefault(key, [0.0, 0])[slot] = float(value)
+    return stages
+
+
+def stage_means(before, after, route):
+    """Mean milliseconds per stage of ``route`` between two scrapes."""
+    if before is None or after is None:
+        return None
+    means = {}
+    for (stage_route, stage), (total, count) in after.items():
+        if stage_route != route:
+            continue
+        previous_total, previous_count = before.get((stage_route, stage), (0.0, 0))
+        if count > previous_count:
+            means[stage] = (total - previous_total) / (count - previous_count) * 1000
+    return means
+
+
+def run_step(target, endpoint, payloads, concurrency, duration, max_requests, warmup, timeout):
+    path = ENDPOINTS[endpoint][0]
+    if warmup:
+        run_workers(target, path, payloads, concurrency, warmup, None, timeout)
+    before = scrape_stages(target)
+    per_worker = None if max_requests is None else max(1, max_requests // concurrency)
+    workers, elapsed = run_workers(target, path, payloads, concurrency, duration, per_worker, timeout)
+    after = scrape_stages(target)
+
+    samples = [sample for worker in workers for sample in worker.samples]
+    outcomes = {}
+    for worker in workers:
+        for outcome, count in worker.outcomes.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    errors = sum(worker.errors for worker in workers)
+    return {
+        "endpoint": endpoint,
+        "path": path,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(samples) / elapsed if elapsed else None,
+        "latency": latency_summary(samples),
+        "error_rate": errors / len(samples) if samples else None,
+        "outcomes": dict(sorted(outcomes.items(), key=lambda item: -item[1])),
+        "stage_means_ms": stage_means(before, after, path),
+    }
+
+
+def run_workers(target, path, payloads, concurrency, duration, per_worker, timeout):
+    stop_at = time.monotonic() + duration
+    workers = [Worker(target, path, payloads, stop_at, per_worker, timeout, offset=i * 7) for i in range(concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return workers, time.perf_counter() - start
+
+
+def start_server(port, backend):
+    """Launch app.py on an offline backend and wait until it answers."""
+    env = dict(os.environ)
+    if backend == "fake":
+        env["FIREBASE_EMULATION"] = "fake"
+    else:
+        env["STORAGE_BACKEND"] = "sqlite"
+    # Without the debug reloader, and threaded like a production server
+    code = f"import app; app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=REPO_ROOT, env=env)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"app.py exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            print(f"[OK] app.py listening on port {port} ({backend} backend)", file=sys.stderr)
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("app.py did not start within 120 seconds")
+
+
+def compare(results, baseline, tolerance):
+    """Print per-step changes against ``baseline``; return True if any step regressed."""
+    previous = {(step["endpoint"], step["concurrency"]): step for step in baseline.get("steps", [])}
+    regressed = False
+    for step in results["steps"]:
+        old = previous.get((step["endpoint"], step["concurrency"]))
+        if old is None or not old.get("throughput_rps") or not step.get("throughput_rps"):
+            continue
+        throughput_change = step["throughput_rps"] / old["throughput_rps"] - 1
+        old_p95 = old["latency"].get("p95_ms")
+        new_p95 = step["latency"].get("p95_ms")
+        p95_change = new_p95 / old_p95 - 1 if old_p95 and new_p95 else 0.0
+        worse = throughput_change < -tolerance or p95_change > tolerance
+        regressed |= worse
+        print(f"{'[WARNING]' if worse else '[OK]'} {step['endpoint']} x{step['concurrency']}: "
+              f"throughput {throughput_change:+.1%}, p95 {p95_change:+.1%}", file=sys.stderr)
+    return regressed
+
+
+def print_summary(results):
+    for step in results["steps"]:
+        latency = step["latency"]
+        print(f"{step['endpoint']:>12} x{step['concurrency']:<3} {step['throughput_rps'] or 0:8.1f} req/s  "
+              f"p50 {latency.get('p50_ms', 0):7.1f} ms  p95 {latency.get('p95_ms', 0):7.1f} ms  "
+              f"p99 {latency.get('p99_ms', 0):7.1f} ms  errors {step['error_rate'] or 0:.1%}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test for the attendance scan endpoints")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to load")
+    parser.add_argument("--start-server", action="store_true", help="launch app.py on an offline backend first")
+    parser.add_argument("--backend", choices=("fake", "sqlite"), default="fake", help="offline backend for --start-server")
+    parser.add_argument("--endpoints", nargs="*", choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per step")
+    parser.add_argument("--requests", type=int, help="stop a step after this many requests instead")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unrecorded load before each step")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--images", default=IMAGES_DIR, help="folder of source photos")
+    parser.add_argument("--variants", type=int, default=60, help="distinct payloads per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput or p95 change")
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    duration = args.duration if args.requests is None else float("inf")
+    payloads = build_payloads(args.images, args.variants, args.seed)
+
+    server = start_server(target.port or 80, args.backend) if args.start_server else None
+    try:
+        steps = []
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                print(f"[OK] {endpoint} at concurrency {concurrency}", file=sys.stderr)
+                steps.append(run_step(target, endpoint, payloads[endpoint], concurrency, duration,
+                                      args.requests, args.warmup, args.timeout))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {
+        "environment": environment(),
+        "url": args.url,
+        "backend": args.backend if args.start_server else "external",
+        "duration_s": args.duration,
+        "requests_per_step": args.requests,
+        "variants": args.variants,
+        "steps": steps,
+    }
+    print_summary(results)
+    write_results(results, args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Face matching micro-benchmark over synthetic galleries from 1k to 1M faces.
+
+The project only has a handful of enrolled faces, so galleries are generated.
+Each synthetic identity is a point in the 128-d dlib descriptor space, drawn
+around the mean of the real encodings in EncodeFile.p (when it exists) with a
+decaying per-dimension spread. The spread is scaled so that two different
+people are typically ``IMPOSTOR_DISTANCE`` apart. Each identity is enrolled
+once, with capture noise, so that another capture of the same person
+typically lands ``GENUINE_DISTANCE`` from the enrolled one. These are the
+usual figures for dlib's model with its 0.6 tolerance. In large galleries
+the nearest stranger gets much closer than the typical one, which is exactly
+what the recall figures show.
+
+Every matcher answers the same probes:
+
+- genuine probes, a new capture of an enrolled identity;
+- impostor probes, people who are not enrolled.
+
+For each matcher the report gives build time, the memory it keeps
+(``resident_bytes``) and the peak extra memory per query (tracemalloc). It
+also gives per-query latency percentiles and throughput, and:
+
+    recall              genuine probes matched to the right student
+    false_accept_rate   impostor probes matched to anyone
+    exact_agreement     answers identical to an exact float64 search
+
+Matchers are registered in ``MATCHERS``. ``face_recognition`` is the pattern
+main.py and web_app.py use: ``compare_faces`` and ``face_distance`` over the
+pickled list of encodings. ``face_gallery`` is FaceGallery.match, as used by
+app.py. ``face_gallery_float16`` and ``face_gallery_int8`` scan quantized
+codes, with the exact encodings memory-mapped from a scratch file and
+re-ranked. Their ``resident_bytes`` counts only what stays in RAM.
+
+Students are also split into random rosters of ``--roster-size`` (the
+classes a kiosk serves). Each genuine probe names its student's roster and
+each impostor probe a random roster. ``face_gallery_scoped`` searches only
+that shard, and ``face_gallery_scoped_fall_through`` searches the whole
+gallery when the shard has no match. The other matchers ignore the scope.
+For the scoped matchers ``exact_agreement`` is still measured against the
+global search, so the strangers a shard rules out show up as disagreement
+(and as a lower false-accept rate).
+
+Usage:
+    python benchmarks/matching_benchmark.py --sizes 1000 10000 100000 1000000 --output matching.json
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from common import REPO_ROOT, environment, latency_summary, write_results
+
+from face_gallery import MATCH_TOLERANCE, FaceGallery
+
+DIMENSIONS = 128
+GENUINE_DISTANCE = 0.4
+IMPOSTOR_DISTANCE = 0.85
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+ROSTER_SIZE = 50
+CHUNK_ROWS = 100000
+
+try:
+    from face_recognition import compare_faces, face_distance
+    BASELINE_SOURCE = "face_recognition"
+except ImportError:
+    # The same two functions as face_recognition.api, so the baseline can be
+    # measured where dlib is not installed
+    BASELINE_SOURCE = "numpy copy of face_recognition.api"
+
+    def face_distance(face_encodings, face_to_compare):
+        if len(face_encodings) == 0:
+            return np.empty((0))
+        return np.linalg.norm(face_encodings - face_to_compare, axis=1)
+
+    def compare_faces(known_face_encodings, face_encoding_to_check, tolerance=0.6):
+        return list(face_distance(known_face_encodings, face_encoding_to_check) <= tolerance)
+
+
+class SyntheticFaces:
+    """Generator for identities, enrollments and probes in descriptor space."""
+
+    def __init__(self, seed=0, encode_file=os.path.join(REPO_ROOT, "EncodeFile.p")):
+        self.rng = np.random.default_rng(seed)
+        mean = None
+        if os.path.exists(encode_file):
+            with open(encode_file, "rb") as f:
+                encodings, _ = pickle.load(f)
+            if len(encodings):
+                mean = np.mean(np.asarray(encodings, dtype=np.float64), axis=0)
+        self.mean = mean if mean is not None else self.rng.normal(0, 0.1, DIMENSIONS)
+        # Decaying spread with a random orientation, like a learned embedding
+        spread = 1.0 / np.sqrt(np.arange(1, DIMENSIONS + 1))
+        spread *= IMPOSTOR_DISTANCE / np.sqrt(2 * np.sum(spread ** 2))
+        rotation, _ = np.linalg.qr(self.rng.normal(size=(DIMENSIONS, DIMENSIONS)))
+        self.basis = (rotation * spread).T
+        # Capture noise: two captures of one person are GENUINE_DISTANCE apart
+        self.noise = GENUINE_DISTANCE / np.sqrt(2 * DIMENSIONS)
+
+    def identities(self, count):
+        return self.mean + self.rng.standard_normal((count, DIMENSIONS)) @ self.basis
+
+    def capture(self, identities):
+        return identities + self.rng.normal(0, self.noise, identities.shape)
+
+    def gallery(self, size):
+        """``(encodings, student_ids, identities)``, generated in chunks to bound peak memory."""
+        encodings = np.empty((size, DIMENSIONS), dtype=np.float64)
+        identities = np.empty((size, DIMENSIONS), dtype=np.float32)
+        for start in range(0, size, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, size)
+            chunk = self.identities(stop - start)
+            identities[start:stop] = chunk
+            encodings[start:stop] = self.capture(chunk)
+        student_ids = [f"S{index:07d}" for index in range(size)]
+        return encodings, student_ids, identities
+
+    def probes(self, identities, student_ids, count):
+        """Alternating genuine and impostor probes: ``[(encoding, expected_id or None)]``."""
+        genuine_rows = self.rng.choice(len(identities), size=(count + 1) // 2, replace=len(identities) < count)
+        genuine = self.capture(identities[genuine_rows].astype(np.float64))
+        impostors = self.capture(self.identities(count // 2))
+        probes = []
+        for index in range(count):
+            if index % 2 == 0:
+                probes.append((genuine[index // 2], student_ids[genuine_rows[index // 2]]))
+            else:
+                probes.append((impostors[index // 2], None))
+        return probes
+
+    def rosters(self, student_ids, roster_size=ROSTER_SIZE):
+        """Random rosters of ``roster_size`` students: ``{scope: frozenset of ids}``."""
+        order = self.rng.permutation(len(student_ids))
+        return {f"roster:{start // roster_size}": frozenset(student_ids[row] for row in order[start:start + roster_size])
+                for start in range(0, len(order), roster_size)}
+
+    def probe_scopes(self, probes, rosters):
+        """The roster each probe is scanned in: its student's, or a random one for impostors."""
+        scope_of = {student_id: scope for scope, members in rosters.items() for student_id in members}
+        names = sorted(rosters)
+        return [scope_of[wanted] if wanted is not None else names[self.rng.integers(len(names))]
+                for _, wanted in probes]
+
+
+def exact_answers(encodings, student_ids, probes, tolerance=MATCH_TOLERANCE):
+    """Reference answers from an exact float64 search, chunked over the gallery."""
+    queries = np.stack([probe for probe, _ in probes])
+    best_distance = np.full(len(queries), np.inf)
+    best_index = np.zeros(len(queries), dtype=np.int64)
+    query_norms = np.einsum("ij,ij->i", queries, queries)
+    for start in range(0, len(encodings), CHUNK_ROWS):
+        chunk = encodings[start:start + CHUNK_ROWS]
+        squared = np.einsum("ij,ij->i", chunk, chunk)[None, :] - 2 * queries @ chunk.T + query_norms[:, None]
+        index = np.argmin(squared, axis=1)
+        distance = np.sqrt(np.maximum(squared[np.arange(len(queries)), index], 0))
+        better = distance < best_distance
+        best_distance[better] = distance[better]
+        best_index[better] = index[better] + start
+    return [student_ids[i] if d <= tolerance else None for i, d in zip(best_index, best_distance)]
+
+
+def build_face_recognition(encodings, student_ids, rosters):
+    # main.py and web_app.py keep the pickled list of per-face arrays
+    known = list(encodings)
+
+    def match(encoding, scope=None):
+        matches = compare_faces(known, encoding, MATCH_TOLERANCE)
+        distances = face_distance(known, encoding)
+        best = int(np.argmin(distances))
+        return (student_ids[best] if matches[best] else None), float(distances[best])
+
+    return match, encodings.nbytes + sys.getsizeof(known) + sum(sys.getsizeof(row) for row in known)
+
+
+def build_face_gallery(encodings, student_ids, rosters):
+    gallery = FaceGallery(encodings, student_ids, quantization=None)
+    return (lambda encoding, scope=None: gallery.match(encoding)), gallery.encodings.nbytes
+
+
+def scoped_gallery(fall_through):
+    def build(encodings, student_ids, rosters):
+        gallery = FaceGallery(encodings, student_ids, quantization=None)
+        gallery.set_scopes(rosters)
+        # Build the shard rows up front, as app.py does once per roster change
+        gallery.scopes()
+
+        def match(encoding, scope=None):
+            return gallery.match(encoding, scope=scope, fall_through=fall_through)
+
+        return match, gallery.encodings.nbytes
+
+    return build
+
+
+_scratch = None
+
+
+def quantized_gallery(quantization):
+    def build(encodings, student_ids, rosters):
+        global _scratch
+        if _scratch is None:
+            _scratch = tempfile.TemporaryDirectory(prefix="matching-benchmark-")
+        gallery = FaceGallery(encodings, student_ids, quantization=quantization)
+        gallery.map_exact(os.path.join(_scratch.name, f"{quantization}-{len(student_ids)}.npy"))
+        usage = gallery.memory_usage()
+        return (lambda encoding, scope=None: gallery.match(encoding)), usage["codes"] + usage["exact_in_memory"]
+
+    return build
+
+
+# name -> build(encodings, student_ids, rosters) returning
+# (match(encoding, scope) -> (student_id, distance), resident bytes)
+MATCHERS = {
+    "face_recognition": build_face_recognition,
+    "face_gallery": build_face_gallery,
+    "face_gallery_float16": quantized_gallery("float16"),
+    "face_gallery_int8": quantized_gallery("int8"),
+    "face_gallery_scoped": scoped_gallery(fall_through=False),
+    "face_gallery_scoped_fall_through": scoped_gallery(fall_through=True),
+}
+
+
+def benchmark_matcher(build, encodings, student_ids, rosters, probes, scopes, expected, max_seconds,
+                      memory_queries=3):
+    start = time.perf_counter()
+    match, resident_bytes = build(encodings, student_ids, rosters)
+    build_seconds = time.perf_counter() - start
+
+    # Peak transient memory, measured on a few queries apart from the timed ones
+    tracemalloc.start()
+    query_peak = 0
+    for (probe, _), scope in zip(probes[:memory_queries], scopes):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        match(probe, scope)
+        query_peak = max(query_peak, tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    timings, answers = [], []
+    deadline = time.perf_counter() + max_seconds
+    for (probe, _), scope in zip(probes, scopes):
+        start = time.perf_counter()
+        answers.append(match(probe, scope)[0])
+        timings.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() > deadline and len(answers) >= 2:
+            break
+
+    scored = list(zip(answers, probes, expected))
+    genuine = [(answer, wanted) for answer, (_, wanted), _ in scored if wanted is not None]
+    impostor = [answer for answer, (_, wanted), _ in scored if wanted is None]
+    total_seconds = sum(timings) / 1000
+    return {
+        "build_s": build_seconds,
+        "resident_bytes": int(resident_bytes),
+        "query_peak_bytes": int(query_peak),
+        "queries": len(answers),
+        "latency": latency_summary(timings),
+        "throughput_qps": len(timings) / total_seconds if total_seconds else None,
+        "recall": sum(answer == wanted for answer, wanted in genuine) / len(genuine) if genuine else None,
+        "false_accept_rate": sum(answer is not None for answer in impostor) / len(impostor) if impostor else None,
+        "exact_agreement": sum(answer == reference for answer, _, reference in scored) / len(scored),
+    }
+
+
+def print_summary(results):
+    for size, result in results["sizes"].items():
+        for name, matcher in result["matchers"].items():
+            latency = matcher["latency"]
+            print(f"{size:>8} {name:>32}: p50 {latency.get('p50_ms', 0):9.3f} ms  "
+                  f"p99 {latency.get('p99_ms', 0):9.3f} ms  resident {matcher['resident_bytes'] / 2**20:8.1f} MiB  "
+                  f"peak/query {matcher['query_peak_bytes'] / 2**20:8.1f} MiB  recall {matcher['recall']:.3f}  "
+                  f"FAR {matcher['false_accept_rate']:.3f}  exact {matcher['exact_agreement']:.3f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face matching benchmark over synthetic galleries")
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--matchers", nargs="*", choices=sorted(MATCHERS), help="matchers to run (default: all)")
+    parser.add_argument("--queries", type=int, default=200, help="probes per size, half genuine and half impostor")
+    parser.add_argument("--max-seconds", type=float, default=20.0, help="time budget per matcher and size")
+    parser.add_argument("--roster-size", type=int, default=ROSTER_SIZE, help="students per roster scope")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    matchers = {name: MATCHERS[name] for name in (args.matchers or MATCHERS)}
+    faces = SyntheticFaces(args.seed)
+    results = {
+        "environment": environment(),
+        "baseline": BASELINE_SOURCE,
+        "tolerance": MATCH_TOLERANCE,
+        "genuine_distance": GENUINE_DISTANCE,
+        "impostor_distance": IMPOSTOR_DISTANCE,
+        "roster_size": args.roster_size,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        print(f"[OK] Generating a gallery of {size} faces", file=sys.stderr)
+        encodings, student_ids, identities = faces.gallery(size)
+        probes = faces.probes(identities, student_ids, args.queries)
+        del identities
+        rosters = faces.rosters(student_ids, args.roster_size)
+        scopes = faces.probe_scopes(probes, rosters)
+        expected = exact_answers(encodings, student_ids, probes)
+        results["sizes"][size] = {
+            "gallery_bytes": int(encodings.nbytes),
+            "matchers": {
+                name: benchmark_matcher(build, encodings, student_ids, rosters, probes, scopes, expected,
+                                        args.max_seconds)
+                for name, build in matchers.items()
+            },
+        }
+        del encodings, student_ids, rosters
+
+    print_summary(results)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Latency and accuracy of each pipeline profile (see pipeline_profiles.py).
+
+Every profile detects and encodes the same probe photos, and each encoding
+is matched against the gallery (EncodeFile.p by default). Probes come from
+``--probes``, a folder of photos named ``<student_id>_<anything>.jpg`` (a
+student id that is not enrolled stands for a stranger who should be
+rejected). Without ``--probes`` they are augmented copies of the photos in
+Images/, resized so the longer side is ``--probe-size`` pixels, roughly what
+a webcam frame of a face at a kiosk looks like. Use real captures from your
+own cameras to choose defaults; augmented enrollment photos flatter every
+profile.
+
+For each profile the report gives detect and encode latency percentiles and
+the total per photo, the outcome counts, and:
+
+    accuracy           probes with the right outcome (right student, or rejected stranger)
+    detection_rate     probes with a face found
+    genuine_distance   mean distance from an enrolled probe to its own enrollment
+
+This needs face_recognition (dlib). Without it the script stops rather than
+reporting anything.
+
+Usage:
+    python benchmarks/profile_benchmark.py --probes captures/ --output profiles.json
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from common import REPO_ROOT, environment, latency_summary, write_results
+
+from face_gallery import FaceGallery
+from pipeline_profiles import PROFILES, detect_faces, encode_faces
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+IMAGES_DIR = os.path.join(REPO_ROOT, "Images")
+ENCODE_FILE = os.path.join(REPO_ROOT, "EncodeFile.p")
+
+
+def load_probes(folder):
+    """``[(expected student id, BGR image)]`` from photos named ``<student_id>_....jpg``."""
+    probes = []
+    for name in sorted(os.listdir(folder)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in IMAGE_EXTENSIONS:
+            continue
+        image = cv2.imread(os.path.join(folder, name))
+        if image is not None:
+            probes.append((stem.split("_")[0], image))
+    return probes
+
+
+def augmented_probes(images_dir, variants, probe_size, seed=0):
+    """Augmented copies of the enrollment photos, resized to ``probe_size`` on the longer side."""
+    from load_test import augment
+
+    rng = np.random.default_rng(seed)
+    probes = []
+    for name in sorted(os.listdir(images_dir)):
+        image = cv2.imread(os.path.join(images_dir, name))
+        if image is None:
+            continue
+        scale = probe_size / max(image.shape[:2])
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        probes.extend((os.path.splitext(name)[0], augment(image, rng)) for _ in range(variants))
+    return probes
+
+
+def benchmark_profile(profile, probes, gallery, max_seconds):
+    stages = {"detect": [], "encode": [], "total": []}
+    outcomes = {"correct": 0, "wrong_identity": 0, "false_reject": 0, "false_accept": 0, "no_face": 0}
+    genuine_distances = []
+    enrolled = set(gallery.student_ids)
+    deadline = time.perf_counter() + max_seconds
+    for expected, bgr_image in probes:
+        rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        face_locations = detect_faces(rgb_image, profile)
+        detected = time.perf_counter()
+        face_encodings = encode_faces(rgb_image, face_locations, profile)
+        encoded = time.perf_counter()
+        stages["detect"].append((detected - start) * 1000)
+        stages["encode"].append((encoded - detected) * 1000)
+        stages["total"].append((encoded - start) * 1000)
+
+        if not face_encodings:
+            outcomes["no_face"] += 1
+        else:
+            matched_id, _ = gallery.match(face_encodings[0])
+            if expected not in enrolled:
+                outcomes["correct" if matched_id is None else "false_accept"] += 1
+            else:
+                own = gallery.distances(face_encodings[0])[gallery.student_ids.index(expected)]
+                genuine_distances.append(float(own))
+                if matched_id is None:
+                    outcomes["false_reject"] += 1
+                else:
+                    outcomes["correct" if matched_id == expected else "wrong_identity"] += 1
+        if time.perf_counter() > deadline:
+            break
+
+    scored = sum(outcomes.values())
+    return {
+        "settings": profile._asdict(),
+        "probes": scored,
+        "stages": {stage: latency_summary(samples) for stage, samples in stages.items()},
+        "outcomes": outcomes,
+        "accuracy": outcomes["correct"] / scored if scored else None,
+        "detection_rate": (scored - outcomes["no_face"]) / scored if scored else None,
+        "genuine_distance": float(np.mean(genuine_distances)) if genuine_distances else None,
+    }
+
+
+def print_summary(results):
+    for name, result in results["profiles"].items():
+        total = result["stages"]["total"]
+        accuracy = "n/a" if result["accuracy"] is None else f"{result['accuracy']:.3f}"
+        print(f"{name:>16}: p50 {total.get('p50_ms', 0):8.1f} ms  p95 {total.get('p95_ms', 0):8.1f} ms  "
+              f"accuracy {accuracy}  detected {result['detection_rate'] or 0:.3f}  "
+              f"({result['probes']} probes)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and accuracy of each detection/encoding profile")
+    parser.add_argument("--profiles", nargs="*", choices=sorted(PROFILES), help="profiles to run (default: all)")
+    parser.add_argument("--probes", help="folder of probe photos named <student_id>_....jpg")
+    parser.add_argument("--images", default=IMAGES_DIR, help="enrollment photos to augment when --probes is not given")
+    parser.add_argument("--variants", type=int, default=10, help="augmented probes per enrollment photo")
+    parser.add_argument("--probe-size", type=int, default=640, help="longer side of augmented probes, in pixels")
+    parser.add_argument("--encode-file", default=ENCODE_FILE, help="gallery to match against")
+    parser.add_argument("--max-seconds", type=float, default=120.0, help="time budget per profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("face_recognition") is None:
+        print("[WARNING] face_recognition is not installed, nothing to measure", file=sys.stderr)
+        sys.exit(1)
+
+    gallery = FaceGallery.load(args.encode_file, quantization=None)
+    if not len(gallery):
+        parser.error(f"no encodings in {args.encode_file}")
+    if args.probes:
+        probes = load_probes(args.probes)
+    else:
+        probes = augmented_probes(args.images, args.variants, args.probe_size, args.seed)
+    if not probes:
+        parser.error("no probe photos")
+
+    results = {
+        "environment": environment(),
+        "gallery_size": len(gallery),
+        "probe_source": args.probes or f"{args.variants} augmented copies per photo in {args.images}",
+        "profiles": {},
+    }
+    for name in args.profiles or PROFILES:
+        print(f"[OK] Measuring {name}", file=sys.stderr)
+        results["profiles"][name] = benchmark_profile(PROFILES[name], probes, gallery, args.max_seconds)
+
+    print_summary(results)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
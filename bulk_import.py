@@ -0,0 +1,316 @@
+"""
+Bulk student import: roster records, photos and face encodings in one pass.
+
+The roster is a CSV file with a header row or a JSON file, either
+``{student_id: {...}}`` or a list of objects with a ``student_id`` field.
+Photos come from a folder or a zip archive and are named after the student
+id (``321654.png``, ``321654.jpg``), like the files in Images/.
+
+Records are written in chunked multi-path updates, faces are encoded in
+parallel worker processes, and every row gets a line in the report. Like
+the Add Student form, an import never overwrites a student who already
+exists (their attendance would be reset); such rows are reported as
+``exists``. A student id that appears more than once in the roster is an
+error.
+
+Usage:
+    python bulk_import.py roster.csv --photos Images/ --report import_report.csv
+"""
+
+import argparse
+import csv
+import functools
+import io
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from pipeline_profiles import PROFILES, detect_and_encode, profile_for
+from students_cache import SCOPES_FIELD, student_scopes
+
+PHOTO_EXTENSIONS = {"png", "jpg", "jpeg"}
+REQUIRED_FIELDS = ("name", "major", "year")
+WRITE_CHUNK_SIZE = 500
+REPORT_FIELDS = ["student_id", "name", "record", "photo", "encoding", "message"]
+
+
+def load_roster(data, filename):
+    """Parse roster bytes into ``[(student_id, record)]``, in file order and keeping duplicates."""
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    if filename.lower().endswith(".json"):
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            rows = [dict(record, student_id=student_id) for student_id, record in parsed.items()]
+        else:
+            rows = parsed
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    roster = []
+    for row in rows:
+        row = {key.strip(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        student_id = str(row.pop("student_id", "") or "").strip()
+        roster.append((student_id, row))
+    return roster
+
+
+def load_photos(source):
+    """Read ``{student_id: (extension, bytes)}`` from a folder path, zip path or zip file object."""
+    photos = {}
+    if isinstance(source, str) and os.path.isdir(source):
+        for name in os.listdir(source):
+            _add_photo(photos, name, lambda n=name: _read_file(os.path.join(source, n)))
+    else:
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    _add_photo(photos, info.filename, lambda i=info: archive.read(i))
+    return photos
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _add_photo(photos, path, read):
+    student_id, ext = os.path.splitext(os.path.basename(path))
+    ext = ext.lstrip(".").lower()
+    if ext in PHOTO_EXTENSIONS and student_id and not student_id.startswith("."):
+        photos[student_id] = ("jpg" if ext == "jpeg" else ext, read())
+
+
+def encode_photo(item, profile_name=None):
+    """Worker: decode one photo and return ``(student_id, encoding or None, error)``.
+
+    ``profile_name`` is a pipeline profile; None uses the enrollment default.
+    """
+    import cv2
+    import numpy as np
+
+    student_id, data = item
+    bgr_image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if bgr_image is None:
+        return student_id, None, "could not decode photo"
+    rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+    _, encodings = detect_and_encode(rgb_image, profile_for("enrollment", profile_name))
+    if not encodings:
+        return student_id, None, "no face detected"
+    return student_id, encodings[0], None
+
+
+def build_record(row):
+    """Turn a roster row into a Students record, or raise ValueError."""
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    record = dict(row)
+    record.setdefault("standing", "Good")
+    record["standing"] = record["standing"] or "Good"
+    record["starting_year"] = record.get("starting_year") or str(datetime.now().year)
+    record.setdefault("Total attendance", 0)
+    record.setdefault("last_atttendance_time", "Never")
+    if SCOPES_FIELD in record:
+        # A CSV cell like "course:CS101; site:north" becomes a list of tags
+        scopes = sorted(student_scopes(record))
+        if scopes:
+            record[SCOPES_FIELD] = scopes
+        else:
+            del record[SCOPES_FIELD]
+    return record
+
+
+class ImportJob:
+    """One bulk import run and its per-row report."""
+
+    def __init__(self, roster, photos, profile=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.roster = roster
+        self.photos = photos
+        # Pipeline profile name for encoding; None uses the enrollment default
+        self.profile = profile
+        self.report = {}
+        self.status = "pending"
+        self.error = None
+        self.processed = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def total(self):
+        return len(self.roster)
+
+    def summary(self):
+        rows = self.report.values()
+        return {
+            "total": self.total,
+            "records_ok": sum(row["record"] == "ok" for row in rows),
+            "existing": sum(row["record"] == "exists" for row in rows),
+            "encodings_ok": sum(row["encoding"] == "ok" for row in rows),
+            "failed": sum(row["record"] == "error" or row["encoding"] == "error" for row in rows),
+        }
+
+    def report_rows(self):
+        return [self.report[student_id] for student_id in sorted(self.report)]
+
+    def run(self, backend, gallery, students_cache=None, encode_file=None,
+            chunk_size=WRITE_CHUNK_SIZE, workers=None):
+        """Write records, upload photos and encode faces, filling in the report."""
+        self.status = "running"
+        self.started_at = datetime.now()
+        try:
+            self._run(backend, gallery, students_cache, encode_file, chunk_size, workers)
+            self.status = "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        self.finished_at = datetime.now()
+
+    def _row(self, student_id, name=""):
+        return self.report.setdefault(student_id, {
+            "student_id": student_id, "name": name, "record": "skipped",
+            "photo": "missing", "encoding": "skipped", "message": "",
+        })
+
+    def _run(self, backend, gallery, students_cache, encode_file, chunk_size, workers):
+        # 1. Validate rows and write records in chunked multi-path updates
+        occurrences = Counter(student_id for student_id, _ in self.roster)
+        existing = backend.get_student_ids()
+        records = {}
+        for student_id, row in self.roster:
+            report = self._row(student_id, row.get("name", ""))
+            if not student_id:
+                report.update(record="error", message="missing student_id")
+            elif occurrences[student_id] > 1:
+                report.update(record="error", message=f"student_id appears {occurrences[student_id]} times in the roster")
+            elif student_id in existing:
+                report.update(record="exists", message="student already exists, not changed")
+            else:
+                try:
+                    records[student_id] = build_record(row)
+                except ValueError as e:
+                    report.update(record="error", message=str(e))
+
+        ids = list(records)
+        for start in range(0, len(ids), chunk_size):
+            chunk = {student_id: records[student_id] for student_id in ids[start:start + chunk_size]}
+            try:
+                backend.add_students(chunk)
+                status, message = "ok", ""
+            except Exception as e:
+                status, message = "error", f"database write failed: {e}"
+            for student_id, record in chunk.items():
+                self.report[student_id].update(record=status, message=message)
+                if status == "ok" and students_cache is not None:
+                    students_cache.put(student_id, record)
+            self.processed += len(chunk)
+
+        # 2. Upload photos (I/O bound, threads) and encode faces (CPU bound, processes),
+        # only for students whose record was written
+        for student_id, report in self.report.items():
+            if report["record"] != "ok" and student_id in self.photos:
+                report["photo"] = "skipped"
+        to_encode = [(student_id, self.photos[student_id]) for student_id in ids
+                     if student_id in self.photos and self.report[student_id]["record"] == "ok"]
+
+        def upload(item):
+            student_id, (ext, data) = item
+            try:
+                backend.put_photo(student_id, data, ext)
+                return student_id, "ok"
+            except Exception as e:
+                return student_id, f"error: {e}"
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for student_id, status in pool.map(upload, to_encode):
+                self.report[student_id]["photo"] = "ok" if status == "ok" else "error"
+                if status != "ok":
+                    self.report[student_id]["message"] = status
+
+        encoded = []
+        # spawn keeps dlib out of a forked copy of a threaded server process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            items = [(student_id, data) for student_id, (_, data) in to_encode]
+            encode = functools.partial(encode_photo, profile_name=self.profile)
+            for student_id, encoding, error in pool.map(encode, items, chunksize=16):
+                report = self.report[student_id]
+                if error:
+                    report.update(encoding="error", message=error)
+                else:
+                    report["encoding"] = "ok"
+                    encoded.append((student_id, encoding))
+
+        if encoded:
+            gallery.add_many(encoded)
+            if encode_file:
+                gallery.save(encode_file)
+
+
+def write_report(job, out):
+    writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(job.report_rows())
+
+
+class ImportJobs:
+    """Background import jobs started from the admin page, kept in memory."""
+
+    def __init__(self, max_jobs=20):
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, job, **run_kwargs):
+        with self._lock:
+            while len(self._jobs) >= self.max_jobs:
+                self._jobs.pop(next(iter(self._jobs)))
+            self._jobs[job.id] = job
+        threading.Thread(target=job.run, kwargs=run_kwargs, name=f"import-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import students, photos and face encodings")
+    parser.add_argument("roster", help="CSV or JSON roster file")
+    parser.add_argument("--photos", help="folder or zip of photos named <student_id>.png/.jpg")
+    parser.add_argument("--report", default="import_report.csv", help="where to write the per-row report")
+    parser.add_argument("--encode-file", default="EncodeFile.p", help="gallery file to update")
+    parser.add_argument("--chunk-size", type=int, default=WRITE_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="encoding processes (default: CPU count)")
+    parser.add_argument("--profile", choices=sorted(PROFILES),
+                        help="pipeline profile for encoding photos (default: PIPELINE_PROFILE_ENROLLMENT or 'default')")
+    args = parser.parse_args()
+
+    from face_gallery import FaceGallery
+    from storage_backend import create_backend, init_firebase
+
+    with open(args.roster, "rb") as f:
+        roster = load_roster(f.read(), args.roster)
+    photos = load_photos(args.photos) if args.photos else {}
+
+    job = ImportJob(roster, photos, profile=args.profile)
+    job.run(
+        create_backend(init_firebase()),
+        FaceGallery.load(args.encode_file),
+        encode_file=args.encode_file,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    with open(args.report, "w", newline="") as f:
+        write_report(job, f)
+
+    summary = job.summary()
+    if job.status == "failed":
+        print(f"[WARNING] Import failed: {job.error}")
+    print(f"[OK] Imported {summary['records_ok']}/{summary['total']} records, "
+          f"{summary['encodings_ok']} face encodings, {summary['failed']} failures. Report: {args.report}")
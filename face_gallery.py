@@ -0,0 +1,322 @@
+"""
+Known face encodings and the student ids they belong to.
+
+The gallery is persisted in the same ``[encodings, student_ids]`` pickle that
+EncodeGenerator.py writes to EncodeFile.p, so every entry point can keep
+loading that file. Matching follows face_recognition's rule: the closest
+encoding wins if its Euclidean distance is within the tolerance.
+
+With ``quantization`` set to ``"float16"`` or ``"int8"`` the gallery also
+keeps compact codes (2 or 1 bytes per value instead of 8). The coarse search
+scans only the codes, and the closest ``candidates`` are re-ranked with exact
+float64 distances, so the match and its distance are the same as without
+quantization. The exact encodings can then live in a memory-mapped sidecar
+file (``EncodeFile.p.npy``, see ``map_exact``), so only the rows being
+re-ranked are paged in. Set ``GALLERY_QUANTIZATION`` to choose the default.
+
+Scopes (``set_scopes``) partition the gallery into roster shards, such as a
+course, a section or a site. ``match(..., scope=...)`` searches only the rows
+of that shard, optionally falling through to the whole gallery when nobody
+in the shard is within the tolerance.
+"""
+
+import os
+import pickle
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_ENCODE_FILE = "EncodeFile.p"
+MATCH_TOLERANCE = 0.6
+GALLERY_QUANTIZATION = os.environ.get("GALLERY_QUANTIZATION") or None
+QUANTIZATIONS = ("float16", "int8")
+# Coarse candidates re-ranked exactly; quantization error moves a face only a few places
+RERANK_CANDIDATES = 16
+# Rows converted to float32 per block of the coarse scan, small enough to stay in cache
+SCAN_BLOCK_ROWS = 8192
+
+# codes: (n, d) compact matrix; offset/scale: int8 dequantization (x = offset + scale * (code + 128));
+# norms: per-row squared norm of the scaled codes for the int8 distance expansion
+Codes = namedtuple("Codes", ["kind", "codes", "offset", "scale", "norms"])
+
+
+def quantize(matrix, kind, offset=None, scale=None):
+    """Compact codes for ``matrix``. int8 reuses ``offset``/``scale`` when given; values outside are clipped."""
+    if kind == "float16":
+        return Codes(kind, matrix.astype(np.float16), None, None, None)
+    if kind != "int8":
+        raise ValueError(f"Unknown gallery quantization: {kind}")
+    if offset is None:
+        if len(matrix):
+            low, high = matrix.min(axis=0), matrix.max(axis=0)
+        else:
+            low, high = np.zeros(matrix.shape[1]), np.ones(matrix.shape[1])
+        offset = low.astype(np.float32)
+        scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+    codes = np.empty(matrix.shape, dtype=np.int8)
+    for start in range(0, len(matrix), SCAN_BLOCK_ROWS * 8):
+        block = (matrix[start:start + SCAN_BLOCK_ROWS * 8] - offset) / scale - 128
+        codes[start:start + len(block)] = np.clip(np.rint(block), -128, 127)
+    scaled = codes.astype(np.float32) * scale if len(codes) else np.empty(codes.shape, np.float32)
+    norms = np.einsum("ij,ij->i", scaled, scaled)
+    return Codes(kind, codes, offset, scale, norms)
+
+
+def coarse_distances(codes, encoding):
+    """Approximate squared distances from ``encoding`` to every coded face."""
+    distances = np.empty(len(codes.codes), dtype=np.float32)
+    if codes.kind == "float16":
+        target = encoding.astype(np.float32)
+        for start in range(0, len(codes.codes), SCAN_BLOCK_ROWS):
+            difference = codes.codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32) - target
+            distances[start:start + len(difference)] = np.einsum("ij,ij->i", difference, difference)
+        return distances
+    # |s*c - q'|^2 = |s*c|^2 - 2 (s*c).q' + |q'|^2 with q' = encoding - offset - 128 s
+    target = (encoding - codes.offset - 128 * codes.scale).astype(np.float32)
+    weights = codes.scale * target
+    for start in range(0, len(codes.codes), SCAN_BLOCK_ROWS):
+        block = codes.codes[start:start + SCAN_BLOCK_ROWS]
+        distances[start:start + len(block)] = block.astype(np.float32) @ weights
+    return codes.norms - 2 * distances + target @ target
+
+
+class FaceGallery:
+    """Thread-safe, versioned collection of known face encodings."""
+
+    def __init__(self, encodings=None, student_ids=None, quantization=GALLERY_QUANTIZATION,
+                 candidates=RERANK_CANDIDATES):
+        self._lock = threading.Lock()
+        self.quantization = quantization
+        self.candidates = candidates
+        matrix = self._to_matrix(encodings if encodings is not None else [])
+        # (student_ids, matrix, codes) is swapped as one tuple so readers always see a matching set
+        self._state = (list(student_ids or []), matrix, self._quantize(matrix))
+        self.version = 0
+        # ({scope: frozenset of student ids}, {scope: (ids list, shard rows)}), swapped as one
+        # tuple so shard rows are only ever cached alongside the scopes they were built from
+        self._scopes = ({}, {})
+        self._row_index = (None, {})
+
+    @staticmethod
+    def _to_matrix(encodings):
+        if len(encodings) == 0:
+            return np.empty((0, 128), dtype=np.float64)
+        if isinstance(encodings, np.memmap):
+            return encodings
+        return np.asarray(encodings, dtype=np.float64).reshape(len(encodings), -1)
+
+    def _quantize(self, matrix, previous=None):
+        if not self.quantization:
+            return None
+        if previous is not None and previous.kind == "int8" and len(matrix):
+            # Keep the old range while every row fits it; a row outside would be
+            # clipped and could drop out of the candidates, so then refit them all
+            if (matrix.min(axis=0) >= previous.offset).all() and \
+                    (matrix.max(axis=0) <= previous.offset + 255 * previous.scale).all():
+                return quantize(matrix, "int8", previous.offset, previous.scale)
+        return quantize(matrix, self.quantization)
+
+    @classmethod
+    def load(cls, path=DEFAULT_ENCODE_FILE, **kwargs):
+        """Load EncodeFile.p. Returns an empty gallery if the file does not exist."""
+        gallery = cls(**kwargs)
+        gallery.reload(path)
+        return gallery
+
+    def reload(self, path=DEFAULT_ENCODE_FILE):
+        """Replace the contents with EncodeFile.p. Leaves the gallery as is if the file does not exist.
+
+        A quantized gallery maps its exact encodings from ``<path>.npy``,
+        written next to the pickle whenever the pickle is newer.
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as f:
+            encodings, student_ids = pickle.load(f)
+        matrix = self._to_matrix(encodings)
+        del encodings
+        if self.quantization:
+            matrix = self._spill(matrix, f"{path}.npy", os.path.getmtime(path))
+        state = (list(student_ids), matrix, self._quantize(matrix))
+        with self._lock:
+            self._state = state
+            self.version += 1
+        return True
+
+    @staticmethod
+    def _spill(matrix, npy_path, newer_than=None):
+        """Write ``matrix`` to ``npy_path`` unless it is up to date, and map it read-only."""
+        current = (os.path.exists(npy_path) and newer_than is not None
+                   and os.path.getmtime(npy_path) >= newer_than)
+        if current:
+            mapped = np.load(npy_path, mmap_mode="r")
+            current = mapped.shape == matrix.shape and np.array_equal(mapped[:1], matrix[:1])
+        if not current:
+            tmp_path = f"{npy_path}.tmp.npy"
+            np.save(tmp_path, matrix)
+            os.replace(tmp_path, npy_path)
+        return np.load(npy_path, mmap_mode="r")
+
+    def map_exact(self, npy_path):
+        """Move the exact encodings to ``npy_path`` and memory-map them, leaving only the codes in RAM."""
+        with self._lock:
+            ids, matrix, codes = self._state
+            self._state = (ids, self._spill(matrix, npy_path), codes)
+
+    def save(self, path=DEFAULT_ENCODE_FILE):
+        ids, matrix, _ = self._state
+        data = [list(matrix.view(np.ndarray)), list(ids)]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f)
+        os.replace(tmp_path, path)
+        if self.quantization and not isinstance(matrix, np.memmap):
+            # Edits left the exact encodings in RAM; put them back on disk
+            self.map_exact(f"{path}.npy")
+
+    def __len__(self):
+        return len(self._state[0])
+
+    @property
+    def student_ids(self):
+        return list(self._state[0])
+
+    @property
+    def encodings(self):
+        return self._state[1]
+
+    def memory_usage(self):
+        """Bytes held in RAM by the codes and the exact encodings, and bytes memory-mapped."""
+        _, matrix, codes = self._state
+        code_bytes = 0
+        if codes is not None:
+            code_bytes = sum(part.nbytes for part in (codes.codes, codes.offset, codes.scale, codes.norms)
+                             if part is not None)
+        mapped = isinstance(matrix, np.memmap)
+        return {
+            "codes": int(code_bytes),
+            "exact_in_memory": 0 if mapped else int(matrix.nbytes),
+            "exact_mapped": int(matrix.nbytes) if mapped else 0,
+        }
+
+    def add_many(self, items):
+        """Add or replace encodings from an iterable of (student_id, encoding)."""
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            ids, matrix, codes = self._state
+            index = {student_id: i for i, student_id in enumerate(ids)}
+            ids = list(ids)
+            matrix = np.array(matrix)
+            new_rows = []
+            for student_id, encoding in items:
+                encoding = np.asarray(encoding, dtype=np.float64)
+                if student_id in index:
+                    matrix[index[student_id]] = encoding
+                else:
+                    index[student_id] = len(ids)
+                    ids.append(student_id)
+                    new_rows.append(encoding)
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows)])
+            self._state = (ids, matrix, self._quantize(matrix, codes))
+            self.version += 1
+
+    def add(self, student_id, encoding):
+        self.add_many([(student_id, encoding)])
+
+    def remove(self, student_id):
+        with self._lock:
+            ids, matrix, codes = self._state
+            if student_id not in ids:
+                return
+            keep = [i for i, existing in enumerate(ids) if existing != student_id]
+            matrix = np.asarray(matrix)[keep]
+            self._state = ([ids[i] for i in keep], matrix, self._quantize(matrix, codes))
+            self.version += 1
+
+    def set_scopes(self, scopes):
+        """Replace the roster shards with ``{scope: student ids}``. Passing the same mapping again is free."""
+        if scopes is self._scopes[0]:
+            return
+        self._scopes = (scopes, {})
+
+    def scopes(self):
+        """``{scope: enrolled faces}`` for every known scope."""
+        ids = self._state[0]
+        return {scope: len(self._shard_rows(scope, ids)) for scope in self._scopes[0]}
+
+    def has_scope(self, scope):
+        return scope in self._scopes[0]
+
+    def _shard_rows(self, scope, ids):
+        """Sorted gallery rows of the students in ``scope``, for the given ids list."""
+        members, shards = self._scopes
+        cached = shards.get(scope)
+        if cached is not None and cached[0] is ids:
+            return cached[1]
+        indexed_ids, index = self._row_index
+        if indexed_ids is not ids:
+            index = {student_id: row for row, student_id in enumerate(ids)}
+            self._row_index = (ids, index)
+        rows = np.array(sorted(index[student_id] for student_id in members.get(scope, ())
+                               if student_id in index), dtype=np.int64)
+        shards[scope] = (ids, rows)
+        return rows
+
+    def distances(self, encoding):
+        """Euclidean distance from ``encoding`` to every known face."""
+        matrix = self._state[1]
+        if len(matrix) == 0:
+            return np.empty((0,))
+        return np.linalg.norm(matrix - encoding, axis=1)
+
+    def match(self, encoding, tolerance=MATCH_TOLERANCE, scope=None, fall_through=False):
+        """Return ``(student_id, distance)`` for the closest face.
+
+        ``student_id`` is None when the gallery is empty or the closest face
+        is further away than ``tolerance``. With ``scope`` only that shard is
+        searched; ``fall_through`` then searches the whole gallery if the
+        shard has no match.
+        """
+        ids, matrix, codes = self._state
+        if len(matrix) == 0:
+            return None, None
+        rows = None
+        if scope is not None:
+            rows = self._shard_rows(scope, ids)
+            if len(rows):
+                best, distance = self._closest(matrix, codes, encoding, rows)
+                if distance <= tolerance or not fall_through:
+                    return (ids[best] if distance <= tolerance else None), distance
+            elif not fall_through:
+                return None, None
+        best, distance = self._closest(matrix, codes, encoding)
+        return (ids[best] if distance <= tolerance else None), distance
+
+    def _closest(self, matrix, codes, encoding, rows=None):
+        """``(row, exact distance)`` of the nearest face, among ``rows`` if given."""
+        if rows is not None and (codes is None or len(rows) <= self.candidates):
+            # A roster shard is small enough to compare exactly
+            distances = np.linalg.norm(matrix[rows] - encoding, axis=1)
+            best = int(np.argmin(distances))
+            return int(rows[best]), float(distances[best])
+        if codes is None:
+            distances = np.linalg.norm(matrix - encoding, axis=1)
+            best = int(np.argmin(distances))
+            return best, float(distances[best])
+        if rows is not None:
+            codes = Codes(codes.kind, codes.codes[rows], codes.offset, codes.scale,
+                          codes.norms[rows] if codes.norms is not None else None)
+        coarse = coarse_distances(codes, np.asarray(encoding, dtype=np.float64))
+        if len(coarse) > self.candidates:
+            candidates = np.argpartition(coarse, self.candidates)[:self.candidates]
+        else:
+            candidates = np.arange(len(coarse))
+        candidates.sort()
+        if rows is not None:
+            candidates = rows[candidates]
+        exact = np.linalg.norm(matrix[candidates] - encoding, axis=1)
+        return int(candidates[np.argmin(exact)]), float(exact.min())
@@ -0,0 +1,89 @@
+"""
+One detection and landmark pass per frame, shared by recognition and liveness.
+
+``face_recognition.face_encodings`` already runs dlib's landmark predictor
+before computing a descriptor, but throws the landmarks away, so blink
+detection used to find the face and eyes a second time. ``analyse_faces``
+runs the 68-point predictor once and returns the location, landmarks and
+(optionally) the encoding of every face. ``encode_face`` computes the
+descriptor later from the same landmarks, and ``eye_aspect_ratios`` scores
+eye openness for any stack of landmark sets in one NumPy expression.
+
+dlib's models load on the first call rather than at import, so importing
+this module stays cheap (see warmup.py) and succeeds without face_recognition;
+``available()`` says whether face_recognition and dlib are installed.
+"""
+
+import importlib.util
+from collections import namedtuple
+
+import numpy as np
+
+# 68-point landmark indices (iBUG 300-W layout)
+LEFT_EYE = list(range(36, 42))
+RIGHT_EYE = list(range(42, 48))
+
+FaceAnalysis = namedtuple("FaceAnalysis", ["location", "landmarks", "encoding", "shape"])
+FaceAnalysis.__doc__ = """A detected face.
+
+``location`` is ``(top, right, bottom, left)`` as in face_recognition,
+``landmarks`` a ``(68, 2)`` array of ``(x, y)`` points, ``encoding`` the
+128-d descriptor or None, and ``shape`` dlib's raw landmark object.
+"""
+
+
+def available():
+    """True if face_recognition and dlib are installed in this environment."""
+    return all(importlib.util.find_spec(name) is not None for name in ("face_recognition", "dlib"))
+
+
+def analyse_faces(rgb_image, face_locations=None, encode=True, num_jitters=1, model="hog", upsample=1):
+    """Detect faces (unless ``face_locations`` is given), predict landmarks once, and encode."""
+    from face_recognition import api as face_api
+
+    if face_locations is None:
+        rects = face_api._raw_face_locations(rgb_image, upsample, model)
+    else:
+        rects = [face_api._css_to_rect(location) for location in face_locations]
+
+    faces = []
+    for rect in rects:
+        shape = face_api.pose_predictor_68_point(rgb_image, rect)
+        landmarks = np.array([(point.x, point.y) for point in shape.parts()], dtype=np.float32)
+        location = face_api._trim_css_to_bounds(face_api._rect_to_css(rect), rgb_image.shape)
+        face = FaceAnalysis(location, landmarks, None, shape)
+        if encode:
+            face = encode_face(rgb_image, face, num_jitters)
+        faces.append(face)
+    return faces
+
+
+def encode_face(rgb_image, face, num_jitters=1):
+    """Fill in ``face.encoding`` from its existing landmarks, without detecting again."""
+    if face.encoding is not None:
+        return face
+    from face_recognition import api as face_api
+
+    encoding = np.array(face_api.face_encoder.compute_face_descriptor(rgb_image, face.shape, num_jitters))
+    return face._replace(encoding=encoding)
+
+
+def largest_face(faces):
+    """The face with the biggest bounding box, taken to be the person at the camera."""
+    return max(faces, key=lambda face: (face.location[2] - face.location[0]) * (face.location[1] - face.location[3]))
+
+
+def eye_aspect_ratios(landmarks):
+    """Mean eye aspect ratio of both eyes for landmarks shaped ``(..., 68, 2)``.
+
+    EAR = (|p2 - p6| + |p3 - p5|) / (2 |p1 - p4|) per eye; it drops towards
+    zero when the eye closes.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    eyes = landmarks[..., LEFT_EYE + RIGHT_EYE, :].reshape(landmarks.shape[:-2] + (2, 6, 2))
+
+    def distance(a, b):
+        return np.linalg.norm(eyes[..., a, :] - eyes[..., b, :], axis=-1)
+
+    ratios = (distance(1, 5) + distance(2, 4)) / (2.0 * distance(0, 3) + 1e-6)
+    return ratios.mean(axis=-1)
@@ -0,0 +1,466 @@
+"""
+In-process stand-in for the Firebase Realtime Database and Storage.
+
+``FakeDatabase.reference()`` mirrors ``firebase_admin.db.reference()``: get
+(including ``shallow``), set, update (multi-path, with ``increment`` and
+``timestamp`` server values), delete, push, child, listen and ordered queries
+(``order_by_key/child/value`` with ``start_at``, ``end_at``, ``equal_to``,
+``limit_to_first`` and ``limit_to_last``). ``FakeBucket`` mirrors the parts of
+a Storage bucket the project uses. Every call can be given injected latency
+and a random error rate, so the real code paths can be load-tested and
+profiled on a machine with no network.
+
+Enable it with environment variables:
+
+    FIREBASE_EMULATION=fake          use the fake instead of firebase_admin
+    FAKE_FIREBASE_LATENCY_MS=40      mean added latency per call
+    FAKE_FIREBASE_JITTER_MS=10       uniform jitter around the mean
+    FAKE_FIREBASE_ERROR_RATE=0.01    probability that a call raises
+    FAKE_FIREBASE_SEED=seed.json     database contents to start with
+    FAKE_FIREBASE_PHOTOS=Images      folder of <student_id>.png/.jpg to preload
+"""
+
+import copy
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class FakeFirebaseError(Exception):
+    """Injected failure, standing in for firebase_admin's UnavailableError."""
+
+
+class FakeEvent:
+    """Same attributes as ``firebase_admin.db.Event``."""
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class FakeListenerRegistration:
+    def __init__(self, database, listener):
+        self._database = database
+        self._listener = listener
+
+    def close(self):
+        self._database._remove_listener(self._listener)
+
+
+class _Faults:
+    """Latency and error injection shared by the database and the bucket."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+
+    def apply(self, operation):
+        self.calls += 1
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise FakeFirebaseError(f"Injected failure in {operation}")
+
+
+def _split(path):
+    return [part for part in (path or "").split("/") if part]
+
+
+def _to_firebase_value(value):
+    """Return what Firebase would hand back for a stored node."""
+    if not isinstance(value, dict):
+        return value
+    converted = {key: _to_firebase_value(child) for key, child in value.items()}
+    # Firebase returns integer-keyed objects as arrays when they are mostly dense
+    if converted and all(key.isdigit() and (key == "0" or not key.startswith("0")) for key in converted):
+        top = max(int(key) for key in converted)
+        if top < 2 * len(converted):
+            return [converted.get(str(i)) for i in range(top + 1)]
+    return converted
+
+
+def _normalise(value):
+    """Store values the way Firebase does: string keys, no empty objects, no nulls."""
+    if isinstance(value, (list, tuple)):
+        value = {str(i): item for i, item in enumerate(value)}
+    if isinstance(value, dict):
+        result = {}
+        for key, child in value.items():
+            child = _normalise(child)
+            if child is not None:
+                result[str(key)] = child
+        return result or None
+    return value
+
+
+class FakeDatabase:
+    """Thread-safe in-memory JSON tree."""
+
+    def __init__(self, data=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self._root = _normalise(data) or {}
+        self._lock = threading.RLock()
+        # Serialises writes with their callbacks so listeners see events in write order
+        self._dispatch_lock = threading.RLock()
+        self._listeners = []
+        self.faults = _Faults(latency_ms, jitter_ms, error_rate, seed)
+
+    def reference(self, path="/"):
+        return FakeReference(self, "/".join(_split(path)))
+
+    # Tree primitives (callers hold the lock)
+    def _get(self, parts):
+        node = self._root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        if not parts:
+            self._root = value if isinstance(value, dict) else {}
+            return
+        node = self._root
+        trail = []
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            trail.append((node, part))
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        # Prune parents that became empty, like Firebase does
+        for parent, part in reversed(trail):
+            if parent[part]:
+                break
+            del parent[part]
+
+    def _resolve_server_values(self, parts, value):
+        if isinstance(value, dict):
+            if set(value) == {".sv"}:
+                server_value = value[".sv"]
+                if server_value == "timestamp":
+                    return int(time.time() * 1000)
+                if isinstance(server_value, dict) and "increment" in server_value:
+                    current = self._get(parts)
+                    current = current if isinstance(current, (int, float)) else 0
+                    return current + server_value["increment"]
+                raise ValueError(f"Unsupported server value: {server_value}")
+            return {key: self._resolve_server_values(parts + [key], child) for key, child in value.items()}
+        return value
+
+    def _write(self, changes):
+        """Apply ``[(parts, value)]`` atomically and notify listeners."""
+        with self._dispatch_lock:
+            with self._lock:
+                resolved = [(parts, _normalise(self._resolve_server_values(parts, copy.deepcopy(value))))
+                            for parts, value in changes]
+                for parts, value in resolved:
+                    self._set(parts, value)
+                events = []
+                for listener in list(self._listeners):
+                    for parts, value in resolved:
+                        event = self._event_for(listener, parts, value)
+                        if event:
+                            events.append((listener, event))
+            # Callbacks run outside the data lock so they may read the database
+            for listener, event in events:
+                listener["callback"](event)
+
+    def _event_for(self, listener, parts, value):
+        base = listener["parts"]
+        if parts[:len(base)] == base:
+            relative = parts[len(base):]
+            return FakeEvent("put", "/" + "/".join(relative), _to_firebase_value(copy.deepcopy(value)))
+        if base[:len(parts)] == parts:
+            return FakeEvent("put", "/", _to_firebase_value(copy.deepcopy(self._get(base))))
+        return None
+
+    def _add_listener(self, parts, callback):
+        listener = {"parts": parts, "callback": callback}
+        with self._lock:
+            self._listeners.append(listener)
+            initial = _to_firebase_value(copy.deepcopy(self._get(parts)))
+        callback(FakeEvent("put", "/", initial))
+        return FakeListenerRegistration(self, listener)
+
+    def _remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+class FakeReference:
+    """Mirror of ``firebase_admin.db.Reference``."""
+
+    def __init__(self, database, path):
+        self._db = database
+        self.path = "/" + path
+        self._parts = _split(path)
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def parent(self):
+        if not self._parts:
+            return None
+        return FakeReference(self._db, "/".join(self._parts[:-1]))
+
+    def child(self, path):
+        return FakeReference(self._db, "/".join(self._parts + _split(path)))
+
+    def get(self, etag=False, shallow=False):
+        self._db.faults.apply(f"get {self.path}")
+        with self._db._lock:
+            value = self._db._get(self._parts)
+            if shallow and isinstance(value, dict):
+                value = {key: True for key in value}
+            else:
+                value = copy.deepcopy(value)
+        value = _to_firebase_value(value)
+        if etag:
+            return value, str(hash(json.dumps(value, sort_keys=True, default=str)))
+        return value
+
+    def set(self, value):
+        if value is None:
+            raise ValueError("Value must not be None.")
+        self._db.faults.apply(f"set {self.path}")
+        self._db._write([(self._parts, value)])
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        if None in value.values():
+            raise ValueError("Dictionary must not contain None values.")
+        self._db.faults.apply(f"update {self.path}")
+        self._db._write([(self._parts + _split(key), child) for key, child in value.items()])
+
+    def delete(self):
+        self._db.faults.apply(f"delete {self.path}")
+        self._db._write([(self._parts, None)])
+
+    def transaction(self, transaction_update):
+        """Atomic read-modify-write. Returns the value written, like the real SDK."""
+        self._db.faults.apply(f"transaction {self.path}")
+        # Every write takes the dispatch lock, so nothing can land between the read and the write
+        with self._db._dispatch_lock:
+            with self._db._lock:
+                current = _to_firebase_value(copy.deepcopy(self._db._get(self._parts)))
+            new_value = transaction_update(current)
+            self._db._write([(self._parts, new_value)])
+        return new_value
+
+    def push(self, value=""):
+        key = f"-{int(time.time() * 1000):013d}{random.getrandbits(32):08x}"
+        ref = self.child(key)
+        if value != "":
+            ref.set(value)
+        return ref
+
+    def listen(self, callback):
+        return self._db._add_listener(self._parts, callback)
+
+    def order_by_key(self):
+        return FakeQuery(self, "key")
+
+    def order_by_value(self):
+        return FakeQuery(self, "value")
+
+    def order_by_child(self, path):
+        return FakeQuery(self, "child", _split(path))
+
+
+class FakeQuery:
+    """Mirror of ``firebase_admin.db.Query``."""
+
+    def __init__(self, ref, order_by, child_parts=None):
+        self._ref = ref
+        self._order_by = order_by
+        self._child_parts = child_parts or []
+        self._start = _MISSING
+        self._end = _MISSING
+        self._limit_first = None
+        self._limit_last = None
+
+    def start_at(self, start):
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def _sort_value(self, key, value):
+        if self._order_by == "key":
+            return key
+        if self._order_by == "value":
+            return value
+        for part in self._child_parts:
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def get(self):
+        self._ref._db.faults.apply(f"query {self._ref.path}")
+        with self._ref._db._lock:
+            node = copy.deepcopy(self._ref._db._get(self._ref._parts))
+        if not isinstance(node, dict):
+            return OrderedDict()
+
+        def value_rank(value):
+            # Firebase ordering: nulls, booleans, numbers, strings, objects
+            if value is None:
+                return (0, 0)
+            if isinstance(value, bool):
+                return (1, value)
+            if isinstance(value, (int, float)):
+                return (2, value)
+            if isinstance(value, str):
+                return (3, value)
+            return (4, 0)
+
+        def position(item):
+            return item[0] if self._order_by == "key" else value_rank(self._sort_value(*item))
+
+        def bound(value):
+            return str(value) if self._order_by == "key" else value_rank(value)
+
+        items = sorted(node.items(), key=lambda item: (position(item), item[0]))
+        if self._start is not _MISSING:
+            items = [item for item in items if position(item) >= bound(self._start)]
+        if self._end is not _MISSING:
+            items = [item for item in items if position(item) <= bound(self._end)]
+        if self._limit_first is not None:
+            items = items[:self._limit_first]
+        if self._limit_last is not None:
+            items = items[-self._limit_last:] if self._limit_last else []
+        return OrderedDict((key, _to_firebase_value(value)) for key, value in items)
+
+
+class FakeBlob:
+    """Mirror of the ``google.cloud.storage.Blob`` methods the project uses."""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.faults.apply(f"upload {self.name}")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.content_type = content_type
+        with self.bucket._lock:
+            self.bucket._blobs[self.name] = (bytes(data), content_type)
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type)
+
+    def download_as_bytes(self):
+        self.bucket.faults.apply(f"download {self.name}")
+        with self.bucket._lock:
+            if self.name not in self.bucket._blobs:
+                raise FakeFirebaseError(f"No such object: {self.name}")
+            return self.bucket._blobs[self.name][0]
+
+    download_as_string = download_as_bytes
+
+    def exists(self):
+        return self.name in self.bucket._blobs
+
+    def delete(self):
+        self.bucket.faults.apply(f"delete {self.name}")
+        with self.bucket._lock:
+            self.bucket._blobs.pop(self.name, None)
+
+
+class FakeBucket:
+    """Mirror of the ``google.cloud.storage.Bucket`` methods the project uses."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self._blobs = {}
+        self._lock = threading.Lock()
+        self.faults = _Faults(latency_ms, jitter_ms, error_rate, seed)
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.faults.apply(f"get_blob {name}")
+        if name not in self._blobs:
+            return None
+        blob = FakeBlob(self, name)
+        blob.content_type = self._blobs[name][1]
+        return blob
+
+    def list_blobs(self, prefix=""):
+        return [FakeBlob(self, name) for name in sorted(self._blobs) if name.startswith(prefix)]
+
+
+def emulation_enabled():
+    return os.environ.get("FIREBASE_EMULATION", "").lower() == "fake"
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_fake_firebase(default_data=None):
+    """Return the process-wide ``(database, bucket)`` pair configured from the environment.
+
+    The database starts from FAKE_FIREBASE_SEED if set, else ``default_data``;
+    the bucket is filled with the photos in FAKE_FIREBASE_PHOTOS (default Images/).
+    """
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            faults = {
+                "latency_ms": float(os.environ.get("FAKE_FIREBASE_LATENCY_MS", 0)),
+                "jitter_ms": float(os.environ.get("FAKE_FIREBASE_JITTER_MS", 0)),
+                "error_rate": float(os.environ.get("FAKE_FIREBASE_ERROR_RATE", 0)),
+            }
+            data = default_data
+            seed_path = os.environ.get("FAKE_FIREBASE_SEED")
+            if seed_path:
+                with open(seed_path) as f:
+                    data = json.load(f)
+            database = FakeDatabase(data, **faults)
+            bucket = FakeBucket(**faults)
+            photos = os.environ.get("FAKE_FIREBASE_PHOTOS", "Images")
+            if os.path.isdir(photos):
+                for name in sorted(os.listdir(photos)):
+                    with open(os.path.join(photos, name), "rb") as f:
+                        bucket._blobs[f"Images/{name}"] = (f.read(), None)
+            _instance = (database, bucket)
+        return _instance
@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the multi-worker deployment of web_app (see wsgi.py).
+
+    gunicorn -c gunicorn.conf.py
+
+The app is preloaded in the master, so dlib's models and the gallery are
+loaded once and shared copy-on-write. ``gc.freeze()`` keeps the collector
+from touching, and so copying, those pages in every worker. Each worker then
+creates its own storage backend after the fork.
+"""
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:application"
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Model inference holds the GIL, so a few threads per worker only cover I/O waits
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+
+def when_ready(server):
+    # Everything loaded by the preload is long-lived; move it out of the collector's reach
+    gc.freeze()
+    server.log.info(f"[OK] Preloaded app, forking {workers} workers")
+
+
+def post_fork(server, worker):
+    # Sockets, threads and the Firebase client must not be shared across processes
+    import web_app
+
+    web_app.worker_backend(server.log)
+    server.log.info(f"[OK] Worker {worker.pid} created its storage backend")
@@ -0,0 +1,208 @@
+"""
+Incremental liveness sessions.
+
+Instead of uploading a fixed burst of frames, a client starts a session and
+pushes frames one at a time. Each frame is scored against the session's
+rolling window and the session ends as soon as the confidence passes the
+threshold, or fails once it runs out of frames or time. Most people are
+verified after a handful of frames, so far less is uploaded and analysed
+than with a full burst.
+
+Sessions live in memory, keyed by a random id held by the client, and expire
+after ``ttl`` seconds without a frame.
+
+Detectors keep rolling state, so they come from a bounded ``DetectorPool``:
+a session checks one out for each frame, keeps it between frames while it is
+recently used, and hands it back (reset) when it ends. Idle sessions lose
+their detector to newer ones in least-recently-used order.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from ultra_simple_liveness import MIN_FRAMES
+
+SESSION_MAX_FRAMES = 30
+SESSION_TIMEOUT = 10.0
+SESSION_TTL = 60.0
+DETECTOR_POOL_SIZE = int(os.environ.get("LIVENESS_POOL_SIZE", 8))
+
+PENDING = "pending"
+LIVE = "live"
+FAILED = "failed"
+
+
+class PoolExhausted(Exception):
+    """Raised when every detector stays busy for longer than the pool's wait timeout."""
+
+
+class DetectorPool:
+    """Bounded set of stateful detectors, checked out per session.
+
+    A session keeps its detector between frames. When the pool is full, the
+    detector of the least recently used idle session is reset and reassigned;
+    that session simply starts a fresh rolling window on its next frame.
+    """
+
+    def __init__(self, factory, size=DETECTOR_POOL_SIZE, wait_timeout=5.0):
+        self.factory = factory
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self._free = []
+        # session id -> detector, least recently used first
+        self._assigned = OrderedDict()
+        self._busy = set()
+        self._created = 0
+        self.evictions = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def lease(self, session_id=None):
+        """Check out the session's detector, or a clean one for a one-off call."""
+        key = session_id or object()
+        detector = self._acquire(key)
+        try:
+            yield detector
+        finally:
+            with self._cond:
+                self._busy.discard(key)
+                if session_id is None:
+                    self._assigned.pop(key, None)
+                if key not in self._assigned:
+                    # One-off lease, or the session ended while using it
+                    detector.reset_detection()
+                    self._free.append(detector)
+                self._cond.notify()
+
+    def release(self, session_id):
+        """Return a finished session's detector to the pool."""
+        with self._cond:
+            if session_id in self._busy:
+                # Still in use; lease() hands it back when the call finishes
+                self._assigned.pop(session_id, None)
+                return
+            detector = self._assigned.pop(session_id, None)
+            if detector is not None:
+                detector.reset_detection()
+                self._free.append(detector)
+                self._cond.notify()
+
+    def _acquire(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            while True:
+                if key in self._assigned:
+                    self._assigned.move_to_end(key)
+                    self._busy.add(key)
+                    return self._assigned[key]
+                detector = self._take_detector()
+                if detector is not None:
+                    self._assigned[key] = detector
+                    self._busy.add(key)
+                    return detector
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"All {self.size} liveness detectors are busy")
+                self._cond.wait(remaining)
+
+    def _take_detector(self):
+        if self._free:
+            return self._free.pop()
+        if self._created < self.size:
+            self._created += 1
+            return self.factory()
+        for key in self._assigned:
+            if key not in self._busy:
+                detector = self._assigned.pop(key)
+                detector.reset_detection()
+                self.evictions += 1
+                return detector
+        return None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "free": len(self._free),
+                "assigned": len(self._assigned),
+                "busy": len(self._busy),
+                "evictions": self.evictions,
+            }
+
+
+class LivenessSession:
+    """One client's verification attempt, scored frame by frame."""
+
+    def __init__(self, pool, max_frames=SESSION_MAX_FRAMES, timeout=SESSION_TIMEOUT,
+                 min_frames=MIN_FRAMES):
+        self.id = uuid.uuid4().hex
+        self.pool = pool
+        self.max_frames = max_frames
+        self.timeout = timeout
+        self.min_frames = min_frames
+        self.started_at = time.monotonic()
+        self.last_seen = self.started_at
+        self.frames = 0
+        self.status = PENDING
+        self.result = None
+        self._lock = threading.Lock()
+
+    def push(self, frame, face_region=None):
+        """Score one more frame and return ``(status, result)``."""
+        with self._lock:
+            if self.status != PENDING:
+                return self.status, self.result
+            self.last_seen = time.monotonic()
+            self.frames += 1
+            with self.pool.lease(self.id) as detector:
+                self.result = detector.update(frame, face_region)
+            if self.frames >= self.min_frames and self.result["is_live"]:
+                self.status = LIVE
+            elif self.frames >= self.max_frames or self.last_seen - self.started_at > self.timeout:
+                self.status = FAILED
+            return self.status, self.result
+
+
+class LivenessSessionStore:
+    """In-memory sessions with idle expiry and a cap on how many are open."""
+
+    def __init__(self, pool, ttl=SESSION_TTL, max_sessions=500, **session_kwargs):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.session_kwargs = session_kwargs
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self):
+        session = LivenessSession(self.pool, **self.session_kwargs)
+        with self._lock:
+            self._expire()
+            while len(self._sessions) >= self.max_sessions:
+                self.pool.release(self._sessions.pop(next(iter(self._sessions))).id)
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self.pool.release(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_seen < cutoff]:
+            del self._sessions[session_id]
+            self.pool.release(session_id)
@@ -11,18 +11,33 @@ import pickle
 import os
 import firebase_admin
 from firebase_admin import credentials
-from firebase_admin import db
-from firebase_admin import storage
 from datetime import datetime
+import metrics
+from fake_firebase import emulation_enabled
+from pipeline_profiles import detect_faces, encode_faces, profile_for
+from resilient_client import ResilientBackend
+from storage_backend import firebase_backend
 
 #also uplaod image to storage at the same time
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred,{
-    'databaseURL': "https://faceattendancerealtime-612a8-default-rtdb.firebaseio.com/",
-    'storageBucket': "faceattendancerealtime-612a8.firebasestorage.app"
-})
-
-bucket=storage.bucket()
+#FIREBASE_EMULATION=fake runs the kiosk against the in-process fake (fake_firebase.py)
+if not emulation_enabled():
+    cred = credentials.Certificate("serviceAccountKey.json")
+    firebase_admin.initialize_app(cred,{
+        'databaseURL': "https://faceattendancerealtime-612a8-default-rtdb.firebaseio.com/",
+        'storageBucket': "faceattendancerealtime-612a8.firebasestorage.app",
+        'httpTimeout': 10
+    })
+
+# database and storage calls get a deadline and a circuit breaker, so a slow network never freezes the kiosk
+backend=ResilientBackend(firebase_backend())
+
+# detection/encoding settings: PIPELINE_PROFILE_KIOSK, kiosk-fast by default (see pipeline_profiles.py)
+profile=profile_for('kiosk')
+print(f"Pipeline profile: {profile.name}")
+
+# per-stage timings for the kiosk loop, scraped from http://<kiosk>:METRICS_PORT/
+metrics.set_route('kiosk')
+metrics.start_http_server(int(os.environ.get('METRICS_PORT', 9100)))
 
 cap = cv2.VideoCapture(0)
 cap.set(3,640)  #camera size in image background
@@ -50,26 +65,37 @@ modeType=0
 counter=0
 id=-1
 imgStudent=[]
+saveFailed=0 # frames left to show that the last attendance was not saved
+
+def showSaveFailed(imgBackground):
+    cv2.putText(imgBackground, "Not saved - please try again", (840, 600), cv2.FONT_HERSHEY_COMPLEX, 0.6,
+                (0, 0, 255), 1)
 
 while True:
     success, img = cap.read()
 
-    imgS=cv2.resize(img,(0,0),None,0.25,0.25)
-    imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
+    # the profile detects on a smaller copy (a quarter for kiosk-fast) and encodes from the full frame
+    imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
     #compare two face one from camera, one from encoding
-    faceCurFrame=face_recognition.face_locations(imgS)
-    encodeCurFrame=face_recognition.face_encodings(imgS,faceCurFrame)
+    with metrics.span('detect'):
+        faceCurFrame=detect_faces(imgRGB, profile)
+    with metrics.span('encode'):
+        encodeCurFrame=encode_faces(imgRGB,faceCurFrame, profile)
 
 
     imgBackground[162:162+480,55:55+640]=img
     imgBackground[44:44 + 633, 808:808 + 414] = imgModeList[modeType]
+    if saveFailed:
+        showSaveFailed(imgBackground)
+        saveFailed-=1
 
     # use zip so no need separate in two loop, encodeFace is current face
     # the lower distance , the better match
     for encodeFace, faceLoc in zip(encodeCurFrame, faceCurFrame):
-        matches = face_recognition.compare_faces(encodeListKnown, encodeFace)
-        faceDis=face_recognition.face_distance(encodeListKnown, encodeFace)
+        with metrics.span('match'):
+            matches = face_recognition.compare_faces(encodeListKnown, encodeFace)
+            faceDis=face_recognition.face_distance(encodeListKnown, encodeFace)
         #print("matches",matches)
         #print("faceDis",faceDis)
 
@@ -81,8 +107,7 @@ while True:
             #print("Known Face Detected")
             #print(studentIds[matchIndex])
             #draw rectangle means it detect face either opencv or directly use cvzone
-            y1,x2,y2,x1 = faceLoc #rectangle detect the face
-            y1, x2, y2, x1= y1*4,x2*4,y2*4,x1*4 # multiply back by 4 as last time we reduce image size by 4
+            y1,x2,y2,x1 = faceLoc #rectangle detect the face, already in full frame coordinates
             bbox=55+x1, 162+y1, x2-x1, y2-y1
             imgBackground= cvzone.cornerRect(imgBackground,bbox,rt=0) #bounding box with rect thick is zero
             id=studentIds[matchIndex]
@@ -94,35 +119,75 @@ while True:
     if counter !=0:
 
         if counter ==1:
-            #get the data
-            studentInfo=db.reference(f'Students/{id}').get()
+            #get the data and the image from the storage
+            try:
+                with metrics.span('db_student'):
+                    studentInfo=backend.get_student(id)
+            except Exception as e:
+                metrics.count('db_error')
+                print(f"Database unavailable: {e}")
+                studentInfo=None
+            photo=None
+            if studentInfo:
+                # a missing photo only changes what is shown, the match still counts
+                try:
+                    with metrics.span('db_photo'):
+                        photo=backend.get_photo(id)
+                except Exception as e:
+                    metrics.count('db_error')
+                    print(f"Could not load photo for {id}: {e}")
+
+            if not studentInfo:
+                # nothing to show, go back to the active screen
+                counter=0
+                modeType=0
+                imgBackground[44:44 + 633, 808:808 + 414] = imgModeList[modeType]
+                cv2.imshow('Face Attendance', imgBackground)
+                cv2.waitKey(1)
+                continue
             print(studentInfo)
-            # get the image from the storage
-            blob = bucket.get_blob(f'Images/{id}.png')
-            if blob is None:
-                blob = bucket.get_blob(f'Images/{id}.jpg')
 
-            if blob is None:
+            if photo is None:
                 print(f"No image found for {id}")
                 imgStudent = np.zeros((216, 216, 3), dtype=np.uint8)  # fallback placeholder
             else:
-                array = np.frombuffer(blob.download_as_string(), np.uint8)
+                array = np.frombuffer(photo, np.uint8)
                 imgStudent = cv2.imdecode(array, cv2.IMREAD_COLOR)
                 imgStudent = cv2.resize(imgStudent, (216, 216))
 
             #update data of attendance
+            try:
                 datetimeObject= datetime.strptime(studentInfo['last_atttendance_time'],"%Y-%m-%d %H:%M:%S")
                 secondsElapsed= (datetime.now()-datetimeObject).total_seconds()
-                print(secondsElapsed)
-                if secondsElapsed > 30:
-                    ref=db.reference(f'Students/{id}')
-                    studentInfo['Total attendance'] +=1
-                    ref.child('Total attendance').set(studentInfo['Total attendance'])
-                    ref.child('last_atttendance_time').set(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                else:
-                    modeType=3
+            except (KeyError, TypeError, ValueError):
+                # "Never" (a new or imported student) or no value: never attended before
+                secondsElapsed=float('inf')
+            print(secondsElapsed)
+            if secondsElapsed > 30:
+                try:
+                    backend.update_student(id, {
+                        'Total attendance': int(studentInfo.get('Total attendance', 0)) + 1,
+                        'last_atttendance_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    })
+                except Exception as e:
+                    # nothing was saved: show that instead of the marked screen
+                    metrics.count('db_error')
+                    print(f"Could not save attendance: {e}")
+                    saveFailed=30
                     counter=0
+                    modeType=0
                     imgBackground[44:44 + 633, 808:808 + 414] = imgModeList[modeType]
+                    showSaveFailed(imgBackground)
+                    cv2.imshow('Face Attendance', imgBackground)
+                    cv2.waitKey(1)
+                    continue
+                studentInfo['Total attendance']=int(studentInfo.get('Total attendance', 0)) + 1
+                metrics.count('match')
+            else:
+                metrics.count('already_marked')
+                modeType=3
+                counter=0
+                imgBackground[44:44 + 633, 808:808 + 414] = imgModeList[modeType]
 
         if modeType !=3:
 
@@ -162,7 +227,7 @@ while True:
                 counter=0
                 modeType=0
                 studentInfo=[]
-                imgStudent=[]c
+                imgStudent=[]
                 imgBackground[44:44 + 633, 808:808 + 414] = imgModeList[modeType]
 
 
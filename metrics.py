@@ -0,0 +1,255 @@
+"""
+In-process metrics: per-stage timers, histograms and counters in Prometheus text format.
+
+Wrap each stage of a request in ``span``:
+
+    with metrics.span("detect"):
+        face_locations = face_recognition.face_locations(rgb_image)
+
+and count outcomes with ``metrics.count("match")``. Spans are recorded in the
+``attendance_stage_seconds`` histogram labelled by route (set per request by
+``instrument_flask``, or passed explicitly) and stage. A span costs two
+``perf_counter`` calls and one short locked update, so it stays on the hot
+path.
+
+``instrument_flask(app)`` adds request timing and a ``/metrics`` endpoint;
+``start_http_server(port)`` serves the same text from processes without a
+web server, such as the kiosk loop in main.py.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond matching up to slow database calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _label_text(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", _label_text(self.labelnames, key, [("le", le)]), cumulative))
+            samples.append((f"{self.name}_sum", _label_text(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _label_text(self.labelnames, key), count))
+        return samples
+
+
+class CallbackMetric:
+    """Value read at scrape time, e.g. a cache size or a breaker's failure total.
+
+    ``fn`` returns a number, or ``{label_value: number}`` for a single label.
+    """
+
+    def __init__(self, name, documentation, fn, type="gauge", labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.type = type
+        self.labelname = labelname
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return [(self.name, _label_text((self.labelname,), (key,)), v) for key, v in value.items()]
+        return [] if value is None else [(self.name, "", value)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(name, lambda: Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(name, documentation, labelnames, buckets))
+
+    def register_callback(self, name, documentation, fn, type="gauge", labelname=None):
+        with self._lock:
+            self._metrics[name] = CallbackMetric(name, documentation, fn, type, labelname)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A broken callback must not take the whole scrape down
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "attendance_stage_seconds", "Time spent in each pipeline stage", ("route", "stage"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "attendance_http_request_seconds", "HTTP request latency", ("route", "method", "status"))
+EVENTS = REGISTRY.counter(
+    "attendance_events_total", "Pipeline outcomes such as matches, rejections and errors", ("route", "event"))
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "attendance_db_call_seconds", "Storage backend call latency", ("method", "outcome"))
+
+_current = threading.local()
+
+
+def set_route(route):
+    """Label later spans and counts on this thread with ``route``."""
+    _current.route = route
+
+
+def current_route():
+    return getattr(_current, "route", "")
+
+
+def start_trace():
+    """Also keep this thread's spans as ``(stage, seconds)`` until ``stop_trace``."""
+    _current.trace = []
+
+
+def stop_trace():
+    trace = getattr(_current, "trace", None)
+    _current.trace = None
+    return trace or []
+
+
+@contextmanager
+def span(stage, route=None):
+    """Time a block and record it under ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, route=route or current_route(), stage=stage)
+        trace = getattr(_current, "trace", None)
+        if trace is not None:
+            trace.append((stage, seconds))
+
+
+def count(event, amount=1, route=None):
+    EVENTS.inc(amount, route=route or current_route(), event=event)
+
+
+def instrument_flask(app, path="/metrics"):
+    """Time every request, label spans with the matched route, and serve ``path``."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        set_route(request.url_rule.rule if request.url_rule else "unmatched")
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=current_route(),
+                                    method=request.method, status=str(response.status_code))
+        return response
+
+    def metrics_endpoint():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule(path, "metrics", metrics_endpoint)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve ``/metrics`` from a daemon thread, for processes without a web server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
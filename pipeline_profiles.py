@@ -0,0 +1,101 @@
+"""
+Named speed/accuracy profiles for face detection and encoding.
+
+A profile sets every knob of the face_recognition pipeline at once:
+
+    model        detector, "hog" (CPU) or "cnn" (dlib's CNN, slow without a GPU)
+    upsample     times the image is upsampled to find smaller faces
+    scale        factor the image is resized by before detection
+    max_side     cap on the longer side of the detection image (None: no cap)
+    landmarks    alignment model, "small" (5 points) or "large" (68 points)
+    num_jitters  re-sampled crops averaged into each encoding
+
+Detection runs on the resized image. The boxes are mapped back and faces are
+always encoded from the full-resolution image. ``default`` is the library's
+own defaults, the behaviour every route had before profiles existed.
+
+Each entry point has a profile, ``ENTRY_POINT_PROFILES`` overridden by
+``PIPELINE_PROFILE_<ENTRY POINT>`` (e.g. ``PIPELINE_PROFILE_SCAN=kiosk-fast``).
+A request can ask for another with a ``profile`` field. Public routes only
+accept the names in ``REQUESTABLE_PROFILES``, so a client cannot ask for the
+expensive ones. ``benchmarks/profile_benchmark.py`` measures the latency and
+accuracy of each profile on your photos.
+"""
+
+import os
+from collections import namedtuple
+
+PipelineProfile = namedtuple("PipelineProfile", ["name", "model", "upsample", "scale", "max_side", "landmarks",
+                                                 "num_jitters"])
+
+PROFILES = {profile.name: profile for profile in (
+    PipelineProfile("default", "hog", 1, 1.0, None, "small", 1),
+    # main.py's quarter-size detection; a kiosk face fills much of the frame
+    PipelineProfile("kiosk-fast", "hog", 1, 0.25, None, "small", 1),
+    PipelineProfile("upload-accurate", "hog", 2, 1.0, 1280, "large", 3),
+    PipelineProfile("enrollment-max", "cnn", 1, 1.0, 1280, "large", 10),
+)}
+
+ENTRY_POINT_PROFILES = {
+    "kiosk": "kiosk-fast",
+    "scan": "default",
+    "match": "default",
+    "enrollment": "default",
+}
+REQUESTABLE_PROFILES = tuple(name.strip() for name in os.environ.get(
+    "PIPELINE_REQUESTABLE_PROFILES", "default,kiosk-fast,upload-accurate").split(",") if name.strip())
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown pipeline profile: {name}") from None
+
+
+def profile_for(entry_point, requested=None, allowed=None):
+    """The profile for a request to ``entry_point``: ``requested`` if given (and in ``allowed``), else its default.
+
+    Raises ValueError for an unknown or disallowed name.
+    """
+    if requested:
+        profile = get_profile(requested)
+        if allowed is not None and requested not in allowed:
+            raise ValueError(f"Pipeline profile not allowed here: {requested}")
+        return profile
+    name = os.environ.get(f"PIPELINE_PROFILE_{entry_point.upper()}") or ENTRY_POINT_PROFILES.get(entry_point, "default")
+    return get_profile(name)
+
+
+def detection_scale(profile, shape):
+    scale = profile.scale
+    if profile.max_side:
+        scale = min(scale, profile.max_side / max(shape[:2]))
+    return scale
+
+
+def detect_faces(rgb_image, profile):
+    """Face boxes ``(top, right, bottom, left)`` in ``rgb_image`` coordinates."""
+    import cv2
+    import face_recognition
+
+    scale = detection_scale(profile, rgb_image.shape)
+    if scale >= 1:
+        return face_recognition.face_locations(rgb_image, profile.upsample, profile.model)
+    small = cv2.resize(rgb_image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = rgb_image.shape[:2]
+    return [(max(0, round(top / scale)), min(width, round(right / scale)),
+             min(height, round(bottom / scale)), max(0, round(left / scale)))
+            for top, right, bottom, left in face_recognition.face_locations(small, profile.upsample, profile.model)]
+
+
+def encode_faces(rgb_image, face_locations, profile):
+    import face_recognition
+
+    return face_recognition.face_encodings(rgb_image, face_locations, profile.num_jitters, profile.landmarks)
+
+
+def detect_and_encode(rgb_image, profile):
+    """``(face_locations, face_encodings)`` for every face, with ``profile``'s settings."""
+    face_locations = detect_faces(rgb_image, profile)
+    return face_locations, encode_faces(rgb_image, face_locations, profile)
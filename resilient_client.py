@@ -0,0 +1,205 @@
+"""
+Bounded timeouts and a circuit breaker around storage backend calls.
+
+``ResilientBackend`` wraps any backend from storage_backend.py. Each call runs
+with a per-call deadline; after repeated failures the circuit opens and calls
+fail immediately with ``CircuitOpenError`` instead of waiting on a database
+that is known to be unhealthy. After ``reset_timeout`` seconds one probe call
+is let through (half-open): success closes the circuit, failure re-opens it.
+Only calls let through since the circuit last opened count: a slow call that
+started before it opened cannot close it again.
+
+A call that misses its deadline keeps running on the call pool, so each
+method may have at most ``max_in_flight`` calls running; beyond that calls
+fail at once with ``BackendSaturated`` and a hung backend cannot take every
+thread in the pool.
+
+Callers already fall back while the circuit is open: scans are committed to
+the local attendance journal and student reads are served from the students
+cache, so a kiosk's tail latency stays bounded during an outage.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from metrics import DB_CALL_SECONDS
+
+READ_TIMEOUT = float(os.environ.get("DB_READ_TIMEOUT", 3))
+WRITE_TIMEOUT = float(os.environ.get("DB_WRITE_TIMEOUT", 5))
+BULK_TIMEOUT = float(os.environ.get("DB_BULK_TIMEOUT", 30))
+# Calls of one backend method allowed to run at once, including ones past their deadline
+MAX_IN_FLIGHT = int(os.environ.get("DB_MAX_IN_FLIGHT", 4))
+
+# Deadline applied to each backend method
+CALL_TIMEOUTS = {
+    "get_student": READ_TIMEOUT,
+    "count_students": READ_TIMEOUT,
+    "is_marked": READ_TIMEOUT,
+    "get_attendance": READ_TIMEOUT,
+    "get_attendance_page": READ_TIMEOUT,
+    "get_analytics_summary": READ_TIMEOUT,
+    "get_daily_counts": READ_TIMEOUT,
+    "get_monthly_counts": READ_TIMEOUT,
+    "get_photo": READ_TIMEOUT,
+    "add_student": WRITE_TIMEOUT,
+    "update_student": WRITE_TIMEOUT,
+    "delete_student": WRITE_TIMEOUT,
+    "put_photo": WRITE_TIMEOUT,
+    "get_students": BULK_TIMEOUT,
+    "get_student_ids": BULK_TIMEOUT,
+    "get_all_attendance": BULK_TIMEOUT,
+    "add_students": BULK_TIMEOUT,
+    "apply_attendance": BULK_TIMEOUT,
+    "rebuild_analytics": BULK_TIMEOUT,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while the circuit is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a backend call does not finish within its deadline."""
+
+
+class BackendSaturated(Exception):
+    """Raised instead of calling a method that already has ``max_in_flight`` calls running."""
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures -> half-open after ``reset_timeout``."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.total_failures = 0
+        self.total_rejected = 0
+        # Bumped each time the circuit opens; outcomes of calls let through before are ignored
+        self.generation = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go through now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self, generation=None):
+        """Record a call that succeeded; ``generation`` is the one read when it was let through."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, generation=None):
+        with self._lock:
+            self.total_failures += 1
+            if generation is not None and generation != self.generation:
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.generation += 1
+            self._probe_in_flight = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+        }
+
+
+class ResilientBackend:
+    """Proxy that applies deadlines and a circuit breaker to every backend call."""
+
+    def __init__(self, backend, breaker=None, max_workers=16, max_in_flight=MAX_IN_FLIGHT, logger=None):
+        self.backend = backend
+        self.breaker = breaker or CircuitBreaker()
+        self.max_in_flight = max_in_flight
+        self.logger = logger
+        # Calls run on a small shared pool so the caller can stop waiting at the deadline
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-call")
+        # {method: calls running}, released when the call really finishes, not at its deadline
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.total_saturated = 0
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def listen_students(self, callback):
+        # Long-lived subscription, not a request/response call
+        return self.backend.listen_students(callback)
+
+    def __getattr__(self, attr):
+        target = getattr(self.backend, attr)
+        timeout = CALL_TIMEOUTS.get(attr)
+        if timeout is None or not callable(target):
+            return target
+
+        def call(*args, **kwargs):
+            return self.call(attr, target, timeout, *args, **kwargs)
+
+        return call
+
+    def call(self, name, fn, timeout, *args, **kwargs):
+        with self._in_flight_lock:
+            if self._in_flight.get(name, 0) >= self.max_in_flight:
+                self.total_saturated += 1
+                DB_CALL_SECONDS.observe(0.0, method=name, outcome="saturated")
+                raise BackendSaturated(f"{name} already has {self.max_in_flight} calls running, skipped")
+            if not self.breaker.allow():
+                DB_CALL_SECONDS.observe(0.0, method=name, outcome="circuit_open")
+                raise CircuitOpenError(f"{self.backend.name} backend unavailable (circuit open), skipped {name}")
+            generation = self.breaker.generation
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+        start = time.perf_counter()
+        future = self._pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self._release(name))
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # The call keeps running and holds its slot; whatever it returns later is ignored
+            self.breaker.record_failure(generation)
+            DB_CALL_SECONDS.observe(time.perf_counter() - start, method=name, outcome="deadline")
+            raise DeadlineExceeded(f"{name} did not finish within {timeout:.1f}s")
+        except Exception:
+            self.breaker.record_failure(generation)
+            DB_CALL_SECONDS.observe(time.perf_counter() - start, method=name, outcome="error")
+            raise
+        self.breaker.record_success(generation)
+        DB_CALL_SECONDS.observe(time.perf_counter() - start, method=name, outcome="ok")
+        return result
+
+    def _release(self, name):
+        with self._in_flight_lock:
+            self._in_flight[name] -= 1
+
+    def stats(self):
+        with self._in_flight_lock:
+            in_flight = {name: count for name, count in self._in_flight.items() if count}
+        return dict(self.breaker.stats(), backend=self.backend.name, in_flight=in_flight,
+                    total_saturated=self.total_saturated)
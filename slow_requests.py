@@ -0,0 +1,242 @@
+"""
+Slow-request capture with a sampling profiler.
+
+While capture is enabled, each request to an instrumented route is traced.
+Its ``metrics.span`` stages are kept, and one shared sampler thread reads
+the request thread's Python stack every few milliseconds through
+``sys._current_frames()``. There is no tracing hook, so the request runs at
+full speed. A request slower than the threshold is written to a bounded
+on-disk ring buffer; faster ones are dropped:
+
+    slow_requests/<capture id>/capture.json    route, status, duration, stages, frame sizes
+    slow_requests/<capture id>/profile.txt     folded stacks ("a;b;c count"), for flame graph tools
+    slow_requests/<capture id>/frame<n>.<ext>  the uploaded frames as sent, when save_frames is on
+
+The oldest captures are deleted beyond ``max_captures``. The capture is
+written after the response has been sent.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+import metrics
+
+SLOW_REQUEST_DIR = os.environ.get("SLOW_REQUEST_DIR", "slow_requests")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+SLOW_REQUEST_CAPTURES = int(os.environ.get("SLOW_REQUEST_CAPTURES", 50))
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+
+
+def _folded_stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """One daemon thread that samples the stacks of the threads registered with it."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        # thread id -> {folded stack: samples}
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id):
+        with self._lock:
+            self._targets[thread_id] = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def remove(self, thread_id):
+        """Stop sampling ``thread_id`` and return its stack counts."""
+        with self._lock:
+            counts = self._targets.pop(thread_id, {})
+            if not self._targets:
+                self._active.clear()
+        return counts
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                thread_ids = list(self._targets)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = _folded_stack(frame)
+                with self._lock:
+                    counts = self._targets.get(thread_id)
+                    if counts is not None:
+                        counts[stack] = counts.get(stack, 0) + 1
+            del frames
+
+
+class SlowRequestRecorder:
+    """Profiles requests while enabled and keeps the ones over ``threshold_ms``."""
+
+    def __init__(self, directory=SLOW_REQUEST_DIR, threshold_ms=SLOW_REQUEST_MS, max_captures=SLOW_REQUEST_CAPTURES,
+                 save_frames=False, enabled=False, logger=None):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.max_captures = max_captures
+        self.save_frames = save_frames
+        self.enabled = enabled
+        self.logger = logger
+        self.sampler = StackSampler()
+        self._write_lock = threading.Lock()
+
+    def settings(self):
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "save_frames": self.save_frames,
+            "max_captures": self.max_captures,
+            "directory": self.directory,
+        }
+
+    def configure(self, enabled=None, threshold_ms=None, save_frames=None):
+        if threshold_ms is not None:
+            self.threshold_ms = max(0.0, float(threshold_ms))
+        if save_frames is not None:
+            self.save_frames = bool(save_frames)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def instrument(self, app, endpoints):
+        """Profile requests to the given Flask endpoint names."""
+        from flask import g, request
+
+        endpoints = set(endpoints)
+
+        @app.before_request
+        def _begin_profile():
+            if self.enabled and request.endpoint in endpoints:
+                g.slow_request = (time.perf_counter(), threading.get_ident())
+                metrics.start_trace()
+                self.sampler.add(g.slow_request[1])
+
+        @app.after_request
+        def _end_profile(response):
+            started = g.pop("slow_request", None)
+            if started is None:
+                return response
+            start, thread_id = started
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stacks = self.sampler.remove(thread_id)
+            stages = metrics.stop_trace()
+            if elapsed_ms >= self.threshold_ms:
+                capture = {
+                    "route": request.url_rule.rule if request.url_rule else request.path,
+                    "method": request.method,
+                    "status": response.status_code,
+                    "duration_ms": elapsed_ms,
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "stages": [{"stage": stage, "ms": seconds * 1000} for stage, seconds in stages],
+                    "samples": sum(stacks.values()),
+                }
+                uploads = [(name, upload.filename, _read_upload(upload))
+                           for name, upload in request.files.items(multi=True)]
+                response.call_on_close(lambda: self._write(capture, stacks, uploads))
+            return response
+
+        @app.teardown_request
+        def _drop_profile(error=None):
+            # after_request is skipped when a view raises; stop sampling its thread anyway
+            started = g.pop("slow_request", None)
+            if started is not None:
+                self.sampler.remove(started[1])
+                metrics.stop_trace()
+
+    def _write(self, capture, stacks, uploads):
+        try:
+            import cv2
+            import numpy as np
+
+            capture_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            path = os.path.join(self.directory, capture_id)
+            os.makedirs(path, exist_ok=True)
+            capture["id"] = capture_id
+            capture["frames"] = []
+            for index, (field, filename, data) in enumerate(uploads):
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED) if data else None
+                frame = {"field": field, "bytes": len(data),
+                         "width": int(image.shape[1]) if image is not None else None,
+                         "height": int(image.shape[0]) if image is not None else None}
+                if self.save_frames and data:
+                    # The original bytes, so the scan can be replayed exactly
+                    extension = os.path.splitext(filename or "")[1].lower()
+                    frame["file"] = f"frame{index}{extension if extension in ('.jpg', '.jpeg', '.png') else '.jpg'}"
+                    with open(os.path.join(path, frame["file"]), "wb") as f:
+                        f.write(data)
+                capture["frames"].append(frame)
+            with open(os.path.join(path, "profile.txt"), "w") as f:
+                for stack, samples in sorted(stacks.items(), key=lambda item: -item[1]):
+                    f.write(f"{stack} {samples}\n")
+            with open(os.path.join(path, "capture.json"), "w") as f:
+                json.dump(capture, f, indent=2)
+            self._prune()
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error(f"Could not save slow request capture: {e}")
+
+    def _prune(self):
+        with self._write_lock:
+            for capture_id in self._capture_ids()[self.max_captures:]:
+                shutil.rmtree(os.path.join(self.directory, capture_id), ignore_errors=True)
+
+    def _capture_ids(self):
+        """Capture ids, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory)
+                       if os.path.isfile(os.path.join(self.directory, name, "capture.json"))), reverse=True)
+
+    def captures(self):
+        """Summaries of the stored captures, newest first."""
+        summaries = []
+        for capture_id in self._capture_ids():
+            capture = self.load(capture_id)
+            if capture is None:
+                continue
+            stages = capture.get("stages", [])
+            capture["slowest_stage"] = max(stages, key=lambda stage: stage["ms"]) if stages else None
+            summaries.append(capture)
+        return summaries
+
+    def load(self, capture_id):
+        try:
+            with open(os.path.join(self.capture_path(capture_id), "capture.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def capture_path(self, capture_id):
+        if os.path.basename(capture_id) != capture_id or capture_id.startswith("."):
+            raise ValueError(f"Bad capture id: {capture_id}")
+        return os.path.join(self.directory, capture_id)
+
+
+def _read_upload(upload):
+    """The bytes of an uploaded file that the view has already read."""
+    try:
+        upload.stream.seek(0)
+        return upload.stream.read()
+    except (OSError, ValueError):
+        return b""
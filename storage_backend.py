@@ -0,0 +1,759 @@
+"""
+Pluggable storage backends for students, attendance and student photos.
+
+Routes talk to a ``StorageBackend`` instead of calling ``db.reference(...)``
+directly. ``FirebaseBackend`` wraps the Realtime Database and Storage bucket;
+``SQLiteBackend`` keeps everything in one local SQLite file, indexed on date
+and student id, so a single site can run fully offline.
+
+Select the backend with the ``STORAGE_BACKEND`` environment variable
+(``firebase`` or ``sqlite``). Without it, Firebase is used when it initialised
+and SQLite otherwise.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from analytics_aggregates import RECENT_ACTIVITY_SIZE, TOP_STUDENTS_SIZE, summarise_attendance, top_students
+from fake_firebase import emulation_enabled, get_fake_firebase
+
+DEFAULT_SQLITE_PATH = os.environ.get("LOCAL_STORE_PATH", "local_store.db")
+
+# Sample students used to seed an empty local store
+SAMPLE_STUDENTS = {
+    "321654": {
+        "name": "John Doe",
+        "major": "Computer Science",
+        "year": "3",
+        "standing": "A",
+        "starting_year": "2022",
+        "Total attendance": 15,
+        "last_atttendance_time": "2024-01-15 10:30:00"
+    },
+    "852741": {
+        "name": "Jane Smith",
+        "major": "Engineering",
+        "year": "2",
+        "standing": "B",
+        "starting_year": "2023",
+        "Total attendance": 12,
+        "last_atttendance_time": "2024-01-14 14:20:00"
+    },
+    "963852": {
+        "name": "Elon Musk",
+        "major": "Biology",
+        "year": "2",
+        "standing": "G",
+        "starting_year": "2020",
+        "Total attendance": 8,
+        "last_atttendance_time": "2024-01-13 09:10:00"
+    }
+}
+
+PHOTO_EXTENSIONS = ("png", "jpg")
+
+FIREBASE_OPTIONS = {
+    "databaseURL": "https://facerecognitionrealtime-default-rtdb.firebaseio.com/",
+    "storageBucket": "facerecognitionrealtime.firebasestorage.app",
+    # Socket-level timeout for the pooled HTTP session (seconds); see resilient_client.py
+    "httpTimeout": 10
+}
+
+
+def init_firebase(credentials_path="serviceAccountKey.json", options=None):
+    """Initialise firebase_admin once per process. Returns True if Firebase is usable."""
+    if emulation_enabled():
+        print("[OK] Using in-process fake Firebase (FIREBASE_EMULATION=fake)")
+        return True
+    try:
+        import firebase_admin
+        from firebase_admin import credentials
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(credentials_path)
+            firebase_admin.initialize_app(cred, options or FIREBASE_OPTIONS)
+        print("[OK] Firebase initialized successfully")
+        return True
+    except Exception as e:
+        print(f"[WARNING] Firebase initialization failed: {e}")
+        return False
+
+
+def _activity_stamp(activity):
+    return f"{activity.get('date', '')} {activity.get('time', '')}"
+
+
+class StorageBackend:
+    """Interface shared by every storage backend.
+
+    Attendance is stored as ``{date: {student_id: "HH:MM:SS"}}`` and students
+    as ``{student_id: {field: value}}``, mirroring the Firebase layout.
+    """
+
+    name = "base"
+
+    # Students
+    def get_student(self, student_id):
+        raise NotImplementedError
+
+    def get_students(self):
+        raise NotImplementedError
+
+    def add_student(self, student_id, data):
+        raise NotImplementedError
+
+    def update_student(self, student_id, fields):
+        """Update some fields of one student."""
+        raise NotImplementedError
+
+    def delete_student(self, student_id):
+        raise NotImplementedError
+
+    def add_students(self, students):
+        """Write many ``{student_id: data}`` records in one batch."""
+        raise NotImplementedError
+
+    def count_students(self):
+        raise NotImplementedError
+
+    def get_student_ids(self):
+        """Set of every student id, without the records."""
+        raise NotImplementedError
+
+    def listen_students(self, callback):
+        """Subscribe to changes under Students.
+
+        ``callback(event_type, path, data)`` receives Firebase-style ``put`` and
+        ``patch`` events with ``path`` relative to the Students node. Returns a
+        registration object with a ``close()`` method.
+        """
+        raise NotImplementedError
+
+    # Attendance
+    def is_marked(self, student_id, date_str):
+        raise NotImplementedError
+
+    def get_attendance(self, date_str):
+        raise NotImplementedError
+
+    def get_all_attendance(self):
+        raise NotImplementedError
+
+    def get_attendance_page(self, start_date=None, end_date=None, cursor=None, limit=7):
+        """Return one page of days, newest first, as ``(records, next_cursor)``.
+
+        ``records`` holds at most ``limit`` days within the optional
+        ``[start_date, end_date]`` range, starting at ``cursor`` (inclusive)
+        when given. ``next_cursor`` is the date the following page starts at,
+        or None on the last page.
+        """
+        raise NotImplementedError
+
+    def apply_attendance(self, entries):
+        """Apply journal entries (see attendance_journal.py), skipping any already applied.
+
+        Implementations also update the analytics aggregates in the same write.
+        """
+        raise NotImplementedError
+
+    # Analytics aggregates (see analytics_aggregates.py)
+    def get_analytics_summary(self):
+        """Return ``total_records``, ``days_recorded``, ``students_attended``, ``top_students`` and ``recent``.
+
+        ``top_students`` is ``{student_id: count}`` for at most ``TOP_STUDENTS_SIZE`` students.
+        """
+        raise NotImplementedError
+
+    def get_daily_counts(self, dates=None):
+        """Return ``{date: count}`` for the given dates that have attendance, or for every date."""
+        raise NotImplementedError
+
+    def get_monthly_counts(self, limit=12):
+        """Return ``{"YYYY-MM": count}`` for the latest ``limit`` months with attendance."""
+        raise NotImplementedError
+
+    def rebuild_analytics(self):
+        """Recompute the aggregates from the full attendance history."""
+        raise NotImplementedError
+
+    # Photos
+    def get_photo(self, student_id):
+        """Return the raw bytes of the student's photo, or None."""
+        raise NotImplementedError
+
+    def put_photo(self, student_id, data, ext="png"):
+        raise NotImplementedError
+
+
+class FirebaseBackend(StorageBackend):
+    """Firebase Realtime Database and Storage."""
+
+    name = "firebase"
+
+    def __init__(self, db_module=None, bucket=None):
+        if db_module is None:
+            from firebase_admin import db as db_module
+        self.db = db_module
+        self._bucket = bucket
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from firebase_admin import storage
+            self._bucket = storage.bucket()
+        return self._bucket
+
+    def get_student(self, student_id):
+        return self.db.reference(f"Students/{student_id}").get()
+
+    def get_students(self):
+        return self.db.reference("Students").get() or {}
+
+    def add_student(self, student_id, data):
+        self.db.reference(f"Students/{student_id}").set(data)
+
+    def update_student(self, student_id, fields):
+        self.db.reference(f"Students/{student_id}").update(fields)
+
+    def delete_student(self, student_id):
+        self.db.reference(f"Students/{student_id}").delete()
+
+    def add_students(self, students):
+        # Multi-path update: one request for the whole chunk
+        if students:
+            self.db.reference("Students").update(students)
+
+    def count_students(self):
+        return len(self.db.reference("Students").get(shallow=True) or {})
+
+    def get_student_ids(self):
+        return set(self.db.reference("Students").get(shallow=True) or {})
+
+    def listen_students(self, callback):
+        return self.db.reference("Students").listen(
+            lambda event: callback(event.event_type, event.path, event.data)
+        )
+
+    def is_marked(self, student_id, date_str):
+        return bool(self.db.reference(f"Attendance/{date_str}/{student_id}").get())
+
+    def get_attendance(self, date_str):
+        return self.db.reference(f"Attendance/{date_str}").get() or {}
+
+    def get_all_attendance(self):
+        return self.db.reference("Attendance").get() or {}
+
+    def get_attendance_page(self, start_date=None, end_date=None, cursor=None, limit=7):
+        # Ordered, limited key query: only limit + 1 days are downloaded
+        query = self.db.reference("Attendance").order_by_key()
+        if start_date:
+            query = query.start_at(start_date)
+        upper = min(filter(None, [end_date, cursor]), default=None)
+        if upper:
+            query = query.end_at(upper)
+        days = query.limit_to_last(limit + 1).get() or {}
+        dates = sorted(days, reverse=True)
+        next_cursor = dates[limit] if len(dates) > limit else None
+        return {date_str: days[date_str] for date_str in dates[:limit]}, next_cursor
+
+    def apply_attendance(self, entries):
+        """Apply a batch of journaled attendance in one multi-path update."""
+        # One shallow read per date tells us which idempotency keys already landed,
+        # whether from an earlier attempt of this batch or from another kiosk.
+        applied = set()
+        for date_str in {entry["date"] for entry in entries}:
+            existing = self.db.reference(f"Attendance/{date_str}").get(shallow=True) or {}
+            applied.update(f"{date_str}_{student_id}" for student_id in existing)
+
+        # Claim each remaining record in a transaction before counting it: of two
+        # replayers pushing the same entry, only the one that wrote it increments.
+        # If the counter update below then fails, the retry finds the records claimed
+        # and skips them, so counters can fall short (fixed by --rebuild) but never double.
+        new_entries = [entry for entry in entries
+                       if entry["idempotency_key"] not in applied and self._claim_attendance(entry)]
+        if not new_entries:
+            return
+
+        updates = {}
+        increments = {}
+        date_increments = {}
+        month_increments = {}
+        last_seen = {}
+        for entry in new_entries:
+            student_id = entry["student_id"]
+            increments[student_id] = increments.get(student_id, 0) + 1
+            date_increments[entry["date"]] = date_increments.get(entry["date"], 0) + 1
+            month_increments[entry["date"][:7]] = month_increments.get(entry["date"][:7], 0) + 1
+            stamp = f"{entry['date']} {entry['time']}"
+            last_seen[student_id] = max(last_seen.get(student_id, stamp), stamp)
+
+        # Per-student and per-day counts go through transactions, which tell us which
+        # students and days are new and each student's new total for the top list
+        student_totals = {}
+        new_students = 0
+        for student_id, count in increments.items():
+            updates[f"Students/{student_id}/Total attendance"] = {".sv": {"increment": count}}
+            updates[f"Students/{student_id}/last_atttendance_time"] = last_seen[student_id]
+            previous, student_totals[student_id] = self._increment(f"Analytics/by_student/{student_id}", count)
+            new_students += previous is None
+        new_days = 0
+        for date_str, count in date_increments.items():
+            previous, _ = self._increment(f"Analytics/by_date/{date_str}", count)
+            new_days += previous is None
+        for month, count in month_increments.items():
+            updates[f"Analytics/by_month/{month}"] = {".sv": {"increment": count}}
+        if new_students:
+            updates["Analytics/students_attended"] = {".sv": {"increment": new_students}}
+        if new_days:
+            updates["Analytics/days_recorded"] = {".sv": {"increment": new_days}}
+        self._update_top_students(student_totals)
+
+        # Recent activity is keyed by idempotency key, so kiosks writing at the same
+        # time never overwrite each other's entries
+        recent = self._recent_activity()
+        for entry in new_entries:
+            activity = {"date": entry["date"], "time": entry["time"], "student_id": entry["student_id"]}
+            updates[f"Analytics/recent/{entry['idempotency_key']}"] = activity
+            recent[entry["idempotency_key"]] = activity
+        updates["Analytics/total_records"] = {".sv": {"increment": len(new_entries)}}
+
+        self.db.reference().update(updates)
+
+        # Trim to the newest entries. Only entries older than RECENT_ACTIVITY_SIZE others
+        # are deleted, so concurrent trims never remove one that should stay.
+        for key in sorted(recent, key=lambda key: _activity_stamp(recent[key]))[:-RECENT_ACTIVITY_SIZE]:
+            self.db.reference(f"Analytics/recent/{key}").delete()
+
+    def _increment(self, path, count):
+        """Add ``count`` to the number at ``path`` in a transaction. Returns ``(previous, new)``."""
+        previous = []
+
+        def add(current):
+            previous[:] = [current]
+            return (current or 0) + count
+
+        new = self.db.reference(path).transaction(add)
+        return previous[0], new
+
+    def _update_top_students(self, student_totals):
+        """Merge the students' new totals into ``Analytics/top_students``.
+
+        Counts only grow, so a student can only enter the top list when one of
+        their scans is applied, and that write brings their full total.
+        """
+        def merge(current):
+            top = dict(current or {})
+            for student_id, total in student_totals.items():
+                top[student_id] = max(total, top.get(student_id, 0))
+            return dict(top_students(top, TOP_STUDENTS_SIZE))
+
+        self.db.reference("Analytics/top_students").transaction(merge)
+
+    def _claim_attendance(self, entry):
+        """Write ``Attendance/{date}/{student_id}`` unless it exists. True if this call wrote it."""
+        claimed = []
+
+        def claim(current):
+            # May run more than once on contention; the last run is the one committed
+            claimed[:] = [current is None]
+            return entry["time"] if current is None else current
+
+        self.db.reference(f"Attendance/{entry['date']}/{entry['student_id']}").transaction(claim)
+        return claimed[0]
+
+    def _recent_activity(self):
+        recent = self.db.reference("Analytics/recent").get() or {}
+        if isinstance(recent, list):
+            # Firebase returns integer-keyed children (the old ring buffer slots) as a list
+            recent = dict(enumerate(recent))
+        return {str(key): activity for key, activity in recent.items() if activity}
+
+    def get_analytics_summary(self):
+        recent = sorted(self._recent_activity().values(), key=_activity_stamp)
+        return {
+            "total_records": self.db.reference("Analytics/total_records").get() or 0,
+            "days_recorded": self.db.reference("Analytics/days_recorded").get() or 0,
+            "students_attended": self.db.reference("Analytics/students_attended").get() or 0,
+            "top_students": self.db.reference("Analytics/top_students").get() or {},
+            "recent": recent[-RECENT_ACTIVITY_SIZE:],
+        }
+
+    def get_daily_counts(self, dates=None):
+        if dates is None:
+            return self.db.reference("Analytics/by_date").get() or {}
+        if not dates:
+            return {}
+        counts = (
+            self.db.reference("Analytics/by_date")
+            .order_by_key().start_at(min(dates)).end_at(max(dates)).get()
+        ) or {}
+        return {date_str: count for date_str, count in counts.items() if date_str in dates}
+
+    def get_monthly_counts(self, limit=12):
+        return self.db.reference("Analytics/by_month").order_by_key().limit_to_last(limit).get() or {}
+
+    def rebuild_analytics(self):
+        summary = summarise_attendance(self.get_all_attendance())
+        self.db.reference("Analytics").set({
+            "total_records": summary["total_records"],
+            "by_date": summary["by_date"],
+            "by_month": summary["by_month"],
+            "by_student": summary["by_student"],
+            "days_recorded": len(summary["by_date"]),
+            "students_attended": len(summary["by_student"]),
+            "top_students": dict(top_students(summary["by_student"], TOP_STUDENTS_SIZE)),
+            "recent": {f"{activity['date']}_{activity['student_id']}": activity for activity in summary["recent"]},
+        })
+        return summary
+
+    def get_photo(self, student_id):
+        for ext in PHOTO_EXTENSIONS:
+            blob = self.bucket.get_blob(f"Images/{student_id}.{ext}")
+            if blob is not None:
+                return blob.download_as_string()
+        return None
+
+    def put_photo(self, student_id, data, ext="png"):
+        blob = self.bucket.blob(f"Images/{student_id}.{ext}")
+        blob.upload_from_string(data, content_type=f"image/{'jpeg' if ext == 'jpg' else ext}")
+
+
+def firebase_backend():
+    """``FirebaseBackend`` on the real SDK, or on fake_firebase.py when FIREBASE_EMULATION=fake."""
+    if emulation_enabled():
+        database, bucket = get_fake_firebase({"Students": SAMPLE_STUDENTS})
+        return FirebaseBackend(database, bucket)
+    return FirebaseBackend()
+
+
+class LocalListenerRegistration:
+    """Handle returned by ``SQLiteBackend.listen_students``."""
+
+    def __init__(self, listeners, callback):
+        self._listeners = listeners
+        self._callback = callback
+
+    def close(self):
+        if self._callback in self._listeners:
+            self._listeners.remove(self._callback)
+
+
+class SQLiteBackend(StorageBackend):
+    """Single-file local store, indexed on attendance date and student id.
+
+    Change events for ``listen_students`` are emitted in-process by the
+    methods below, standing in for the Firebase listener. Writes made by
+    other processes to the same file are not observed.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._listeners = []
+        self._init_schema()
+
+    def _emit(self, path, data):
+        for callback in list(self._listeners):
+            callback("put", path, data)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS students (id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS attendance (
+                    date TEXT NOT NULL,
+                    student_id TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    PRIMARY KEY (date, student_id)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance(student_id, date)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_attendance_recent ON attendance(date, time)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_counts (date TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS student_counts (student_id TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_student_counts_count ON student_counts(count)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS monthly_counts (month TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+            )
+            # Stores created before monthly_counts existed fill it from the per-day counts once
+            if conn.execute("SELECT 1 FROM monthly_counts LIMIT 1").fetchone() is None:
+                conn.execute(
+                    "INSERT INTO monthly_counts (month, count) "
+                    "SELECT substr(date, 1, 7), SUM(count) FROM daily_counts GROUP BY substr(date, 1, 7)"
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS photos (student_id TEXT PRIMARY KEY, ext TEXT NOT NULL, data BLOB NOT NULL)"
+            )
+
+    def seed_students(self, students):
+        """Insert students that are not already present."""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO students (id, data) VALUES (?, ?)",
+                [(student_id, json.dumps(data)) for student_id, data in students.items()],
+            )
+        self._emit("/", self.get_students())
+
+    def get_student(self, student_id):
+        row = self._connect().execute(
+            "SELECT data FROM students WHERE id = ?", (student_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_students(self):
+        rows = self._connect().execute("SELECT id, data FROM students ORDER BY id").fetchall()
+        return {student_id: json.loads(data) for student_id, data in rows}
+
+    def add_student(self, student_id, data):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO students (id, data) VALUES (?, ?)",
+                (student_id, json.dumps(data)),
+            )
+        self._emit(f"/{student_id}", data)
+
+    def update_student(self, student_id, fields):
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT data FROM students WHERE id = ?", (student_id,)).fetchone()
+            student = dict(json.loads(row[0]) if row else {}, **fields)
+            conn.execute(
+                "INSERT OR REPLACE INTO students (id, data) VALUES (?, ?)", (student_id, json.dumps(student))
+            )
+        self._emit(f"/{student_id}", student)
+
+    def delete_student(self, student_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
+        self._emit(f"/{student_id}", None)
+
+    def add_students(self, students):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO students (id, data) VALUES (?, ?)",
+                [(student_id, json.dumps(data)) for student_id, data in students.items()],
+            )
+        for student_id, data in students.items():
+            self._emit(f"/{student_id}", data)
+
+    def count_students(self):
+        return self._connect().execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def get_student_ids(self):
+        return {row[0] for row in self._connect().execute("SELECT id FROM students")}
+
+    def listen_students(self, callback):
+        self._listeners.append(callback)
+        return LocalListenerRegistration(self._listeners, callback)
+
+    def is_marked(self, student_id, date_str):
+        row = self._connect().execute(
+            "SELECT 1 FROM attendance WHERE date = ? AND student_id = ?", (date_str, student_id)
+        ).fetchone()
+        return row is not None
+
+    def get_attendance(self, date_str):
+        rows = self._connect().execute(
+            "SELECT student_id, time FROM attendance WHERE date = ? ORDER BY student_id", (date_str,)
+        ).fetchall()
+        return dict(rows)
+
+    def get_attendance_page(self, start_date=None, end_date=None, cursor=None, limit=7):
+        conn = self._connect()
+        upper = min(filter(None, [end_date, cursor]), default=None)
+        # Distinct dates straight off the (date, time) index, so days missing from the
+        # daily_counts aggregate (e.g. before a --rebuild) still appear
+        dates = [row[0] for row in conn.execute(
+            "SELECT DISTINCT date FROM attendance WHERE date >= ? AND date <= ? ORDER BY date DESC LIMIT ?",
+            (start_date or "", upper or "9999-99-99", limit + 1),
+        )]
+        next_cursor = dates[limit] if len(dates) > limit else None
+        dates = dates[:limit]
+        records = {date_str: {} for date_str in dates}
+        if dates:
+            placeholders = ",".join("?" for _ in dates)
+            for date_str, student_id, time_str in conn.execute(
+                f"SELECT date, student_id, time FROM attendance WHERE date IN ({placeholders}) "
+                "ORDER BY date DESC, time",
+                dates,
+            ):
+                records[date_str][student_id] = time_str
+        return records, next_cursor
+
+    def get_all_attendance(self):
+        records = {}
+        for date_str, student_id, time_str in self._connect().execute(
+            "SELECT date, student_id, time FROM attendance ORDER BY date, student_id"
+        ):
+            records.setdefault(date_str, {})[student_id] = time_str
+        return records
+
+    def apply_attendance(self, entries):
+        conn = self._connect()
+        changed = {}
+        with conn:
+            for entry in entries:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO attendance (date, student_id, time) VALUES (?, ?, ?)",
+                    (entry["date"], entry["student_id"], entry["time"]),
+                ).rowcount
+                if not inserted:
+                    continue
+                conn.execute(
+                    "INSERT INTO daily_counts (date, count) VALUES (?, 1) "
+                    "ON CONFLICT(date) DO UPDATE SET count = count + 1",
+                    (entry["date"],),
+                )
+                conn.execute(
+                    "INSERT INTO monthly_counts (month, count) VALUES (?, 1) "
+                    "ON CONFLICT(month) DO UPDATE SET count = count + 1",
+                    (entry["date"][:7],),
+                )
+                conn.execute(
+                    "INSERT INTO student_counts (student_id, count) VALUES (?, 1) "
+                    "ON CONFLICT(student_id) DO UPDATE SET count = count + 1",
+                    (entry["student_id"],),
+                )
+                row = conn.execute(
+                    "SELECT data FROM students WHERE id = ?", (entry["student_id"],)
+                ).fetchone()
+                if row is None:
+                    continue
+                student = json.loads(row[0])
+                student["Total attendance"] = int(student.get("Total attendance", 0)) + 1
+                stamp = f"{entry['date']} {entry['time']}"
+                student["last_atttendance_time"] = max(str(student.get("last_atttendance_time", "")), stamp)
+                conn.execute(
+                    "UPDATE students SET data = ? WHERE id = ?", (json.dumps(student), entry["student_id"])
+                )
+                changed[entry["student_id"]] = student
+        for student_id, student in changed.items():
+            self._emit(f"/{student_id}", student)
+
+    def get_analytics_summary(self):
+        conn = self._connect()
+        total_records, days_recorded = conn.execute(
+            "SELECT COALESCE(SUM(count), 0), COUNT(*) FROM daily_counts"
+        ).fetchone()
+        # The (date, time) index makes this a short backwards index walk
+        recent = conn.execute(
+            "SELECT date, time, student_id FROM attendance ORDER BY date DESC, time DESC LIMIT ?",
+            (RECENT_ACTIVITY_SIZE,),
+        ).fetchall()
+        return {
+            "total_records": total_records,
+            "days_recorded": days_recorded,
+            "students_attended": conn.execute("SELECT COUNT(*) FROM student_counts").fetchone()[0],
+            # Walks idx_student_counts_count backwards, TOP_STUDENTS_SIZE rows
+            "top_students": dict(conn.execute(
+                "SELECT student_id, count FROM student_counts ORDER BY count DESC LIMIT ?", (TOP_STUDENTS_SIZE,)
+            )),
+            "recent": [
+                {"date": date_str, "time": time_str, "student_id": student_id}
+                for date_str, time_str, student_id in reversed(recent)
+            ],
+        }
+
+    def get_daily_counts(self, dates=None):
+        if dates is None:
+            return dict(self._connect().execute("SELECT date, count FROM daily_counts ORDER BY date"))
+        dates = list(dates)
+        if not dates:
+            return {}
+        placeholders = ",".join("?" for _ in dates)
+        return dict(self._connect().execute(
+            f"SELECT date, count FROM daily_counts WHERE date IN ({placeholders})", dates
+        ))
+
+    def get_monthly_counts(self, limit=12):
+        return dict(self._connect().execute(
+            "SELECT month, count FROM monthly_counts ORDER BY month DESC LIMIT ?", (limit,)
+        ))
+
+    def rebuild_analytics(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM daily_counts")
+            conn.execute("DELETE FROM monthly_counts")
+            conn.execute("DELETE FROM student_counts")
+            conn.execute(
+                "INSERT INTO daily_counts (date, count) SELECT date, COUNT(*) FROM attendance GROUP BY date"
+            )
+            conn.execute(
+                "INSERT INTO monthly_counts (month, count) "
+                "SELECT substr(date, 1, 7), COUNT(*) FROM attendance GROUP BY substr(date, 1, 7)"
+            )
+            conn.execute(
+                "INSERT INTO student_counts (student_id, count) "
+                "SELECT student_id, COUNT(*) FROM attendance GROUP BY student_id"
+            )
+        return summarise_attendance(self.get_all_attendance())
+
+    def get_photo(self, student_id):
+        row = self._connect().execute(
+            "SELECT data FROM photos WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def put_photo(self, student_id, data, ext="png"):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO photos (student_id, ext, data) VALUES (?, ?, ?)",
+                (student_id, ext, sqlite3.Binary(data)),
+            )
+
+
+def create_backend(firebase_available, kind=None, resilient=True):
+    """Build the configured storage backend.
+
+    Firebase is wrapped in ``ResilientBackend`` (deadlines and a circuit
+    breaker) unless ``resilient`` is False.
+    """
+    kind = (kind or os.environ.get("STORAGE_BACKEND") or ("firebase" if firebase_available else "sqlite")).lower()
+    if kind == "firebase":
+        if firebase_available:
+            backend = firebase_backend()
+            if resilient:
+                from resilient_client import ResilientBackend
+                backend = ResilientBackend(backend)
+            return backend
+        print("[WARNING] STORAGE_BACKEND=firebase but Firebase is not available, using local SQLite store")
+    elif kind != "sqlite":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
+
+    is_new_store = not os.path.exists(DEFAULT_SQLITE_PATH)
+    backend = SQLiteBackend()
+    if is_new_store:
+        backend.seed_students(SAMPLE_STUDENTS)
+    return backend
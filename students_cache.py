@@ -0,0 +1,210 @@
+"""
+Process-wide read-through cache of the Students node.
+
+The cache loads every student once at startup, then stays current through
+the storage backend's change listener (``Reference.listen`` on Firebase,
+an in-process event stream on the local SQLite store). Routes read students
+from memory and never wait on the network; writes made by this process are
+applied to the cache straight away. If the database is down at startup,
+loading and subscribing are retried in the background with exponential
+backoff.
+
+A student's optional ``scopes`` field lists the roster shards they belong to
+(``course:CS101``, ``section:CS101-02``, ``site:north``...), as a list or a
+``;``/``,`` separated string. ``scopes()`` indexes them for FaceGallery.
+"""
+
+import re
+import threading
+import time
+
+SCOPES_FIELD = "scopes"
+
+# Backoff between attempts to load the snapshot or start the listener (seconds)
+RETRY_INITIAL = 1.0
+RETRY_MAX = 60.0
+
+
+def student_scopes(student):
+    """The scope tags of one student record."""
+    value = (student or {}).get(SCOPES_FIELD) or ()
+    if isinstance(value, str):
+        value = re.split(r"[;,]", value)
+    elif isinstance(value, dict):
+        # Firebase turns lists into {"0": ...} objects on some writes
+        value = value.values()
+    return {str(tag).strip() for tag in value if str(tag).strip()}
+
+
+class StudentsCache:
+    """In-memory copy of ``{student_id: student}`` kept fresh by change events."""
+
+    def __init__(self, backend, logger=None):
+        self.backend = backend
+        self.logger = logger
+        self._students = {}
+        self._lock = threading.Lock()
+        self._registration = None
+        self._stopped = threading.Event()
+        self.created_at = time.time()
+        self.loaded_at = None
+        self.last_event_at = None
+        self.listener_error = None
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every change, so the scope index is rebuilt only when needed
+        self.version = 0
+        self._scopes = (None, {})
+
+    def start(self):
+        """Load the snapshot and subscribe to changes, retrying in the background if either fails."""
+        if not self._try_start():
+            threading.Thread(target=self._retry_start, name="students-cache-retry", daemon=True).start()
+
+    def _try_start(self):
+        """One attempt at whatever is still missing. Returns True once loaded and subscribed."""
+        if self.loaded_at is None:
+            try:
+                students = self.backend.get_students()
+                with self._lock:
+                    # A root put from the listener may have loaded it meanwhile
+                    if self.loaded_at is None:
+                        self._students = dict(students)
+                        self.loaded_at = time.time()
+                        self.version += 1
+            except Exception as e:
+                self._log_error(f"Students cache load failed: {e}")
+        if self._registration is None:
+            try:
+                self._registration = self.backend.listen_students(self._on_event)
+                self.listener_error = None
+            except Exception as e:
+                self.listener_error = str(e)
+                self._log_error(f"Students cache listener failed to start: {e}")
+        return self.loaded_at is not None and self._registration is not None
+
+    def _retry_start(self):
+        delay = RETRY_INITIAL
+        while not self._stopped.wait(delay):
+            if self._try_start():
+                print(f"[OK] Students cache loaded after retrying ({len(self)} students)")
+                return
+            delay = min(delay * 2, RETRY_MAX)
+
+    def stop(self):
+        self._stopped.set()
+        if self._registration is not None:
+            self._registration.close()
+            self._registration = None
+
+    def get(self, student_id):
+        student = self._students.get(student_id)
+        if student is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return student
+
+    def get_all(self):
+        with self._lock:
+            return dict(self._students)
+
+    def __len__(self):
+        return len(self._students)
+
+    def put(self, student_id, data):
+        """Apply a write made by this process."""
+        with self._lock:
+            self._students[student_id] = data
+            self.version += 1
+
+    def remove(self, student_id):
+        with self._lock:
+            self._students.pop(student_id, None)
+            self.version += 1
+
+    def scopes(self):
+        """``{scope: frozenset of student ids}``. The same object is returned until the students change."""
+        version, index = self._scopes
+        if version == self.version:
+            return index
+        with self._lock:
+            version = self.version
+            members = {}
+            for student_id, student in self._students.items():
+                for scope in student_scopes(student):
+                    members.setdefault(scope, set()).add(student_id)
+        index = {scope: frozenset(ids) for scope, ids in members.items()}
+        self._scopes = (version, index)
+        return index
+
+    def staleness_seconds(self):
+        """Seconds since the cache was last known to match the backend.
+
+        While the listener is healthy the cache is current by construction, so
+        this only grows once the listener has failed or never started. A cache
+        that has never loaded is stale since it was created.
+        """
+        if self.loaded_at is None:
+            return time.time() - self.created_at
+        if self._registration is not None and self.listener_error is None:
+            return 0.0
+        return time.time() - max(self.loaded_at, self.last_event_at or 0)
+
+    def stats(self):
+        return {
+            "size": len(self._students),
+            "loaded_at": self.loaded_at,
+            "last_event_at": self.last_event_at,
+            "listener_active": self._registration is not None and self.listener_error is None,
+            "listener_error": self.listener_error,
+            "staleness_seconds": self.staleness_seconds(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _on_event(self, event_type, path, data):
+        """Apply a Firebase-style ``put``/``patch`` event relative to the Students node."""
+        if event_type == "error":
+            self.listener_error = str(data)
+            self._log_error(f"Students cache listener error: {data}")
+            return
+        with self._lock:
+            if event_type == "patch":
+                for child_path, value in (data or {}).items():
+                    self._apply_put(f"{path.rstrip('/')}/{child_path}", value)
+            else:
+                self._apply_put(path, data)
+            self.last_event_at = time.time()
+            self.version += 1
+            self.listener_error = None
+
+    def _apply_put(self, path, data):
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            self._students = dict(data or {})
+            self.loaded_at = time.time()
+            return
+        student_id, fields = parts[0], parts[1:]
+        if not fields:
+            if data is None:
+                self._students.pop(student_id, None)
+            else:
+                self._students[student_id] = data
+            return
+        # Nested field change: copy the record so readers never see it half-updated
+        student = dict(self._students.get(student_id) or {})
+        node = student
+        for field in fields[:-1]:
+            node = node.setdefault(field, {})
+        if data is None:
+            node.pop(fields[-1], None)
+        else:
+            node[fields[-1]] = data
+        self._students[student_id] = student
+
+    def _log_error(self, message):
+        if self.logger:
+            self.logger.error(message)
+        else:
+            print(f"[WARNING] {message}")
@@ -0,0 +1,55 @@
+"""
+Test script for the quantized face gallery - no camera or dlib required.
+
+Runs with pytest or as ``python test_face_gallery.py``.
+"""
+
+import numpy as np
+from face_gallery import FaceGallery
+
+PROBES = 500
+
+
+class FakeFaces:
+    """Random 128-d encodings with a decaying spread per direction, like real descriptors."""
+
+    def __init__(self, seed=46):
+        self.rng = np.random.default_rng(seed)
+        spread = 1.0 / np.sqrt(np.arange(1, 129))
+        spread *= 0.9 / np.sqrt(2 * np.sum(spread ** 2))
+        rotation, _ = np.linalg.qr(self.rng.normal(size=(128, 128)))
+        self.basis = (rotation * spread).T
+        self.mean = self.rng.normal(0, 0.1, 128)
+
+    def encodings(self, count):
+        return self.mean + self.rng.standard_normal((count, 128)) @ self.basis
+
+
+def check_growing_gallery(quantization):
+    faces = FakeFaces()
+    gallery = FaceGallery(quantization=quantization)
+    known = np.empty((0, 128))
+    # Start with 3 faces, so later batches fall outside the first int8 range
+    for count in (3, 20, 500, 5000):
+        batch = faces.encodings(count)
+        gallery.add_many((str(len(known) + i), encoding) for i, encoding in enumerate(batch))
+        known = np.vstack([known, batch])
+
+        for probe in faces.encodings(PROBES):
+            expected = int(np.linalg.norm(known - probe, axis=1).argmin())
+            student_id, _ = gallery.match(probe, tolerance=10.0)
+            assert int(student_id) == expected, f"{quantization} gallery of {len(known)} faces picked the wrong face"
+
+
+def test_int8_gallery_grown_incrementally_matches_exactly():
+    check_growing_gallery("int8")
+
+
+def test_float16_gallery_grown_incrementally_matches_exactly():
+    check_growing_gallery("float16")
+
+
+if __name__ == "__main__":
+    for quantization in ("int8", "float16"):
+        check_growing_gallery(quantization)
+        print(f"[OK] {quantization} gallery agrees with exact matching as it grows")
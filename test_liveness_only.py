@@ -10,11 +10,15 @@ from flask import Flask, render_template, request, jsonify
 import cv2
 import numpy as np
 import face_recognition
-from liveness_detection_fixed import LivenessDetectorFixed as LivenessDetector, quick_liveness_check
+from liveness_sessions import DetectorPool
+from ultra_simple_liveness import UltraSimpleLivenessDetector as LivenessDetector, quick_liveness_check
 
 app = Flask(__name__)
 app.secret_key = "test-key-for-liveness"
 
+# Detectors are reused across requests instead of being built for each one
+liveness_pool = DetectorPool(LivenessDetector)
+
 # Load encodings
 encode_file_path = "EncodeFile.p"
 if os.path.exists(encode_file_path):
@@ -99,8 +103,8 @@ def scan_multi_frame():
             return jsonify({'success': False, 'message': 'Not enough valid frames with faces'})
         
         # Perform liveness detection
-        liveness_detector = LivenessDetector()
-        liveness_result = liveness_detector.multi_frame_analysis(frames, face_regions)
+        with liveness_pool.lease() as liveness_detector:
+            liveness_result = liveness_detector.multi_frame_analysis(frames, face_regions)
         
         print(f"Liveness Result: {liveness_result['is_live']}")
         print(f"Confidence: {liveness_result['final_confidence']:.2f}")
@@ -12,8 +12,8 @@ def test_simple_detection():
     print("=== Simple Blink Detection Test ===")
     print("This test uses ONLY blink detection for liveness verification")
     print("How it works:")
-    print("1. 👁️ Detects your face using OpenCV")
-    print("2. 👀 Monitors your eyes for blinks")
+    print("1. 👁️ Detects your face and its 68 landmarks (the same pass used for recognition)")
+    print("2. 👀 Tracks the eye aspect ratio to spot blinks")
     print("3. ✅ Verifies you're real if you blink 1+ times within 8 seconds")
     print("")
     print("Instructions:")
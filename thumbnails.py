@@ -0,0 +1,130 @@
+"""
+Small JPEG thumbnails for result pages, cached on disk by content hash.
+
+A result page used to inline the uploaded image and the student photo as
+base64 PNGs, which made it megabytes long. Instead ``ensure()`` turns image
+bytes into a thumbnail once, and the page links to it:
+
+    thumbnail_cache/<id>.jpg    id = hash of the source bytes and the size
+
+The id changes whenever the source changes, so ``send()`` serves a
+thumbnail as immutable, with the id as its ETag, and answers revalidation
+with 304. Thumbnails are files rather than memory so that any worker of a
+pre-forked server can serve one another worker made. The oldest beyond
+``max_files`` are deleted.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+
+THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR", "thumbnail_cache")
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_MAX_FILES = int(os.environ.get("THUMBNAIL_MAX_FILES", 2000))
+THUMBNAIL_MAX_AGE = 7 * 24 * 3600
+# Files written between two checks of max_files
+PRUNE_EVERY = 50
+
+_THUMBNAIL_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ThumbnailStore:
+    """Content-addressed JPEG thumbnails in ``directory``."""
+
+    def __init__(self, directory=THUMBNAIL_DIR, quality=THUMBNAIL_QUALITY, max_files=THUMBNAIL_MAX_FILES,
+                 logger=None):
+        self.directory = directory
+        self.quality = quality
+        self.max_files = max_files
+        self.logger = logger
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def thumbnail_id(data, size=THUMBNAIL_SIZE):
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(f":{size}".encode())
+        return digest.hexdigest()
+
+    def path(self, thumb_id):
+        if not _THUMBNAIL_ID.match(thumb_id or ""):
+            raise ValueError(f"Bad thumbnail id: {thumb_id}")
+        return os.path.join(self.directory, f"{thumb_id}.jpg")
+
+    def ensure(self, data, size=THUMBNAIL_SIZE, image=None):
+        """Thumbnail id for the image in ``data``, written once; None if it cannot be decoded.
+
+        ``image`` is the already decoded BGR image, if the caller has it.
+        """
+        import cv2
+        import numpy as np
+
+        thumb_id = self.thumbnail_id(data, size)
+        path = self.path(thumb_id)
+        if os.path.exists(path):
+            return thumb_id
+        if image is None:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        scale = size / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self._log_error(f"Could not save thumbnail: {e}")
+            return None
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+        return thumb_id
+
+    def send(self, thumb_id):
+        """Flask response for a thumbnail, revalidated by ETag; 404 if unknown or pruned."""
+        from flask import abort, send_file
+
+        try:
+            path = self.path(thumb_id)
+        except ValueError:
+            abort(404)
+        if not os.path.exists(path):
+            abort(404)
+        response = send_file(os.path.abspath(path), mimetype="image/jpeg", etag=thumb_id,
+                             max_age=THUMBNAIL_MAX_AGE, conditional=True)
+        # Uploaded photos are private to whoever has the page; the content never changes
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+        return response
+
+    def _prune(self):
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".jpg")]
+            if len(names) <= self.max_files:
+                return
+            paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_files]:
+                os.remove(path)
+        except OSError as e:
+            self._log_error(f"Could not prune thumbnails: {e}")
+
+    def _log_error(self, message):
+        if self.logger is not None:
+            self.logger.error(message)
+        else:
+            print(f"[WARNING] {message}")
@@ -0,0 +1,232 @@
+"""
+Movement-based liveness detection on small grayscale face crops.
+
+Each frame is cut down to the face region and resized to a ROI_SIZE x ROI_SIZE
+grayscale patch, and optical flow runs on an even smaller FLOW_SIZE copy, so
+a frame costs well under a millisecond. Three cues are combined:
+
+* motion: frame differencing and Farneback optical-flow magnitude. A live
+  person is never perfectly still.
+* non-rigid motion: how much of the flow an affine model cannot explain. A
+  photo or screen moves as one flat plane; a face does not.
+* texture: Laplacian energy of the patch. Prints and screens lose fine detail.
+
+Motion concentrated in the eye band is counted as a blink and adds to the
+confidence, but only when the motion is also non-rigid: eye-band changes on a
+photo moved in front of the camera must not be enough to pass it.
+
+``multi_frame_analysis`` scores a whole burst. ``update`` scores one frame at
+a time against a rolling window, so a caller can stop as soon as the answer
+is clear (see liveness_sessions.py).
+"""
+
+import os
+from collections import deque
+
+import cv2
+import numpy as np
+
+ROI_SIZE = 64
+# Confidence a face needs to pass
+LIVENESS_THRESHOLD = float(os.environ.get("LIVENESS_THRESHOLD", 0.6))
+MIN_FRAMES = 3
+WINDOW_FRAMES = 12
+
+# Eye band as a fraction of the face crop height
+EYE_BAND = (0.2, 0.45)
+
+# Side of the patch optical flow runs on. Farneback's cost grows quickly with
+# size and the affine fit only needs coarse flow; magnitudes are scaled back
+# to ROI_SIZE pixels, so the motion thresholds do not depend on it.
+FLOW_SIZE = 48
+
+# Farneback parameters tuned for 48x48 patches
+FLOW_PARAMS = dict(pyr_scale=0.5, levels=2, winsize=9, iterations=2, poly_n=5, poly_sigma=1.1, flags=0)
+
+# Border pixels of the flow patch left out of the rigidity fit, where flow is least reliable
+FLOW_MARGIN = 6
+
+
+def _affine_projector(size, margin):
+    """Least-squares projector onto affine flow fields over the patch interior, computed once."""
+    inner = slice(margin, size - margin)
+    ys, xs = np.mgrid[inner, inner].astype(np.float32) / size
+    basis = np.stack([xs.ravel(), ys.ravel(), np.ones(xs.size, np.float32)], axis=1)
+    return inner, basis, np.linalg.pinv(basis)
+
+
+class UltraSimpleLivenessDetector:
+    """Liveness from motion, rigidity and texture.
+
+    ``multi_frame_analysis`` and ``detect_liveness`` only look at the frames
+    they are given. ``update`` keeps rolling state that ``reset_detection``
+    clears, so one instance must not be shared between concurrent sessions.
+    """
+
+    def __init__(self, roi_size=ROI_SIZE, threshold=LIVENESS_THRESHOLD,
+                 min_motion=0.05, target_motion=0.4, min_nonrigid=0.2, target_nonrigid=0.45,
+                 min_texture=0.002, target_texture=0.01, blink_ratio=1.8, window=WINDOW_FRAMES,
+                 flow_size=FLOW_SIZE):
+        self.roi_size = roi_size
+        self.flow_size = min(flow_size, roi_size)
+        self.threshold = threshold
+        self.min_motion = min_motion
+        self.target_motion = target_motion
+        self.min_nonrigid = min_nonrigid
+        self.target_nonrigid = target_nonrigid
+        self.min_texture = min_texture
+        self.target_texture = target_texture
+        self.blink_ratio = blink_ratio
+        margin = FLOW_MARGIN * self.flow_size // FLOW_SIZE
+        self._inner, self._basis, self._projector = _affine_projector(self.flow_size, margin)
+        self._flow_scale = roi_size / self.flow_size
+        top, bottom = EYE_BAND
+        self._eye_rows = slice(int(top * roi_size), int(bottom * roi_size))
+        self._previous_roi = None
+        self._previous_small = None
+        self._pairs = deque(maxlen=window - 1)
+        self._textures = deque(maxlen=window)
+        self.frames_seen = 0
+
+    def reset_detection(self):
+        """Forget the rolling state kept by ``update``."""
+        self._previous_roi = None
+        self._previous_small = None
+        self._pairs.clear()
+        self._textures.clear()
+        self.frames_seen = 0
+
+    def update(self, frame, face_region=None):
+        """Add one frame to the rolling window and return the current result dict."""
+        roi = self.prepare_roi(frame, face_region)
+        small = self.flow_patch(roi)
+        if self._previous_roi is not None:
+            self._pairs.append(self.pair_features(self._previous_roi, roi, self._previous_small, small))
+        self._previous_roi, self._previous_small = roi, small
+        self._textures.append(float(self.texture_scores([roi])[0]))
+        self.frames_seen += 1
+        return self.score(list(self._pairs), list(self._textures))
+
+    def prepare_roi(self, frame, face_region=None):
+        """Crop ``(x, y, w, h)`` (or the centre of the frame) to a uint8 grayscale patch."""
+        height, width = frame.shape[:2]
+        if face_region is not None:
+            x, y, w, h = (int(v) for v in face_region)
+        else:
+            # Without a detected face, assume it is roughly centred, as on the kiosk camera
+            w, h = width // 2, height * 2 // 3
+            x, y = (width - w) // 2, (height - h) // 2
+        x, y = max(x, 0), max(y, 0)
+        crop = frame[y:y + h, x:x + w]
+        if crop.size == 0:
+            crop = frame
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(crop, (self.roi_size, self.roi_size), interpolation=cv2.INTER_AREA)
+
+    def flow_patch(self, roi):
+        """The ROI resized to the patch optical flow runs on."""
+        if self.flow_size == self.roi_size:
+            return roi
+        return cv2.resize(roi, (self.flow_size, self.flow_size), interpolation=cv2.INTER_AREA)
+
+    def pair_features(self, previous, current, previous_small=None, current_small=None):
+        """Motion features between two consecutive ROIs.
+
+        ``previous_small``/``current_small`` are their ``flow_patch`` copies, if
+        the caller already has them. Returns ``(mean_abs_diff, eye_diff,
+        flow_magnitude, nonrigidity)``, the magnitude in ROI pixels.
+        """
+        diff = cv2.absdiff(current, previous)
+        if previous_small is None:
+            previous_small = self.flow_patch(previous)
+        if current_small is None:
+            current_small = self.flow_patch(current)
+        flow = cv2.calcOpticalFlowFarneback(previous_small, current_small, None, **FLOW_PARAMS)
+        flow = flow[self._inner, self._inner].reshape(-1, 2)
+        magnitude = float(np.hypot(flow[:, 0], flow[:, 1]).mean())
+        # Residual after the best affine fit: near zero for a flat photo moved in front of the camera
+        residual = flow - self._basis @ (self._projector @ flow)
+        nonrigidity = float(np.hypot(residual[:, 0], residual[:, 1]).mean() / (magnitude + 1e-6))
+        return (float(diff.mean()) / 255.0, float(diff[self._eye_rows].mean()) / 255.0,
+                magnitude * self._flow_scale, nonrigidity)
+
+    @staticmethod
+    def texture_scores(rois):
+        """Mean squared Laplacian of each ROI in a ``(n, size, size)`` stack."""
+        rois = np.asarray(rois, dtype=np.float32) / 255.0
+        centre = rois[:, 1:-1, 1:-1]
+        laplacian = (4 * centre - rois[:, :-2, 1:-1] - rois[:, 2:, 1:-1]
+                     - rois[:, 1:-1, :-2] - rois[:, 1:-1, 2:])
+        return (laplacian ** 2).mean(axis=(1, 2))
+
+    def count_blinks(self, diffs, eye_diffs):
+        """Count rising edges of eye-band motion that stand out from whole-face motion."""
+        diffs = np.asarray(diffs)
+        eye_diffs = np.asarray(eye_diffs)
+        if len(diffs) == 0:
+            return 0
+        events = (eye_diffs > self.blink_ratio * diffs) & (eye_diffs > 0.01)
+        return int(events[0] + np.count_nonzero(events[1:] & ~events[:-1]))
+
+    def score(self, pairs, textures):
+        """Combine per-pair motion features and per-frame textures into a result dict."""
+        pairs = np.asarray(pairs, dtype=np.float64).reshape(-1, 4)
+        diffs, eye_diffs, magnitudes, nonrigidity = pairs.T
+        motion = float(np.median(magnitudes)) if len(pairs) else 0.0
+        # Only judge rigidity on pairs where something actually moved
+        moving = magnitudes > self.min_motion
+        nonrigid = float(np.median(nonrigidity[moving])) if moving.any() else 0.0
+        texture = float(np.median(textures)) if len(textures) else 0.0
+        blinks = self.count_blinks(diffs, eye_diffs)
+
+        motion_score = np.clip((motion - self.min_motion) / (self.target_motion - self.min_motion), 0, 1)
+        nonrigid_score = np.clip((nonrigid - self.min_nonrigid) / (self.target_nonrigid - self.min_nonrigid), 0, 1)
+        texture_score = np.clip((texture - self.min_texture) / (self.target_texture - self.min_texture), 0, 1)
+        # Motion alone is not enough: a waved photo moves too, but rigidly
+        confidence = 0.3 * motion_score + 0.45 * nonrigid_score + 0.25 * texture_score
+        # A blink only counts on a face that also moves non-rigidly; otherwise one
+        # spurious eye-band change would lift a rigidly moved photo over the threshold
+        if blinks and nonrigid > self.min_nonrigid:
+            confidence = min(1.0, confidence + 0.15)
+
+        return {
+            "is_live": bool(confidence >= self.threshold),
+            "final_confidence": float(confidence),
+            "total_blinks": blinks,
+            "motion": motion,
+            "nonrigidity": nonrigid,
+            "texture": texture,
+            "frames_analyzed": len(textures),
+        }
+
+    def multi_frame_analysis(self, frames, face_regions=None):
+        """Analyse a burst of BGR frames. ``face_regions`` holds one ``(x, y, w, h)`` per frame."""
+        frames = [frame for frame in frames if frame is not None]
+        regions = face_regions or [None] * len(frames)
+        rois = [self.prepare_roi(frame, region) for frame, region in zip(frames, regions)]
+        if len(rois) < 2:
+            return self.score([], self.texture_scores(rois) if rois else [])
+        smalls = [self.flow_patch(roi) for roi in rois]
+        pairs = [self.pair_features(rois[i], rois[i + 1], smalls[i], smalls[i + 1]) for i in range(len(rois) - 1)]
+        return self.score(pairs, self.texture_scores(rois))
+
+    def detect_liveness(self, frames, face_regions=None):
+        """Return True if the frames look like a live person."""
+        if len([frame for frame in frames if frame is not None]) < MIN_FRAMES:
+            return False
+        return self.multi_frame_analysis(frames, face_regions)["is_live"]
+
+
+_quick_detector = None
+
+
+def quick_liveness_check(frame, face_region=None):
+    """Single-frame texture check: rejects flat, blurred or washed-out faces."""
+    global _quick_detector
+    if _quick_detector is None:
+        _quick_detector = UltraSimpleLivenessDetector()
+    roi = _quick_detector.prepare_roi(frame, face_region)
+    if roi.std() < 8:
+        return False
+    return bool(_quick_detector.texture_scores([roi])[0] >= _quick_detector.min_texture)
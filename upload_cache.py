@@ -0,0 +1,78 @@
+"""
+Content-hash cache of face detection and encoding results for uploads.
+
+Users retry the same file and clients resend after a timeout, so ``/match``
+keys a bounded LRU by a hash of the uploaded bytes. An entry holds the face
+boxes and encodings found in the upload, never the match: a hit skips
+decoding, detection and encoding and is still matched against the gallery
+as it is now. Set ``UPLOAD_CACHE_SIZE`` to change the bound (0 disables it).
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+UPLOAD_CACHE_SIZE = int(os.environ.get("UPLOAD_CACHE_SIZE", 256))
+
+
+class UploadCache:
+    """Thread-safe LRU of ``{content hash: (face_locations, face_encodings)}``."""
+
+    def __init__(self, max_entries=UPLOAD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data, variant=""):
+        """Cache key for ``data``; ``variant`` names the pipeline settings the faces were found with."""
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(variant.encode())
+        return digest.digest()
+
+    def get(self, key):
+        """``(face_locations, face_encodings)`` for ``key``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, face_locations, face_encodings):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (tuple(face_locations), tuple(face_encodings))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+    def register_metrics(self, registry):
+        """Expose lookups by result, the hit ratio and the entry count on a ``metrics.Registry``."""
+        registry.register_callback(
+            "attendance_upload_cache_lookups_total", "Upload cache lookups by result",
+            lambda: {"hit": self.hits, "miss": self.misses}, type="counter", labelname="result")
+        registry.register_callback(
+            "attendance_upload_cache_size", "Uploads held in the upload cache", lambda: len(self))
+        registry.register_callback(
+            "attendance_upload_cache_hit_ratio", "Share of upload cache lookups that were hits",
+            lambda: self.stats()["hit_ratio"])
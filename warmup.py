@@ -0,0 +1,112 @@
+"""
+Background start-up work and readiness reporting.
+
+Importing dlib's models, unpickling the gallery and loading the students
+snapshot take seconds, so app.py registers them as warm-up steps instead of
+doing them at import time. The steps run in order on one background thread
+(or inline with ``run()``), and ``ready`` turns true once every required
+step has finished. ``/readyz`` reports it, so a load balancer only sends
+scans to warm workers, while the index page is served straight away.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+WARMUP_IMAGES_DIR = "Images"
+
+
+class Warmup:
+    """Ordered start-up steps run once, with per-step timing and errors."""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._steps = []
+        self._status = {}
+        self._done = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    def add(self, name, fn, required=True):
+        self._steps.append((name, fn, required))
+        self._status[name] = {"state": PENDING, "required": required, "seconds": None, "error": None}
+
+    def start(self):
+        """Run the steps on a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def run(self):
+        """Run every step in order on the calling thread."""
+        self.started_at = time.time()
+        for name, fn, _ in self._steps:
+            status = self._status[name]
+            if status["state"] == DONE:
+                continue
+            status["state"] = RUNNING
+            start = time.perf_counter()
+            try:
+                fn()
+                status["state"] = DONE
+            except Exception as e:
+                status["state"] = FAILED
+                status["error"] = str(e)
+                self._log_error(f"Warm-up step {name} failed: {e}")
+            status["seconds"] = time.perf_counter() - start
+        self.finished_at = time.time()
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until the steps have run; return ``ready``."""
+        self._done.wait(timeout)
+        return self.ready
+
+    @property
+    def ready(self):
+        return all(status["state"] == DONE for status in self._status.values() if status["required"])
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": {name: dict(status) for name, status in self._status.items()},
+        }
+
+    def _log_error(self, message):
+        if self.logger is not None:
+            self.logger.error(message)
+        else:
+            print(f"[WARNING] {message}")
+
+
+def sample_image(images_dir=WARMUP_IMAGES_DIR):
+    """An RGB photo from ``images_dir``, or a grey frame if there is none."""
+    import cv2
+
+    if os.path.isdir(images_dir):
+        for name in sorted(os.listdir(images_dir)):
+            bgr_image = cv2.imread(os.path.join(images_dir, name))
+            if bgr_image is not None:
+                return cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+    return np.full((160, 160, 3), 128, dtype=np.uint8)
+
+
+def prime_face_models(rgb_image=None):
+    """Load dlib's models and run one detection and encoding of each kind the app uses."""
+    import face_recognition
+    from face_pipeline import analyse_faces
+
+    if rgb_image is None:
+        rgb_image = sample_image()
+    height, width = rgb_image.shape[:2]
+    # Encode the whole frame if no face is found, so the encoder runs either way
+    face_locations = face_recognition.face_locations(rgb_image) or [(0, width, height, 0)]
+    face_recognition.face_encodings(rgb_image, face_locations)
+    analyse_faces(rgb_image, face_locations[:1])
@@ -1,7 +1,16 @@
-import base64
+"""
+Upload-and-match web app, built by ``create_app()``.
+
+Under a pre-forking server (see wsgi.py and gunicorn.conf.py) the app is
+created once in the master: ``preload()`` loads dlib's models and the gallery
+there, and the workers share those pages copy-on-write. Anything holding
+sockets or threads (the storage backend, its call pool and the Firebase
+client) is created per process by ``worker_backend()``, so each worker gets
+its own after the fork.
+"""
+
 import io
 import os
-import pickle
 
 from datetime import datetime
 
@@ -10,55 +19,85 @@ from werkzeug.utils import secure_filename
 
 import cv2
 import numpy as np
-import face_recognition
 
 import firebase_admin
 from firebase_admin import credentials
-from firebase_admin import db
-from firebase_admin import storage
+
+import metrics
+from face_gallery import FaceGallery
+from fake_firebase import emulation_enabled
+from pipeline_profiles import REQUESTABLE_PROFILES, detect_faces, encode_faces, profile_for
+from resilient_client import ResilientBackend
+from storage_backend import firebase_backend
+from thumbnails import ThumbnailStore
+from upload_cache import UploadCache
+from warmup import prime_face_models
 
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+ENCODE_FILE = os.path.join(os.path.dirname(__file__), "EncodeFile.p")
 
+# Shared by every worker once loaded in the master (see preload)
+_gallery = None
 
-def is_allowed_filename(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+# Per-process storage backend and the pid it was created in
+_backend = None
+_backend_pid = None
+
+
+def preload(encode_file=ENCODE_FILE):
+    """Load the face models and the gallery once per process tree. Returns the gallery."""
+    global _gallery
+    if _gallery is None:
+        prime_face_models()
+        _gallery = FaceGallery.load(encode_file)
+    return _gallery
+
+
+def worker_backend(logger=None):
+    """The storage backend of this process, created again in a forked worker."""
+    global _backend, _backend_pid
+    if _backend_pid != os.getpid():
+        # One pooled client per worker; every call gets a deadline and goes through a circuit breaker
+        _backend = ResilientBackend(firebase_backend(), logger=logger)
+        _backend_pid = os.getpid()
+    return _backend
 
 
-def convert_bgr_image_to_base64_png(image_bgr: np.ndarray) -> str:
-    _, buffer = cv2.imencode(".png", image_bgr)
-    return base64.b64encode(buffer).decode("utf-8")
+def is_allowed_filename(filename: str) -> bool:
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.secret_key = os.environ.get("FLASK_SECRET", "dev-secret-key")
+    metrics.instrument_flask(app)
 
-    # Initialize Firebase (idempotent if already initialized in this process)
-    if not firebase_admin._apps:
+    # Initialize Firebase (idempotent if already initialized in this process).
+    # FIREBASE_EMULATION=fake swaps in the in-process fake from fake_firebase.py.
+    if not emulation_enabled() and not firebase_admin._apps:
         cred = credentials.Certificate("serviceAccountKey.json")
         firebase_admin.initialize_app(
             cred,
             {
                 "databaseURL": "https://faceattendancerealtime-612a8-default-rtdb.firebaseio.com/",
                 "storageBucket": "faceattendancerealtime-612a8.firebasestorage.app",
+                "httpTimeout": 10,
             },
         )
 
-    bucket = storage.bucket()
-
-    # Load encodings at startup
-    encode_file_path = os.path.join(os.path.dirname(__file__), "EncodeFile.p")
-    if not os.path.exists(encode_file_path):
+    # Models and encodings load once; the backend is created on first use in each worker
+    gallery = preload()
+    # Faces found in recent uploads, keyed by a hash of the bytes (one cache per worker)
+    upload_cache = UploadCache()
+    upload_cache.register_metrics(metrics.REGISTRY)
+    # Result pages link to JPEG thumbnails instead of inlining the images
+    thumbnails = ThumbnailStore(logger=app.logger)
+    if not len(gallery):
         # Helpful message if encodings are missing
         app.logger.warning(
             "EncodeFile.p not found. Run EncodeGenerator.py first to generate encodings."
         )
-        encode_list_known = []
-        student_ids = []
-    else:
-        with open(encode_file_path, "rb") as f:
-            encode_list_known, student_ids = pickle.load(f)
 
     @app.get("/")
     def index():
@@ -66,6 +105,12 @@ def create_app() -> Flask:
 
     @app.post("/match")
     def match():
+        try:
+            profile = profile_for("match", request.values.get("profile") or None, REQUESTABLE_PROFILES)
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for("index"))
+
         if "image" not in request.files:
             flash("No file part in the request.")
             return redirect(url_for("index"))
@@ -80,51 +125,66 @@ def create_app() -> Flask:
             return redirect(url_for("index"))
 
         filename = secure_filename(file.filename)
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        bgr_image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        if bgr_image is None:
-            flash("Could not read the uploaded image.")
-            return redirect(url_for("index"))
-
-        # Prepare for face encoding on uploaded image
-        rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_image)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        data = file.read()
+        # A retried or resent upload reuses its faces and is matched against the current gallery
+        bgr_image = None
+        cache_key = upload_cache.key(data, profile.name)
+        cached = upload_cache.get(cache_key)
+        if cached is not None:
+            face_locations, face_encodings = cached
+        else:
+            with metrics.span("decode"):
+                bgr_image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if bgr_image is None:
+                flash("Could not read the uploaded image.")
+                return redirect(url_for("index"))
+            rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+            with metrics.span("detect"):
+                face_locations = detect_faces(rgb_image, profile)
+            with metrics.span("encode"):
+                face_encodings = encode_faces(rgb_image, face_locations, profile)
+            upload_cache.put(cache_key, face_locations, face_encodings)
 
         if len(face_encodings) == 0:
+            metrics.count("no_face")
             flash("No face detected in the image.")
             return redirect(url_for("index"))
 
-        if not encode_list_known:
+        if not len(gallery):
             flash("No known encodings found. Generate encodings first.")
             return redirect(url_for("index"))
 
-        first_face_encoding = face_encodings[0]
-        distances = face_recognition.face_distance(encode_list_known, first_face_encoding)
-        match_index = int(np.argmin(distances))
-        matches = face_recognition.compare_faces([encode_list_known[match_index]], first_face_encoding)
+        with metrics.span("match"):
+            matched_id, distance = gallery.match(face_encodings[0])
 
-        matched = bool(matches[0])
-        matched_id = student_ids[match_index] if matched else None
+        matched = matched_id is not None
+        metrics.count("match" if matched else "no_match")
+        backend = worker_backend(app.logger)
 
         student_info = None
-        student_photo_base64 = None
+        student_thumbnail = None
 
         if matched_id is not None:
             # Fetch from Firebase Realtime Database
-            student_info = db.reference(f"Students/{matched_id}").get()
+            try:
+                with metrics.span("db_student"):
+                    student_info = backend.get_student(matched_id)
+            except Exception as e:
+                metrics.count("db_error")
+                app.logger.error("Failed to load student %s: %s", matched_id, e)
 
             # Fetch image from Storage
-            blob = bucket.get_blob(f"Images/{matched_id}.png")
-            if blob is None:
-                blob = bucket.get_blob(f"Images/{matched_id}.jpg")
-
-            if blob is not None:
-                array = np.frombuffer(blob.download_as_string(), np.uint8)
-                img_student = cv2.imdecode(array, cv2.IMREAD_COLOR)
-                if img_student is not None:
-                    img_student = cv2.resize(img_student, (216, 216))
-                    student_photo_base64 = convert_bgr_image_to_base64_png(img_student)
+            try:
+                with metrics.span("db_photo"):
+                    photo_bytes = backend.get_photo(matched_id)
+            except Exception as e:
+                metrics.count("db_error")
+                app.logger.error("Failed to load photo for %s: %s", matched_id, e)
+                photo_bytes = None
+
+            if photo_bytes is not None:
+                with metrics.span("thumbnail"):
+                    student_thumbnail = thumbnails.ensure(photo_bytes)
 
             # Optional: update attendance if last scan older than 30s
             if student_info:
@@ -137,30 +197,34 @@ def create_app() -> Flask:
                         seconds_elapsed = 999999
 
                     if seconds_elapsed > 30:
-                        ref = db.reference(f"Students/{matched_id}")
-                        new_total = int(student_info.get("Total attendance", 0)) + 1
-                        ref.child("Total attendance").set(new_total)
-                        ref.child("last_atttendance_time").set(
-                            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        )
+                        fields = {
+                            "Total attendance": int(student_info.get("Total attendance", 0)) + 1,
+                            "last_atttendance_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        }
+                        backend.update_student(matched_id, fields)
                         # Refresh local copy for display
-                        student_info = db.reference(f"Students/{matched_id}").get()
+                        student_info = dict(student_info, **fields)
                 except Exception as e:
                     app.logger.exception("Failed to update attendance: %s", e)
 
         # Render result
-        uploaded_preview_base64 = convert_bgr_image_to_base64_png(bgr_image)
+        with metrics.span("thumbnail"):
+            uploaded_thumbnail = thumbnails.ensure(data, image=bgr_image)
         return render_template(
             "result.html",
             matched=matched,
             matched_id=matched_id,
             student_info=student_info,
-            uploaded_preview_base64=uploaded_preview_base64,
-            student_photo_base64=student_photo_base64,
-            distance=float(distances[match_index]) if len(distances) else None,
+            uploaded_thumbnail_url=url_for("thumbnail", thumb_id=uploaded_thumbnail) if uploaded_thumbnail else None,
+            student_thumbnail_url=url_for("thumbnail", thumb_id=student_thumbnail) if student_thumbnail else None,
+            distance=distance,
             filename=filename,
         )
 
+    @app.get("/thumbnails/<thumb_id>.jpg")
+    def thumbnail(thumb_id):
+        return thumbnails.send(thumb_id)
+
     return app
 
 
@@ -0,0 +1,12 @@
+"""
+WSGI entry point for running web_app under a pre-forking server:
+
+    gunicorn -c gunicorn.conf.py
+
+With ``preload_app`` the master imports this module once, so the face models
+and the gallery are loaded before the workers fork and are shared by them.
+"""
+
+from web_app import create_app
+
+application = create_app()